@@ -0,0 +1,401 @@
+import bisect
+import datetime
+import functools
+import gzip
+import lzma
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+import zlib
+
+from .dictionary import DictionaryCompressor
+from .entropy import SAMPLE_SIZE, classify
+from .parallel import BlockParallelStream, OrderedPipeline
+from .zipformat import DEFLATED, STORED, RawZipWriter, deflate_block
+
+COPY_CHUNK_SIZE = 256 * 1024
+# Deflate only looks 32 KiB back, so that is all a block needs as a dictionary
+DEFLATE_WINDOW = 32 * 1024
+ZIP_BLOCK_SIZE = 1024 * 1024
+# Every frame restarts the codec's history, so frames are kept larger than zip blocks
+FRAME_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class ArchiveWriter:
+    """Writes members into an archive on an already-open output stream.
+
+    The output stream may be unseekable (a pipe feeding a multipart upload),
+    so writers only ever append to it.
+    """
+
+    def add(self, arcname, stream, size, mtime=None):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def index_members(self, codec_name):
+        """Map member name -> where its compressed bytes live, for ranged reads."""
+        raise ValueError("This archive writer cannot produce a seekable index")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ZipArchiveWriter(ArchiveWriter):
+    def __init__(self, fileobj, level):
+        self.archive = zipfile.ZipFile(
+            fileobj, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level
+        )
+        self.level = level
+
+    def add(self, arcname, stream, size, mtime=None):
+        info = zipfile.ZipInfo(arcname, date_time=zip_date_time(mtime))
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # Per-member level; exposed as compress_level only from Python 3.13 on
+        info._compresslevel = self.level
+        # Setting the size up front lets zipfile pick zip64 headers correctly
+        info.file_size = size
+        with self.archive.open(info, "w") as member:
+            shutil.copyfileobj(stream, member, COPY_CHUNK_SIZE)
+
+    def close(self):
+        self.archive.close()
+
+
+class TarArchiveWriter(ArchiveWriter):
+    """A streaming tar whose bytes pass through a compressing file object.
+
+    With ``member_frames`` every member (header and data) ends a frame of
+    the block compressor, so each member can be decoded on its own.
+    """
+
+    def __init__(self, fileobj, compressor, fragment=False, member_frames=False):
+        self.compressor = compressor
+        self.fragment = fragment
+        self.member_frames = member_frames
+        self.archive = tarfile.open(fileobj=compressor, mode="w|", format=tarfile.PAX_FORMAT)
+        # (name, offset of the data in the uncompressed tar, size)
+        self.members = []
+
+    def add(self, arcname, stream, size, mtime=None):
+        info = tarfile.TarInfo(arcname)
+        info.size = size
+        info.mtime = mtime.timestamp() if mtime is not None else time.time()
+        self.archive.addfile(info, stream)
+        # Member data is padded to whole 512-byte tar blocks
+        padded = -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        self.members.append((arcname, self.archive.offset - padded, size))
+        if self.member_frames:
+            self.compressor.end_frame_at(self.archive.offset)
+
+    def index_members(self, codec_name):
+        """Locate members through the frame table of a block-compressed tar.
+
+        A member maps to the run of whole frames that covers its data, plus
+        how many decompressed bytes of that run to skip.
+        """
+        frames = getattr(self.compressor, "frames", None)
+        if frames is None:
+            return super().index_members(codec_name)
+        starts = [frame[2] for frame in frames]
+        members = {}
+        for name, data_offset, size in self.members:
+            first = bisect.bisect_right(starts, data_offset) - 1
+            last = bisect.bisect_right(starts, data_offset + max(size, 1) - 1) - 1
+            offset = frames[first][0]
+            members[name] = {
+                "offset": offset,
+                "compressed_size": frames[last][0] + frames[last][1] - offset,
+                "size": size,
+                "skip": data_offset - frames[first][2],
+                "codec": codec_name,
+            }
+        return members
+
+    def dictionary_report(self):
+        return self.compressor.compress_block.report()
+
+    def close(self):
+        if self.fragment:
+            # Flush tarfile's record buffer but leave out the end-of-archive
+            # blocks, so another fragment can follow this one
+            self.archive.fileobj.close()
+            self.archive.closed = True
+        else:
+            self.archive.close()
+        # Flushes the codec's trailer; none of the compressors close fileobj
+        self.compressor.close()
+
+
+class ParallelZipWriter(ArchiveWriter):
+    """Zip writer that deflates fixed-size blocks of every member concurrently.
+
+    Blocks of one member are spliced into a single deflate stream, and blocks
+    of consecutive members are in flight at the same time, so both a few
+    large files and many small ones keep every worker busy.
+
+    With ``skip_incompressible`` each member's leading bytes are classified
+    first, and members that are already compressed are stored as-is. A
+    ``fragment`` is closed without a central directory; see ``sharding``.
+    """
+
+    def __init__(self, fileobj, level, workers, block_size=ZIP_BLOCK_SIZE, skip_incompressible=False,
+                 fragment=False):
+        self.zip = RawZipWriter(fileobj)
+        self.fragment = fragment
+        self.workers = workers
+        self.level = level
+        self.block_size = block_size
+        self.skip_incompressible = skip_incompressible
+        self.pipeline = OrderedPipeline(workers, self._emit)
+        self.stats = {
+            "stored_members": 0,
+            "stored_bytes": 0,
+            "stored_kinds": {},
+            "deflated_bytes": 0,
+            "deflate_cpu_seconds": 0.0,
+            "classify_seconds": 0.0,
+        }
+
+    def _deflate(self, block, tail, final):
+        begin = time.thread_time()
+        data = deflate_block(block, self.level, tail, final)
+        return data, len(block), time.thread_time() - begin
+
+    def _emit(self, result):
+        data, block_size, cpu_seconds = result
+        self.stats["deflated_bytes"] += block_size
+        self.stats["deflate_cpu_seconds"] += cpu_seconds
+        self.zip.write(data)
+
+    def add(self, arcname, stream, size, mtime=None):
+        block = stream.read(self.block_size)
+        method = DEFLATED
+        if self.skip_incompressible:
+            begin = time.perf_counter()
+            incompressible, kind = classify(block[:SAMPLE_SIZE])
+            self.stats["classify_seconds"] += time.perf_counter() - begin
+            if incompressible:
+                method = STORED
+                self.stats["stored_members"] += 1
+                self.stats["stored_bytes"] += size
+                self.stats["stored_kinds"][kind] = self.stats["stored_kinds"].get(kind, 0) + 1
+
+        self.pipeline.then(lambda: self.zip.begin_member(arcname, method, mtime, size))
+        crc = 0
+        total = 0
+        tail = None
+        while True:
+            following = stream.read(self.block_size) if block else b""
+            crc = zlib.crc32(block, crc)
+            total += len(block)
+            if method == STORED:
+                self.pipeline.then(lambda block=block: self.zip.write(block))
+            else:
+                self.pipeline.submit(self._deflate, block, tail, not following)
+            if not following:
+                break
+            tail = block[-DEFLATE_WINDOW:]
+            block = following
+        self.pipeline.then(lambda: self.zip.end_member(crc, total))
+
+    def entropy_report(self):
+        """How much input skipped deflate, and the CPU time that saved.
+
+        The saving is estimated from the deflate CPU cost per byte measured
+        on the members that were compressed in this same archive.
+        """
+        stats = self.stats
+        per_byte = stats["deflate_cpu_seconds"] / stats["deflated_bytes"] if stats["deflated_bytes"] else 0.0
+        return {
+            "stored_members": stats["stored_members"],
+            "stored_bytes": stats["stored_bytes"],
+            "stored_kinds": stats["stored_kinds"],
+            "deflated_bytes": stats["deflated_bytes"],
+            "deflate_cpu_ms": stats["deflate_cpu_seconds"] * 1000,
+            "classify_ms": stats["classify_seconds"] * 1000,
+            "cpu_saved_ms": stats["stored_bytes"] * per_byte * 1000,
+        }
+
+    def add_precompressed(self, arcname, method, mtime, crc, size, compressed_size, emit):
+        """Queue a member whose compressed data is supplied by ``emit(fileobj)``."""
+        self.pipeline.then(lambda: self.zip.add_precompressed(
+            arcname, method, mtime, crc, size, compressed_size, emit
+        ))
+
+    def index_members(self, codec_name):
+        return {
+            entry.name: {
+                "offset": entry.data_offset,
+                "compressed_size": entry.compressed_size,
+                "size": entry.file_size,
+                "skip": 0,
+                "codec": "deflate" if entry.method == DEFLATED else "store",
+                "crc": entry.crc,
+            }
+            for entry in self.zip.entries
+        }
+
+    def close(self):
+        self.pipeline.close()
+        if not self.fragment:
+            self.zip.close()
+
+
+class Codec:
+    def __init__(self, name, extension, default_level, min_level, max_level,
+                 open_writer, compress_block=None):
+        self.name = name
+        self.extension = extension
+        self.default_level = default_level
+        self.min_level = min_level
+        self.max_level = max_level
+        self._open_writer = open_writer
+        # One-shot compressor for a single block; None for the zip container
+        self._compress_block = compress_block
+
+    def resolve_level(self, level):
+        if level is None:
+            return self.default_level
+        if not isinstance(level, int) or not self.min_level <= level <= self.max_level:
+            raise ValueError(
+                f"Codec '{self.name}' accepts levels {self.min_level}-{self.max_level}, got {level!r}"
+            )
+        return level
+
+    @property
+    def is_zip(self):
+        return self._compress_block is None
+
+    def compress_frame(self, data, level=None):
+        """Compress ``data`` as one frame that may be appended to a tar archive."""
+        return self._compress_block(data, level=self.resolve_level(level))
+
+    def open(self, fileobj, level=None, workers=1, block_size=None, indexed=False, skip_incompressible=False,
+             fragment=False, dictionary=None, compare_dictionary=False):
+        """Open an archive writer; ``workers > 1`` compresses blocks in parallel.
+
+        ``indexed`` and ``skip_incompressible`` force the block writers even
+        with one worker: only they record where each member's compressed
+        bytes end up, and only zip can choose a method per member.
+        ``fragment`` writes members without the archive's trailer, so that
+        fragments can be concatenated into one archive later. A zstd
+        ``dictionary`` compresses every member as its own frame primed with
+        it; ``compare_dictionary`` also measures the same frames without it.
+        """
+        level = self.resolve_level(level)
+        if skip_incompressible and self._compress_block is not None:
+            raise ValueError("Storing incompressible members needs per-member methods; use codec 'zip'")
+        if dictionary is not None and self.name != "zstd":
+            raise ValueError("Dictionaries are only supported by codec 'zstd'")
+        workers = max(1, workers)
+        if dictionary is not None:
+            return TarArchiveWriter(
+                fileobj,
+                BlockParallelStream(
+                    fileobj, DictionaryCompressor(level, dictionary, compare_dictionary),
+                    workers, block_size or FRAME_BLOCK_SIZE,
+                ),
+                fragment,
+                member_frames=True,
+            )
+        if workers <= 1 and not indexed and not skip_incompressible and not fragment:
+            return self._open_writer(fileobj, level)
+        if self._compress_block is None:
+            return ParallelZipWriter(
+                fileobj, level, workers, block_size or ZIP_BLOCK_SIZE, skip_incompressible, fragment
+            )
+        compress_block = functools.partial(self._compress_block, level=level)
+        return TarArchiveWriter(
+            fileobj,
+            BlockParallelStream(fileobj, compress_block, workers, block_size or FRAME_BLOCK_SIZE),
+            fragment,
+        )
+
+
+def _zstd_writer(fileobj, level):
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor(level=level)
+    return TarArchiveWriter(fileobj, compressor.stream_writer(fileobj, closefd=False))
+
+
+def _zstd_block(data, level):
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _lz4_writer(fileobj, level):
+    import lz4.frame
+
+    return TarArchiveWriter(fileobj, lz4.frame.LZ4FrameFile(fileobj, "wb", compression_level=level))
+
+
+def _lz4_block(data, level):
+    import lz4.frame
+
+    return lz4.frame.compress(data, compression_level=level)
+
+
+CODECS = {
+    codec.name: codec
+    for codec in (
+        Codec("zip", ".zip", 6, 0, 9, ZipArchiveWriter),
+        Codec("gzip", ".tar.gz", 6, 0, 9,
+              lambda f, level: TarArchiveWriter(f, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=level, mtime=0)),
+              lambda data, level: gzip.compress(data, compresslevel=level, mtime=0)),
+        Codec("xz", ".tar.xz", 6, 0, 9,
+              lambda f, level: TarArchiveWriter(f, lzma.LZMAFile(f, "wb", preset=level)),
+              lambda data, level: lzma.compress(data, preset=level)),
+        Codec("zstd", ".tar.zst", 3, 1, 22, _zstd_writer, _zstd_block),
+        Codec("lz4", ".tar.lz4", 0, 0, 16, _lz4_writer, _lz4_block),
+    )
+}
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec '{name}', expected one of {sorted(CODECS)}") from None
+
+
+def add_directory(writer, root_dir):
+    """Add every file below ``root_dir`` in a stable order; returns input bytes."""
+    input_bytes = 0
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            size = os.path.getsize(path)
+            mtime = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+            with open(path, "rb") as f:
+                writer.add(os.path.relpath(path, root_dir), f, size, mtime)
+            input_bytes += size
+    return input_bytes
+
+
+def zip_date_time(mtime):
+    # The zip format cannot represent timestamps before 1980
+    if mtime is None or mtime.year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return mtime.timetuple()[:6]
+
+
+def compression_report(codec, level, input_bytes, compressed_bytes, compress_seconds, workers=1):
+    return {
+        "codec": codec.name,
+        "level": level,
+        "workers": workers,
+        "input_bytes": input_bytes,
+        "compressed_bytes": compressed_bytes,
+        "ratio": input_bytes / compressed_bytes if compressed_bytes else 0.0,
+        "compress_mbps": input_bytes / compress_seconds / 1e6 if compress_seconds > 0 else 0.0,
+    }
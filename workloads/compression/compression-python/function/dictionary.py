@@ -0,0 +1,184 @@
+import datetime
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from minio.error import S3Error
+
+from .parallel import cpu_quota
+
+# Same default as `zstd --train`
+DEFAULT_DICT_SIZE = 110 * 1024
+# zstd recommends roughly 100 times the dictionary size in samples
+SAMPLES_PER_DICT_BYTE = 100
+MAX_SAMPLES = 4096
+# Only the start of each object is sampled; dictionaries help small members most
+SAMPLE_BYTES = 64 * 1024
+SAMPLE_WORKERS = 16
+
+
+def dictionary_key(dataset):
+    return f"dictionaries/{dataset}.zdict"
+
+
+class Dictionary:
+    """A zstd dictionary, the object it is stored in, and how it was obtained."""
+
+    def __init__(self, key, data, report):
+        import zstandard
+
+        self.key = key
+        self.zstd = zstandard.ZstdCompressionDict(data)
+        self.report = dict(report, key=key, bytes=len(data), id=self.zstd.dict_id())
+
+
+def _sample_objects(client, bucket_name, objects, budget):
+    """Read the head of evenly spaced objects until ``budget`` bytes are collected."""
+    objects = [obj for obj in objects if obj.size > 0]
+    step = max(1, len(objects) // MAX_SAMPLES)
+    chosen = []
+    total = 0
+    for obj in objects[::step]:
+        if total >= budget:
+            break
+        chosen.append(obj)
+        total += min(obj.size, SAMPLE_BYTES)
+
+    def fetch(obj):
+        response = client.get_object(bucket_name, obj.object_name, offset=0, length=min(obj.size, SAMPLE_BYTES))
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    with ThreadPoolExecutor(max_workers=SAMPLE_WORKERS, thread_name_prefix="sample") as pool:
+        return list(pool.map(fetch, chosen))
+
+
+def load_or_train(minio, input_bucket, prefix, output_bucket, dataset, level,
+                  dict_size=DEFAULT_DICT_SIZE, retrain=False):
+    """Return the ``Dictionary`` for ``dataset``, training it on first use.
+
+    Trained dictionaries are stored in ``output_bucket`` under
+    ``dictionary_key(dataset)``, so later runs (and shards of a sharded run)
+    load the same dictionary instead of retraining it.
+    """
+    import zstandard
+
+    client = minio.client
+    key = dictionary_key(dataset)
+    begin = datetime.datetime.utcnow()
+    if not retrain:
+        try:
+            response = client.get_object(output_bucket, key)
+            try:
+                data = response.read()
+            finally:
+                response.close()
+                response.release_conn()
+            return Dictionary(key, data, {
+                "source": "cache",
+                "load_ms": (datetime.datetime.utcnow() - begin).total_seconds() * 1000,
+            })
+        except S3Error as e:
+            if e.code not in ("NoSuchKey", "NoSuchBucket"):
+                raise
+
+    samples = _sample_objects(
+        client, input_bucket, minio.list_directory(input_bucket, prefix), dict_size * SAMPLES_PER_DICT_BYTE,
+    )
+    sample_end = datetime.datetime.utcnow()
+    try:
+        data = zstandard.train_dictionary(dict_size, samples, level=level, threads=cpu_quota()).as_bytes()
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Cannot train a dictionary from {len(samples)} samples of '{prefix}': {e}") from None
+    train_end = datetime.datetime.utcnow()
+
+    if not client.bucket_exists(output_bucket):
+        client.make_bucket(output_bucket)
+    client.put_object(output_bucket, key, io.BytesIO(data), len(data))
+    logging.info(f"Trained dictionary {key} from {len(samples)} samples")
+    return Dictionary(key, data, {
+        "source": "trained",
+        "samples": len(samples),
+        "sample_bytes": sum(len(sample) for sample in samples),
+        "sample_ms": (sample_end - begin).total_seconds() * 1000,
+        "train_ms": (train_end - sample_end).total_seconds() * 1000,
+    })
+
+
+class DictionaryCompressor:
+    """Compresses blocks into zstd frames primed with a trained dictionary.
+
+    With ``compare`` every block is also compressed without the dictionary
+    (the result is discarded), so one run reports both ratios and CPU
+    throughputs on identical framing.
+    """
+
+    def __init__(self, level, dictionary, compare=False):
+        import zstandard
+
+        self.level = level
+        self.dictionary = dictionary.zstd
+        self.compare = compare
+        self._zstandard = zstandard
+        self.dictionary.precompute_compress(level=level)
+        # Compressor objects must not be shared between threads
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {
+            "frames": 0,
+            "input_bytes": 0,
+            "dictionary_bytes": 0,
+            "dictionary_cpu_seconds": 0.0,
+            "plain_bytes": 0,
+            "plain_cpu_seconds": 0.0,
+        }
+
+    def _compressors(self):
+        if not hasattr(self.local, "with_dict"):
+            self.local.with_dict = self._zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+            self.local.plain = self._zstandard.ZstdCompressor(level=self.level)
+        return self.local.with_dict, self.local.plain
+
+    def __call__(self, data):
+        with_dict, plain = self._compressors()
+        begin = time.thread_time()
+        frame = with_dict.compress(data)
+        dictionary_cpu = time.thread_time() - begin
+        plain_size, plain_cpu = 0, 0.0
+        if self.compare:
+            begin = time.thread_time()
+            plain_size = len(plain.compress(data))
+            plain_cpu = time.thread_time() - begin
+        with self.lock:
+            self.stats["frames"] += 1
+            self.stats["input_bytes"] += len(data)
+            self.stats["dictionary_bytes"] += len(frame)
+            self.stats["dictionary_cpu_seconds"] += dictionary_cpu
+            self.stats["plain_bytes"] += plain_size
+            self.stats["plain_cpu_seconds"] += plain_cpu
+        return frame
+
+    def report(self):
+        stats = self.stats
+
+        def variant(compressed_bytes, cpu_seconds):
+            return {
+                "compressed_bytes": compressed_bytes,
+                "ratio": stats["input_bytes"] / compressed_bytes if compressed_bytes else 0.0,
+                # Per CPU-second, so it is comparable whatever the worker count
+                "cpu_mbps": stats["input_bytes"] / cpu_seconds / 1e6 if cpu_seconds > 0 else 0.0,
+            }
+
+        report = {
+            "frames": stats["frames"],
+            "input_bytes": stats["input_bytes"],
+            "with_dictionary": variant(stats["dictionary_bytes"], stats["dictionary_cpu_seconds"]),
+        }
+        if self.compare:
+            report["without_dictionary"] = variant(stats["plain_bytes"], stats["plain_cpu_seconds"])
+        return report
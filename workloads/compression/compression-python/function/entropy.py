@@ -0,0 +1,51 @@
+import collections
+import math
+
+SAMPLE_SIZE = 64 * 1024
+# Deflate rarely saves more than a few percent above this many bits per byte
+ENTROPY_THRESHOLD = 7.5
+
+# Leading bytes of formats that are already compressed
+MAGIC_PREFIXES = {
+    b"%PDF-": "pdf",
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"\xff\xd8\xff": "jpeg",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+    b"PK\x03\x04": "zip",
+    b"\x1f\x8b": "gzip",
+    b"\x28\xb5\x2f\xfd": "zstd",
+    b"\xfd7zXZ\x00": "xz",
+    b"BZh": "bzip2",
+    b"7z\xbc\xaf\x27\x1c": "7z",
+    b"\x04\x22\x4d\x18": "lz4",
+    b"OggS": "ogg",
+    b"fLaC": "flac",
+    b"wOF2": "woff2",
+}
+
+
+def shannon_entropy(sample):
+    """Order-0 entropy of ``sample`` in bits per byte (0.0 to 8.0)."""
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(
+        count / total * math.log2(count / total)
+        for count in collections.Counter(sample).values()
+    )
+
+
+def classify(sample):
+    """Return (incompressible, reason) for a member from its leading bytes."""
+    for prefix, kind in MAGIC_PREFIXES.items():
+        if sample.startswith(prefix):
+            return True, kind
+    # Containers with the signature at offset 4 (MP4/MOV) or 8 (WebP)
+    if sample[4:8] == b"ftyp":
+        return True, "mp4"
+    if sample[:4] == b"RIFF" and sample[8:12] == b"WEBP":
+        return True, "webp"
+    if len(sample) >= 4096 and shannon_entropy(sample[:SAMPLE_SIZE]) >= ENTROPY_THRESHOLD:
+        return True, "entropy"
+    return False, None
@@ -1,15 +1,63 @@
 import os
-import shutil
 import uuid
 import logging
 import json
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import urllib3
 from minio import Minio
 from minio.error import S3Error
+from .archive import add_directory, compression_report, get_codec
+from .dictionary import DEFAULT_DICT_SIZE, load_or_train
+from .incremental import build_incremental
+from .parallel import cpu_quota
+from .seekable import build_index, index_key, read_member, upload_index
+from .sharding import DEFAULT_SHARDS, HttpInvoker, build_sharded, describe_fragment, shard_objects
+from .streaming import stream_archive
+
+# Upper bound for per-request download parallelism; also sizes the HTTP pool
+MAX_DOWNLOAD_WORKERS = 64
+DEFAULT_DOWNLOAD_WORKERS = 8
 
 def new():
     return Function()
 
+
+def compress_workers(payload):
+    """Compression parallelism: explicit 'compress_workers', else the CPU quota if 'parallel'."""
+    if "compress_workers" in payload:
+        return max(1, int(payload["compress_workers"]))
+    if payload.get("parallel", False):
+        return cpu_quota()
+    return 1
+
+
+def transfer_stats(transfers, wall_seconds, workers):
+    """Summarize (bytes, seconds) pairs of individual object transfers."""
+    total_bytes = sum(size for size, _ in transfers)
+    latencies = sorted(elapsed for _, elapsed in transfers)
+    rates = [size / elapsed / 1e6 for size, elapsed in transfers if elapsed > 0]
+
+    def percentile(values, q):
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {
+        "workers": workers,
+        "objects": len(transfers),
+        "bytes": total_bytes,
+        "aggregate_mbps": total_bytes / wall_seconds / 1e6 if wall_seconds > 0 else 0.0,
+        "object_ms": {
+            "min": percentile(latencies, 0.0) * 1000,
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "max": percentile(latencies, 1.0) * 1000,
+        },
+        "object_mbps_mean": sum(rates) / len(rates) if rates else 0.0,
+    }
+
 class MinioClient:
     def __init__(self, endpoint, access_key, secret_key):
         """Initialize MinIO client."""
@@ -17,35 +65,92 @@ class MinioClient:
             endpoint,
             access_key=access_key,
             secret_key=secret_key,
-            secure=False  # Set True if using HTTPS
+            secure=False,  # Set True if using HTTPS
+            # The default pool keeps 10 connections; parallel downloads need more
+            http_client=urllib3.PoolManager(
+                maxsize=MAX_DOWNLOAD_WORKERS,
+                timeout=urllib3.Timeout(connect=300, read=300),
+                retries=urllib3.Retry(
+                    total=5,
+                    backoff_factor=0.2,
+                    status_forcelist=[500, 502, 503, 504],
+                ),
+            )
         )
 
-    def download_directory(self, bucket_name, prefix, download_path):
-        """Recursively download a directory from MinIO to the local file system."""
+    def download_directory(self, bucket_name, prefix, download_path, workers=1):
+        """Recursively download a directory from MinIO to the local file system.
+
+        Objects are handed to a pool of ``workers`` threads as soon as they come
+        off the listing, so downloads start while later listing pages are still
+        arriving. At most ``2 * workers`` downloads are queued at any time.
+        Returns per-object and aggregate transfer statistics.
+        """
+        workers = max(1, min(int(workers), MAX_DOWNLOAD_WORKERS))
+        transfers = []
         try:
             # Ensure the bucket exists
             if not self.client.bucket_exists(bucket_name):
                 raise ValueError(f"Bucket '{bucket_name}' does not exist.")
-            
+
+            begin = datetime.datetime.utcnow()
+
             # List all objects in the specified prefix (directory)
             objects = self.client.list_objects(bucket_name, prefix=prefix, recursive=True)
 
-            for obj in objects:
-                local_file_path = os.path.join(download_path, os.path.relpath(obj.object_name, prefix))
-                local_dir = os.path.dirname(local_file_path)
-                
-                # Create the local directory if it doesn't exist
-                if not os.path.exists(local_dir):
-                    os.makedirs(local_dir)
-
-                # Download the file
-                self.client.fget_object(bucket_name, obj.object_name, local_file_path)
-                logging.info(f"Downloaded {obj.object_name} to {local_file_path}")
-        
+            slots = threading.BoundedSemaphore(2 * workers)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as pool:
+                futures = []
+                for obj in objects:
+                    slots.acquire()
+                    future = pool.submit(self._download_object, bucket_name, obj, prefix, download_path)
+                    future.add_done_callback(lambda _: slots.release())
+                    futures.append(future)
+                transfers = [future.result() for future in futures]
+
+            end = datetime.datetime.utcnow()
+
         except S3Error as e:
             logging.error(f"Error downloading directory: {e}")
             raise
 
+        return transfer_stats(transfers, (end - begin).total_seconds(), workers)
+
+    def _download_object(self, bucket_name, obj, prefix, download_path):
+        local_file_path = os.path.join(download_path, os.path.relpath(obj.object_name, prefix))
+        local_dir = os.path.dirname(local_file_path)
+
+        # Create the local directory if it doesn't exist
+        os.makedirs(local_dir, exist_ok=True)
+
+        # Download the file
+        begin = datetime.datetime.utcnow()
+        self.client.fget_object(bucket_name, obj.object_name, local_file_path)
+        elapsed = (datetime.datetime.utcnow() - begin).total_seconds()
+        logging.info(f"Downloaded {obj.object_name} to {local_file_path}")
+        return obj.size, elapsed
+
+    def list_directory(self, bucket_name, prefix):
+        """List every object under a prefix, without downloading anything."""
+        if not self.client.bucket_exists(bucket_name):
+            raise ValueError(f"Bucket '{bucket_name}' does not exist.")
+        return self.client.list_objects(bucket_name, prefix=prefix, recursive=True)
+
+    def upload_stream(self, bucket_name, key, stream, part_size, num_parallel_uploads=3):
+        """Upload a stream of unknown length to MinIO as a multipart upload."""
+        if not self.client.bucket_exists(bucket_name):
+            self.client.make_bucket(bucket_name)
+
+        self.client.put_object(
+            bucket_name,
+            key,
+            stream,
+            length=-1,
+            part_size=part_size,
+            num_parallel_uploads=num_parallel_uploads
+        )
+        logging.info(f"Streamed upload to {bucket_name}/{key}")
+
     def upload(self, bucket_name, key, file_path):
         """Upload a file to MinIO."""
         if not self.client.bucket_exists(bucket_name):
@@ -60,6 +165,8 @@ class MinioClient:
 class Function:
     def __init__(self):
         self.minio = None
+        # Where sharded runs send shard requests; unset runs shards in-process
+        self.shard_url = None
 
     def start(self, cfg):
         logging.info("Function starting")
@@ -68,6 +175,7 @@ class Function:
             cfg.get("MINIO_ACCESS_KEY", "minioadmin"),
             cfg.get("MINIO_SECRET_KEY", "minioadmin")
         )
+        self.shard_url = cfg.get("SHARD_URL")
 
     async def handle(self, scope, receive, send):
         if scope["method"] != "POST":
@@ -84,9 +192,55 @@ class Function:
 
         try:
             payload = json.loads(body.decode())
+            if payload.get("action") == "read":
+                await self.handle_read(send, payload)
+                return
+
             input_bucket = payload["input-bucket"]
             output_bucket = payload["output-bucket"]
             key = payload["objectKey"]
+            mode = payload.get("mode", "staged")
+            codec = get_codec(payload.get("codec", "zip"))
+            level = codec.resolve_level(payload.get("level"))
+            workers = compress_workers(payload)
+            writer_options = {
+                "indexed": payload.get("index", False),
+                "skip_incompressible": payload.get("skip_incompressible", False),
+                "dictionary": None,
+                "compare_dictionary": payload.get("compare_dictionary", True),
+            }
+            if payload.get("dictionary"):
+                writer_options["dictionary"] = self.load_dictionary(
+                    payload, input_bucket, key, output_bucket, codec, level
+                )
+            archive_key = f"{key}{codec.extension}"
+
+            if mode == "stream":
+                result = self.handle_stream(
+                    payload, input_bucket, output_bucket, key, codec, level, workers, writer_options
+                )
+                await self.respond(send, 200, json.dumps(result))
+                return
+            if mode == "incremental":
+                result = self.handle_incremental(
+                    input_bucket, output_bucket, key, codec, level, workers, writer_options
+                )
+                await self.respond(send, 200, json.dumps(result))
+                return
+            if mode == "sharded":
+                result = self.handle_sharded(
+                    payload, input_bucket, output_bucket, key, codec, level, workers, writer_options
+                )
+                await self.respond(send, 200, json.dumps(result))
+                return
+            if mode == "shard":
+                result = self.handle_shard(
+                    payload, input_bucket, output_bucket, key, codec, level, workers, writer_options
+                )
+                await self.respond(send, 200, json.dumps(result))
+                return
+            if mode != "staged":
+                raise ValueError(f"Unknown mode '{mode}'")
 
             start_time = datetime.datetime.utcnow()
 
@@ -95,27 +249,42 @@ class Function:
             os.makedirs(download_dir, exist_ok=True)
 
             # Step 1: Download entire directory from MinIO
-            self.minio.download_directory(input_bucket, key, download_dir)
+            download = self.minio.download_directory(
+                input_bucket, key, download_dir,
+                workers=payload.get("download_workers", DEFAULT_DOWNLOAD_WORKERS)
+            )
 
             # Step 2: Compress the downloaded directory
             compress_begin = datetime.datetime.utcnow()
-            zip_base_path = f"/tmp/{key}"
-            zip_path = f"{zip_base_path}.zip"
-            shutil.make_archive(zip_base_path, 'zip', root_dir=download_dir)
+            archive_path = f"/tmp/{archive_key}"
+            with open(archive_path, "wb") as f, codec.open(f, level, workers, **writer_options) as writer:
+                input_bytes = add_directory(writer, download_dir)
             compress_end = datetime.datetime.utcnow()
+            compressed_bytes = os.path.getsize(archive_path)
 
-            # Step 3: Upload the ZIP file to MinIO
-            self.minio.upload(output_bucket, f"{key}.zip", zip_path)
+            # Step 3: Upload the archive to MinIO
+            self.minio.upload(output_bucket, archive_key, archive_path)
+            extras = self.archive_extras(
+                output_bucket, archive_key, codec, writer, writer_options, compressed_bytes
+            )
 
             end_time = datetime.datetime.utcnow()
 
+            compression = compression_report(
+                codec, level, input_bytes, compressed_bytes,
+                (compress_end - compress_begin).total_seconds(), workers
+            )
             result = {
                 "status": "success",
-                "key": f"{key}.zip",
+                "key": archive_key,
+                **extras,
+                "compression": compression,
                 "timing": {
                     "download_ms": (compress_begin - start_time).total_seconds() * 1000,
                     "compress_ms": (compress_end - compress_begin).total_seconds() * 1000,
-                    "total_ms": (end_time - start_time).total_seconds() * 1000
+                    "compress_mbps": compression["compress_mbps"],
+                    "total_ms": (end_time - start_time).total_seconds() * 1000,
+                    "download": download
                 }
             }
             await self.respond(send, 200, json.dumps(result))
@@ -124,6 +293,258 @@ class Function:
             logging.exception("Error during processing")
             await self.respond(send, 500, f"Internal Server Error: {str(e)}")
 
+    def handle_stream(self, payload, input_bucket, output_bucket, key, codec, level, workers, writer_options):
+        """Download, compress and upload in one overlapped pass with no /tmp staging."""
+        start_time = datetime.datetime.utcnow()
+        archive_key = f"{key}{codec.extension}"
+        stats = stream_archive(
+            self.minio,
+            input_bucket,
+            key,
+            output_bucket,
+            archive_key,
+            codec,
+            level,
+            workers,
+            part_size=payload.get("part_size", 16 * 1024 * 1024),
+            num_parallel_uploads=payload.get("upload_parallelism", 3),
+            writer_options=writer_options,
+        )
+        extras = self.archive_extras(
+            output_bucket, archive_key, codec, stats["writer"], writer_options, stats["output_bytes"]
+        )
+        end_time = datetime.datetime.utcnow()
+
+        compression = compression_report(
+            codec, level, stats["input_bytes"], stats["output_bytes"],
+            stats["compress_ms"] / 1000, workers
+        )
+        return {
+            "status": "success",
+            "key": archive_key,
+            "mode": "stream",
+            **extras,
+            "members": stats["members"],
+            "peak_buffer_bytes": stats["peak_buffer_bytes"],
+            "compression": compression,
+            "timing": {
+                # Stages overlap, so these are time spent per stage, not phases
+                "download_ms": stats["download_ms"],
+                "compress_ms": stats["compress_ms"],
+                "compress_mbps": compression["compress_mbps"],
+                "pipeline_ms": stats["pipeline_ms"],
+                "total_ms": (end_time - start_time).total_seconds() * 1000
+            }
+        }
+
+    def handle_incremental(self, input_bucket, output_bucket, key, codec, level, workers, writer_options):
+        """Recompress only objects whose ETag changed since the previous archive."""
+        start_time = datetime.datetime.utcnow()
+        archive_key = f"{key}{codec.extension}"
+        stats = build_incremental(
+            self.minio, input_bucket, key, output_bucket, archive_key, codec, level, workers, writer_options
+        )
+        extras = self.archive_extras(
+            output_bucket, archive_key, codec, stats["writer"], writer_options, stats["output_bytes"]
+        )
+        end_time = datetime.datetime.utcnow()
+
+        compression = compression_report(
+            codec, level, stats["input_bytes"], stats["output_bytes"],
+            stats["compress_ms"] / 1000, workers
+        )
+        return {
+            "status": "success",
+            "key": archive_key,
+            "mode": "incremental",
+            **extras,
+            "members": stats["members"],
+            "incremental": {
+                "reused_members": stats["reused_members"],
+                "reused_bytes": stats["reused_bytes"],
+                "changed_members": stats["changed_members"],
+                "changed_bytes": stats["changed_bytes"],
+                "fetched_compressed_bytes": stats["fetched_compressed_bytes"],
+                "server_copied_bytes": stats["server_copied_bytes"],
+            },
+            "compression": compression,
+            "timing": {
+                "download_ms": stats["download_ms"],
+                "compress_ms": stats["compress_ms"],
+                "compress_mbps": compression["compress_mbps"],
+                "upload_ms": stats["upload_ms"],
+                "total_ms": (end_time - start_time).total_seconds() * 1000
+            }
+        }
+
+    def handle_sharded(self, payload, input_bucket, output_bucket, key, codec, level, workers, writer_options):
+        """Coordinate a scatter/gather run: one shard request per size-balanced shard."""
+        start_time = datetime.datetime.utcnow()
+        archive_key = f"{key}{codec.extension}"
+        shard_url = payload.get("shard_url", self.shard_url)
+        if shard_url:
+            invoke = HttpInvoker(shard_url)
+        else:
+            # In-process stand-in for local testing: shards run on threads here
+            def invoke(request):
+                return self.handle_shard(
+                    request, input_bucket, output_bucket, key, codec, level, workers, writer_options
+                )
+        stats = build_sharded(
+            self.minio, invoke, payload, input_bucket, key, output_bucket, archive_key, codec, level,
+            payload.get("shards", DEFAULT_SHARDS),
+        )
+        result = {
+            "status": "success",
+            "key": archive_key,
+            "mode": "sharded",
+        }
+        if writer_options["indexed"]:
+            index_bytes = upload_index(
+                self.minio.client,
+                output_bucket,
+                build_index(
+                    stats["index_members"], archive_key, stats["output_bytes"],
+                    writer_options["dictionary"].key if writer_options["dictionary"] else None,
+                ),
+            )
+            result["index"] = {"key": index_key(archive_key), "bytes": index_bytes}
+        end_time = datetime.datetime.utcnow()
+
+        # Shards compress concurrently, so throughput is measured over the scatter phase
+        compression = compression_report(
+            codec, level, stats["input_bytes"], stats["output_bytes"],
+            stats["scatter_ms"] / 1000, workers
+        )
+        result.update({
+            "members": stats["members"],
+            "shards": stats["shards"],
+            "compression": compression,
+            "timing": {
+                "list_ms": stats["list_ms"],
+                "scatter_ms": stats["scatter_ms"],
+                "merge_ms": stats["merge_ms"],
+                "compress_mbps": compression["compress_mbps"],
+                "total_ms": (end_time - start_time).total_seconds() * 1000
+            }
+        })
+        return result
+
+    def handle_shard(self, payload, input_bucket, output_bucket, key, codec, level, workers, writer_options):
+        """Stream one shard's objects into an archive fragment for the coordinator to merge."""
+        start_time = datetime.datetime.utcnow()
+        shard = payload["shard"]
+        stats = stream_archive(
+            self.minio,
+            input_bucket,
+            key,
+            output_bucket,
+            shard["key"],
+            codec,
+            level,
+            workers,
+            part_size=payload.get("part_size", 16 * 1024 * 1024),
+            num_parallel_uploads=payload.get("upload_parallelism", 3),
+            writer_options=dict(writer_options, fragment=True),
+            objects=shard_objects(shard),
+        )
+        end_time = datetime.datetime.utcnow()
+        result = {
+            "status": "success",
+            "shard": shard["id"],
+            "key": shard["key"],
+            "bytes": stats["output_bytes"],
+            "members": stats["members"],
+            "input_bytes": stats["input_bytes"],
+            **describe_fragment(codec, stats["writer"], writer_options["indexed"]),
+            "timing": {
+                "download_ms": stats["download_ms"],
+                "compress_ms": stats["compress_ms"],
+                "pipeline_ms": stats["pipeline_ms"],
+                "total_ms": (end_time - start_time).total_seconds() * 1000
+            }
+        }
+        if writer_options["skip_incompressible"]:
+            result["entropy"] = stats["writer"].entropy_report()
+        if writer_options["dictionary"]:
+            result["dictionary"] = stats["writer"].dictionary_report()
+        return result
+
+    def load_dictionary(self, payload, input_bucket, key, output_bucket, codec, level):
+        """The zstd dictionary for this dataset: cached in MinIO, or trained from the prefix.
+
+        'dictionary' is either true or {"dataset", "size", "retrain"}; the
+        dataset defaults to the input prefix.
+        """
+        if codec.name != "zstd":
+            raise ValueError("Dictionaries are only supported by codec 'zstd'")
+        options = payload["dictionary"] if isinstance(payload["dictionary"], dict) else {}
+        return load_or_train(
+            self.minio,
+            input_bucket,
+            key,
+            output_bucket,
+            options.get("dataset", key),
+            level,
+            options.get("size", DEFAULT_DICT_SIZE),
+            options.get("retrain", False),
+        )
+
+    def archive_extras(self, bucket_name, archive_key, codec, writer, writer_options, archive_size):
+        """Optional response sections that depend on how the archive writer was opened.
+
+        Stores the sidecar index (member -> byte range of the archive) when
+        one was requested.
+        """
+        extras = {}
+        dictionary = writer_options["dictionary"]
+        if writer_options["indexed"]:
+            index_bytes = upload_index(
+                self.minio.client,
+                bucket_name,
+                build_index(
+                    writer.index_members(codec.name), archive_key, archive_size,
+                    dictionary.key if dictionary else None,
+                ),
+            )
+            extras["index"] = {"key": index_key(archive_key), "bytes": index_bytes}
+        if writer_options["skip_incompressible"]:
+            extras["entropy"] = writer.entropy_report()
+        if dictionary:
+            extras["dictionary"] = dict(dictionary.report, **writer.dictionary_report())
+        return extras
+
+    async def handle_read(self, send, payload):
+        """Serve one archive member with a ranged GET instead of fetching the archive."""
+        bucket_name = payload.get("bucket") or payload["output-bucket"]
+        try:
+            content, stats = read_member(
+                self.minio.client, bucket_name, payload["objectKey"], payload["member"]
+            )
+        except FileNotFoundError as e:
+            await self.respond(send, 404, json.dumps({"error": str(e)}))
+            return
+        except S3Error as e:
+            if e.code != "NoSuchKey":
+                raise
+            await self.respond(send, 404, json.dumps({"error": f"No index for {payload['objectKey']}"}))
+            return
+        headers = [
+            [b"content-type", b"application/octet-stream"],
+            [b"x-fetched-bytes", str(stats["fetched_bytes"]).encode()],
+            [b"x-archive-bytes", str(stats["archive_size"]).encode()],
+            [b"x-timing", json.dumps(stats).encode()],
+        ]
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": headers
+        })
+        await send({
+            "type": "http.response.body",
+            "body": content
+        })
+
     async def respond(self, send, status, message):
         headers = [[b"content-type", b"application/json"]]
         await send({
@@ -0,0 +1,143 @@
+import collections
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def cpu_quota():
+    """Number of CPUs this container may use, from the cgroup CPU quota.
+
+    Falls back to the scheduler affinity mask when no quota is set, so a pod
+    limited to 4 CPUs on a 64-core node gets 4 workers, not 64.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        # A fractional quota (e.g. 1500m) still deserves a second worker
+        cpus = min(cpus, max(1, int(quota + 0.5)))
+    return cpus
+
+
+class OrderedPipeline:
+    """Runs compression tasks in a thread pool but emits their results in order.
+
+    Steps are either pool tasks, whose results go to ``sink``, or plain
+    callables that run on the caller's thread once every earlier step has
+    been emitted. At most ``window`` steps are pending, which bounds memory.
+    zlib, lzma, zstandard and lz4 all release the GIL while compressing, so
+    threads scale across cores without pickling blocks to other processes.
+    """
+
+    def __init__(self, workers, sink, window=None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compress")
+        self.sink = sink
+        self.window = window or 2 * workers
+        self.pending = collections.deque()
+
+    def submit(self, fn, *args):
+        self.pending.append(self.pool.submit(fn, *args))
+        self._drain(self.window)
+
+    def then(self, fn):
+        self.pending.append(fn)
+        self._drain(self.window)
+
+    def _drain(self, keep):
+        while len(self.pending) > keep:
+            step = self.pending.popleft()
+            if isinstance(step, Future):
+                self.sink(step.result())
+            else:
+                step()
+
+    def close(self):
+        try:
+            self._drain(0)
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class BlockParallelStream:
+    """Splits a byte stream into blocks compressed as independent frames.
+
+    gzip members, xz streams, zstd frames and lz4 frames may all be
+    concatenated, so the output remains one valid compressed file. Frames
+    are at most ``block_size`` long and also end at every offset passed to
+    ``end_frame_at``.
+    """
+
+    def __init__(self, fileobj, compress_block, workers, block_size):
+        self.fileobj = fileobj
+        self.compress_block = compress_block
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.pipeline = OrderedPipeline(workers, self._emit)
+        # (compressed offset, compressed size, uncompressed offset, uncompressed size)
+        self.frames = []
+        self.block_sizes = collections.deque()
+        self.compressed_offset = 0
+        self.uncompressed_offset = 0
+        # Uncompressed offset of the first buffered byte
+        self.buffer_offset = 0
+        self.boundaries = collections.deque()
+
+    def write(self, data):
+        self.buffer += data
+        self._cut()
+        return len(data)
+
+    def end_frame_at(self, offset):
+        """End a frame at uncompressed ``offset``, even if it arrives later."""
+        self.boundaries.append(offset)
+        self._cut()
+
+    def _cut(self):
+        while True:
+            while self.boundaries and self.boundaries[0] <= self.buffer_offset:
+                self.boundaries.popleft()
+            limit = self.block_size
+            if self.boundaries:
+                limit = min(limit, self.boundaries[0] - self.buffer_offset)
+            if len(self.buffer) < limit:
+                return
+            block = bytes(self.buffer[:limit])
+            del self.buffer[:limit]
+            self.buffer_offset += limit
+            self._submit(block)
+
+    def _submit(self, block):
+        self.block_sizes.append(len(block))
+        self.pipeline.submit(self.compress_block, block)
+
+    def _emit(self, frame):
+        size = self.block_sizes.popleft()
+        self.frames.append((self.compressed_offset, len(frame), self.uncompressed_offset, size))
+        self.compressed_offset += len(frame)
+        self.uncompressed_offset += size
+        self.fileobj.write(frame)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer_offset += len(self.buffer)
+            self.buffer = bytearray()
+        self.pipeline.close()
@@ -0,0 +1,104 @@
+import datetime
+import gzip
+import io
+import json
+import lzma
+import zlib
+
+INDEX_VERSION = 1
+
+
+def index_key(archive_key):
+    return f"{archive_key}.index.json"
+
+
+def build_index(members, archive_key, archive_size, dictionary=None):
+    """Sidecar index for ``archive_key`` from a closed writer's ``index_members``.
+
+    ``dictionary`` is the key of the zstd dictionary the frames need, if any.
+    """
+    index = {
+        "version": INDEX_VERSION,
+        "archive": archive_key,
+        "archive_size": archive_size,
+        "members": members,
+    }
+    if dictionary is not None:
+        index["dictionary"] = dictionary
+    return index
+
+
+def upload_index(client, bucket_name, index):
+    data = json.dumps(index, separators=(",", ":")).encode()
+    client.put_object(
+        bucket_name, index_key(index["archive"]), io.BytesIO(data), len(data),
+        content_type="application/json",
+    )
+    return len(data)
+
+
+def _zstd_decode(data, dictionary=None):
+    import zstandard
+
+    if dictionary is not None:
+        decompressor = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary))
+    else:
+        decompressor = zstandard.ZstdDecompressor()
+    return decompressor.stream_reader(io.BytesIO(data), read_across_frames=True).read()
+
+
+def _lz4_decode(data):
+    import lz4.frame
+
+    return lz4.frame.LZ4FrameFile(io.BytesIO(data)).read()
+
+
+DECODERS = {
+    "store": lambda data: data,
+    "deflate": lambda data: zlib.decompress(data, -15),
+    "gzip": gzip.decompress,
+    "xz": lzma.decompress,
+    "zstd": _zstd_decode,
+    "lz4": _lz4_decode,
+}
+
+
+def _get(client, bucket_name, object_name, **kwargs):
+    response = client.get_object(bucket_name, object_name, **kwargs)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def read_member(client, bucket_name, archive_key, member):
+    """Return one member's bytes using the sidecar index and a single ranged GET."""
+    begin = datetime.datetime.utcnow()
+    index = json.loads(_get(client, bucket_name, index_key(archive_key)))
+    entry = index["members"].get(member)
+    if entry is None:
+        raise FileNotFoundError(f"'{member}' is not a member of {archive_key}")
+    index_end = datetime.datetime.utcnow()
+
+    data = b""
+    if entry["compressed_size"]:
+        data = _get(client, bucket_name, archive_key, offset=entry["offset"], length=entry["compressed_size"])
+    fetch_end = datetime.datetime.utcnow()
+
+    if "dictionary" in index:
+        content = _zstd_decode(data, _get(client, bucket_name, index["dictionary"]))
+    else:
+        content = DECODERS[entry["codec"]](data)
+    content = content[entry["skip"]:entry["skip"] + entry["size"]]
+    if "crc" in entry and zlib.crc32(content) != entry["crc"]:
+        raise IOError(f"CRC mismatch for member '{member}' of {archive_key}")
+    end = datetime.datetime.utcnow()
+
+    return content, {
+        "fetched_bytes": len(data),
+        "archive_size": index["archive_size"],
+        "index_ms": (index_end - begin).total_seconds() * 1000,
+        "fetch_ms": (fetch_end - index_end).total_seconds() * 1000,
+        "decompress_ms": (end - fetch_end).total_seconds() * 1000,
+    }
@@ -0,0 +1,196 @@
+import datetime
+import heapq
+import json
+import logging
+import tarfile
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+from minio.error import S3Error
+
+from .incremental import ComposingSink
+from .zipformat import RawZipWriter, ZipEntry
+
+DEFAULT_SHARDS = 4
+# A tar archive ends with two zero blocks; fragments leave them out
+TAR_END_OF_ARCHIVE = b"\0" * (2 * tarfile.BLOCKSIZE)
+
+ShardObject = namedtuple("ShardObject", ["object_name", "size", "last_modified"])
+
+
+def partition(objects, shards):
+    """Split ``objects`` into at most ``shards`` groups of similar total size.
+
+    Largest objects go first, each into the currently lightest group (the
+    LPT heuristic), which keeps the slowest shard close to the mean. Each
+    group is returned in name order.
+    """
+    objects = list(objects)
+    shards = max(1, min(shards, len(objects)))
+    heap = [(0, i) for i in range(shards)]
+    groups = [[] for _ in range(shards)]
+    for obj in sorted(objects, key=lambda obj: obj.size, reverse=True):
+        total, i = heapq.heappop(heap)
+        groups[i].append(obj)
+        heapq.heappush(heap, (total + obj.size, i))
+    return [sorted(group, key=lambda obj: obj.object_name) for group in groups if group]
+
+
+def shard_request(payload, shard_id, shard_key, objects):
+    """The payload that asks one instance to compress one shard."""
+    request = {k: v for k, v in payload.items() if k not in ("shards", "shard_url")}
+    request["mode"] = "shard"
+    if isinstance(request.get("dictionary"), dict):
+        # The coordinator has already (re)trained it; shards load it from the cache
+        request["dictionary"] = dict(request["dictionary"], retrain=False)
+    request["shard"] = {
+        "id": shard_id,
+        "key": shard_key,
+        "objects": [
+            {
+                "name": obj.object_name,
+                "size": obj.size,
+                "last_modified": obj.last_modified.isoformat() if obj.last_modified else None,
+            }
+            for obj in objects
+        ],
+    }
+    return request
+
+
+def shard_objects(shard):
+    return [
+        ShardObject(
+            obj["name"],
+            obj["size"],
+            datetime.datetime.fromisoformat(obj["last_modified"]) if obj["last_modified"] else None,
+        )
+        for obj in shard["objects"]
+    ]
+
+
+def describe_fragment(codec, writer, indexed):
+    """What the coordinator needs from a closed fragment writer to merge it."""
+    layout = {}
+    if codec.is_zip:
+        layout["entries"] = [entry.to_dict() for entry in writer.zip.entries]
+    if indexed:
+        layout["index"] = writer.index_members(codec.name)
+    return layout
+
+
+class HttpInvoker:
+    """Sends shard requests to a Knative service, normally this function's own.
+
+    Every shard is a separate request, so the autoscaler spreads shards over
+    as many pods as the service's concurrency target allows.
+    """
+
+    def __init__(self, url, timeout=900):
+        self.url = url
+        self.http = urllib3.PoolManager(
+            maxsize=16,
+            timeout=urllib3.Timeout(connect=30, read=timeout),
+            # Shards overwrite the same fragment key, so a retried POST is safe
+            retries=urllib3.Retry(
+                total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=None,
+            ),
+        )
+
+    def __call__(self, request):
+        response = self.http.request(
+            "POST", self.url, body=json.dumps(request).encode(),
+            headers={"content-type": "application/json"},
+        )
+        if response.status != 200:
+            raise RuntimeError(
+                f"Shard {request['shard']['id']} failed with HTTP {response.status}: {response.data[:200]!r}"
+            )
+        return json.loads(response.data)
+
+
+def merge_shards(client, bucket_name, archive_key, codec, level, shards):
+    """Concatenate shard fragments into ``archive_key`` and append the trailer.
+
+    Fragments are copied server-side where they are large enough to be
+    composed. Zip gets one central directory covering every shard's
+    entries, with offsets moved by the shard's position in the archive; tar
+    gets its end-of-archive blocks as one more frame. Returns (archive
+    size, merged index members).
+    """
+    sink = ComposingSink(client, bucket_name, archive_key)
+    base = 0
+    entries = []
+    index = {}
+    for shard in shards:
+        sink.copy(bucket_name, shard["key"], 0, shard["bytes"])
+        entries.extend(ZipEntry.from_dict(fields, base) for fields in shard.get("entries", []))
+        for name, member in shard.get("index", {}).items():
+            index[name] = dict(member, offset=member["offset"] + base)
+        base += shard["bytes"]
+
+    if codec.is_zip:
+        directory = RawZipWriter(sink, offset=base)
+        directory.entries = entries
+        directory.close()
+        size = directory.offset
+    else:
+        trailer = codec.compress_frame(TAR_END_OF_ARCHIVE, level)
+        sink.write(trailer)
+        size = base + len(trailer)
+    sink.finalize()
+    return size, index
+
+
+def build_sharded(minio, invoke, payload, input_bucket, prefix, output_bucket, archive_key, codec, level,
+                  shards=DEFAULT_SHARDS):
+    """Scatter the objects under ``prefix`` over ``shards`` invocations, then gather.
+
+    ``invoke(request)`` runs one shard and returns its response: an HTTP
+    call to another instance, or an in-process call for local testing.
+    Each shard streams its objects into a fragment object; the fragments
+    are then merged into one archive and removed.
+    """
+    client = minio.client
+    if not client.bucket_exists(output_bucket):
+        client.make_bucket(output_bucket)
+
+    begin = datetime.datetime.utcnow()
+    groups = partition(minio.list_directory(input_bucket, prefix), shards)
+    run_id = uuid.uuid4().hex
+    requests = [
+        shard_request(payload, i, f"{archive_key}.shards/{run_id}/{i:04d}", group)
+        for i, group in enumerate(groups)
+    ]
+    list_end = datetime.datetime.utcnow()
+
+    try:
+        responses = []
+        if requests:
+            with ThreadPoolExecutor(max_workers=len(requests), thread_name_prefix="shard") as pool:
+                responses = list(pool.map(invoke, requests))
+        scatter_end = datetime.datetime.utcnow()
+        size, index = merge_shards(client, output_bucket, archive_key, codec, level, responses)
+        merge_end = datetime.datetime.utcnow()
+    finally:
+        for request in requests:
+            try:
+                client.remove_object(output_bucket, request["shard"]["key"])
+            except S3Error as e:
+                logging.warning(f"Could not remove shard fragment {request['shard']['key']}: {e}")
+
+    return {
+        "members": sum(response["members"] for response in responses),
+        "input_bytes": sum(response["input_bytes"] for response in responses),
+        "output_bytes": size,
+        "index_members": index,
+        "shards": [
+            {k: v for k, v in response.items() if k not in ("entries", "index", "status")}
+            for response in responses
+        ],
+        "list_ms": (list_end - begin).total_seconds() * 1000,
+        "scatter_ms": (scatter_end - list_end).total_seconds() * 1000,
+        "merge_ms": (merge_end - scatter_end).total_seconds() * 1000,
+    }
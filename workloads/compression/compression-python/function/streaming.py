@@ -0,0 +1,180 @@
+import datetime
+import logging
+import os
+import threading
+
+
+# S3 requires every multipart part except the last to be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class StreamPipe:
+    """Bounded in-memory byte pipe between a producer and a consumer thread.
+
+    The producer side (``write``/``close``) blocks once ``max_bytes`` are
+    buffered, so memory stays bounded no matter how large the archive gets.
+    The consumer side (``read``) is what ``Minio.put_object`` pulls parts from.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.closed = False
+        self.error = None
+        self.bytes_written = 0
+        self.peak_bytes = 0
+        self.cond = threading.Condition()
+
+    def write(self, data):
+        view = memoryview(data)
+        with self.cond:
+            while view:
+                while len(self.buffer) >= self.max_bytes and self.error is None:
+                    self.cond.wait()
+                if self.error is not None:
+                    raise IOError("stream pipe aborted") from self.error
+                room = self.max_bytes - len(self.buffer)
+                self.buffer += view[:room]
+                view = view[room:]
+                self.peak_bytes = max(self.peak_bytes, len(self.buffer))
+                self.cond.notify_all()
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def abort(self, error):
+        """Fail both ends of the pipe so neither thread blocks forever."""
+        with self.cond:
+            self.error = error
+            self.cond.notify_all()
+
+    def read(self, size=-1):
+        with self.cond:
+            while self.error is None and not self.closed and (
+                size < 0 or len(self.buffer) < size
+            ):
+                self.cond.wait()
+            if self.error is not None:
+                raise IOError("stream pipe aborted") from self.error
+            if size < 0 or size > len(self.buffer):
+                size = len(self.buffer)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            self.cond.notify_all()
+            return data
+
+
+class StreamTimer:
+    """Accumulates the time spent inside one pipeline stage."""
+
+    def __init__(self):
+        self.elapsed = datetime.timedelta()
+
+    def wrap_reader(self, stream):
+        timer = self
+
+        class _TimedReader:
+            def read(self, size=-1):
+                begin = datetime.datetime.utcnow()
+                data = stream.read(size)
+                timer.elapsed += datetime.datetime.utcnow() - begin
+                return data
+
+        return _TimedReader()
+
+    @property
+    def ms(self):
+        return self.elapsed.total_seconds() * 1000
+
+
+def write_members(client, bucket_name, objects, prefix, writer, download_timer, compress_timer):
+    """Feed each object's GET stream straight into an archive writer.
+
+    Time spent blocked on the GET streams is charged to ``download_timer``;
+    the rest of each ``writer.add`` call is charged to ``compress_timer``.
+    Returns (members, input bytes).
+    """
+    members = 0
+    input_bytes = 0
+    for obj in objects:
+        arcname = os.path.relpath(obj.object_name, prefix)
+        response = client.get_object(bucket_name, obj.object_name)
+        try:
+            read_before = download_timer.elapsed
+            begin = datetime.datetime.utcnow()
+            writer.add(arcname, download_timer.wrap_reader(response), obj.size, obj.last_modified)
+            add_elapsed = datetime.datetime.utcnow() - begin
+            compress_timer.elapsed += add_elapsed - (download_timer.elapsed - read_before)
+        finally:
+            response.close()
+            response.release_conn()
+
+        members += 1
+        input_bytes += obj.size
+        logging.info(f"Streamed {obj.object_name} into archive")
+    return members, input_bytes
+
+
+def stream_archive(minio, input_bucket, prefix, output_bucket, output_key, codec, level=None,
+                   workers=1, part_size=16 * 1024 * 1024, num_parallel_uploads=3, buffer_parts=2,
+                   writer_options=None, objects=None):
+    """Build ``output_key`` from every object under ``prefix`` without touching disk.
+
+    A producer thread downloads and compresses members into a ``StreamPipe``
+    while the calling thread hands the pipe to ``put_object`` as a
+    multipart upload of unknown length, so all three stages overlap.
+    ``objects`` restricts the archive to an explicit subset of the prefix.
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    pipe = StreamPipe(part_size * buffer_parts)
+    download_timer = StreamTimer()
+    compress_timer = StreamTimer()
+    produced = {}
+
+    if objects is None:
+        objects = minio.list_directory(input_bucket, prefix)
+
+    def produce():
+        try:
+            with codec.open(pipe, level, workers, **(writer_options or {})) as writer:
+                produced["writer"] = writer
+                produced["members"], produced["input_bytes"] = write_members(
+                    minio.client, input_bucket, objects, prefix, writer,
+                    download_timer, compress_timer,
+                )
+            pipe.close()
+        except BaseException as e:
+            logging.exception("Archive producer failed")
+            pipe.abort(e)
+
+    producer = threading.Thread(target=produce, name="archive-producer", daemon=True)
+    upload_begin = datetime.datetime.utcnow()
+    producer.start()
+    try:
+        minio.upload_stream(output_bucket, output_key, pipe, part_size, num_parallel_uploads)
+    except BaseException as e:
+        pipe.abort(e)
+        raise
+    finally:
+        producer.join()
+    upload_end = datetime.datetime.utcnow()
+
+    return {
+        "members": produced["members"],
+        "input_bytes": produced["input_bytes"],
+        "output_bytes": pipe.bytes_written,
+        "peak_buffer_bytes": pipe.peak_bytes,
+        "download_ms": download_timer.ms,
+        "compress_ms": compress_timer.ms,
+        "pipeline_ms": (upload_end - upload_begin).total_seconds() * 1000,
+        # Closed by now; callers read its index or entropy report
+        "writer": produced["writer"],
+    }
+
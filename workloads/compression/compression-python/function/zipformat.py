@@ -0,0 +1,204 @@
+import struct
+import zlib
+
+# Compression methods from the PKWARE APPNOTE
+STORED = 0
+DEFLATED = 8
+
+# Same threshold zipfile uses before it switches to zip64 records
+ZIP64_LIMIT = (1 << 31) - 1
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+END_OF_CENTRAL_DIR64 = struct.Struct("<IQHHIIQQQQ")
+END_OF_CENTRAL_DIR64_LOCATOR = struct.Struct("<IIQI")
+
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+# Made by: unix host, spec version 4.5
+VERSION_MADE_BY = (3 << 8) | VERSION_ZIP64
+UNIX_FILE_ATTRS = 0o100644 << 16
+
+
+class ZipEntry:
+    def __init__(self, name, method, dos_time, dos_date, header_offset, flags, zip64):
+        self.name = name
+        self.method = method
+        self.dos_time = dos_time
+        self.dos_date = dos_date
+        self.header_offset = header_offset
+        self.data_offset = None
+        self.flags = flags
+        self.zip64 = zip64
+        self.crc = 0
+        self.compressed_size = 0
+        self.file_size = 0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, fields, shift=0):
+        """Rebuild an entry, moving its offsets ``shift`` bytes further into the archive."""
+        entry = cls.__new__(cls)
+        vars(entry).update(fields)
+        entry.header_offset += shift
+        entry.data_offset += shift
+        return entry
+
+
+class RawZipWriter:
+    """Append-only zip writer for members whose data is compressed elsewhere.
+
+    Unlike ``zipfile``, it accepts already-compressed member bytes, so members
+    can be deflated in a worker pool (or copied from a previous archive) and
+    then spliced into the output in order. Every offset is tracked by
+    counting bytes, so the output stream never needs to be seekable.
+    """
+
+    def __init__(self, fileobj, offset=0):
+        self.fileobj = fileobj
+        # Bytes already in the archive ahead of this writer's output
+        self.offset = offset
+        self.entries = []
+        self.current = None
+
+    def _write(self, data):
+        self.fileobj.write(data)
+        self.offset += len(data)
+
+    def begin_member(self, name, method, mtime, size_hint):
+        """Write a local header whose CRC and sizes follow in a data descriptor."""
+        zip64 = size_hint * 1.05 > ZIP64_LIMIT
+        self.current = self._local_header(name, method, mtime, FLAG_DATA_DESCRIPTOR, 0, 0, 0, zip64)
+        return self.current
+
+    def write(self, data):
+        self._write(data)
+        self.current.compressed_size += len(data)
+
+    def end_member(self, crc, file_size):
+        entry = self.current
+        entry.crc = crc
+        entry.file_size = file_size
+        if entry.zip64:
+            self._write(struct.pack("<IIQQ", 0x08074b50, crc, entry.compressed_size, file_size))
+        else:
+            self._write(struct.pack("<IIII", 0x08074b50, crc, entry.compressed_size, file_size))
+        self.entries.append(entry)
+        self.current = None
+        return entry
+
+    def add_compressed(self, name, method, mtime, crc, file_size, data):
+        """Write a whole member whose compressed bytes and CRC are already known."""
+        return self.add_precompressed(
+            name, method, mtime, crc, file_size, len(data), lambda out: out.write(data)
+        )
+
+    def add_precompressed(self, name, method, mtime, crc, file_size, compressed_size, emit):
+        """Like ``add_compressed``, but ``emit(fileobj)`` supplies the member data.
+
+        This lets the caller splice in bytes it never holds in memory, such as
+        a byte range of an earlier archive copied server-side.
+        """
+        zip64 = max(file_size, compressed_size) > ZIP64_LIMIT
+        entry = self._local_header(name, method, mtime, 0, crc, compressed_size, file_size, zip64)
+        emit(self.fileobj)
+        self.offset += compressed_size
+        self.entries.append(entry)
+        return entry
+
+    def _local_header(self, name, method, mtime, flags, crc, compressed_size, file_size, zip64):
+        encoded = name.encode("utf-8")
+        if not encoded.isascii():
+            flags |= FLAG_UTF8
+        dos_time, dos_date = dos_date_time(mtime)
+        entry = ZipEntry(name, method, dos_time, dos_date, self.offset, flags, zip64)
+        entry.crc = crc
+        entry.compressed_size = compressed_size
+        entry.file_size = file_size
+
+        extra = b""
+        header_sizes = (compressed_size, file_size)
+        if zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, file_size, compressed_size)
+            header_sizes = (0xFFFFFFFF, 0xFFFFFFFF)
+        self._write(LOCAL_HEADER.pack(
+            0x04034b50, VERSION_ZIP64 if zip64 else VERSION_DEFAULT, flags, method,
+            dos_time, dos_date, crc, header_sizes[0], header_sizes[1], len(encoded), len(extra),
+        ))
+        self._write(encoded)
+        self._write(extra)
+        entry.data_offset = self.offset
+        return entry
+
+    def close(self):
+        """Write the central directory; zip64 end records are added only if needed."""
+        cd_offset = self.offset
+        for entry in self.entries:
+            self._write_central_header(entry)
+        cd_size = self.offset - cd_offset
+
+        count = len(self.entries)
+        if count >= 0xFFFF or cd_offset > ZIP64_LIMIT or cd_size > ZIP64_LIMIT:
+            eocd64_offset = self.offset
+            self._write(END_OF_CENTRAL_DIR64.pack(
+                0x06064b50, 44, VERSION_MADE_BY, VERSION_ZIP64, 0, 0, count, count, cd_size, cd_offset,
+            ))
+            self._write(END_OF_CENTRAL_DIR64_LOCATOR.pack(0x07064b50, 0, eocd64_offset, 1))
+            count = min(count, 0xFFFF)
+            cd_size = min(cd_size, 0xFFFFFFFF)
+            cd_offset = min(cd_offset, 0xFFFFFFFF)
+        self._write(END_OF_CENTRAL_DIR.pack(0x06054b50, 0, 0, count, count, cd_size, cd_offset, 0))
+
+    def _write_central_header(self, entry):
+        encoded = entry.name.encode("utf-8")
+        fields = []
+        file_size, compressed_size, header_offset = entry.file_size, entry.compressed_size, entry.header_offset
+        if file_size > ZIP64_LIMIT:
+            fields.append(file_size)
+            file_size = 0xFFFFFFFF
+        if compressed_size > ZIP64_LIMIT:
+            fields.append(compressed_size)
+            compressed_size = 0xFFFFFFFF
+        if header_offset > ZIP64_LIMIT:
+            fields.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = b""
+        if fields:
+            extra = struct.pack("<HH", 0x0001, 8 * len(fields)) + struct.pack(f"<{len(fields)}Q", *fields)
+        version = VERSION_ZIP64 if fields or entry.zip64 else VERSION_DEFAULT
+        self._write(CENTRAL_HEADER.pack(
+            0x02014b50, VERSION_MADE_BY, version, entry.flags, entry.method,
+            entry.dos_time, entry.dos_date, entry.crc, compressed_size, file_size,
+            len(encoded), len(extra), 0, 0, 0, UNIX_FILE_ATTRS, header_offset,
+        ))
+        self._write(encoded)
+        self._write(extra)
+
+
+def dos_date_time(mtime):
+    # The zip format cannot represent timestamps before 1980
+    if mtime is None or mtime.year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    dos_time = (mtime.hour << 11) | (mtime.minute << 5) | (mtime.second // 2)
+    dos_date = ((mtime.year - 1980) << 9) | (mtime.month << 5) | mtime.day
+    return dos_time, dos_date
+
+
+def deflate_block(data, level, zdict=None, final=True):
+    """Raw-deflate one block so that consecutive blocks concatenate into one stream.
+
+    Non-final blocks end on a sync flush (byte aligned, no BFINAL bit), as
+    pigz does; ``zdict`` primes the window with the previous block's tail so
+    splitting costs almost no ratio.
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
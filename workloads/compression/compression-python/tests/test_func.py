@@ -2,8 +2,21 @@
 An example set of unit tests which confirm that the main handler (the
 callable function) returns 200 OK for a simple HTTP GET.
 """
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+
 import pytest
 from function import new
+from minio.error import S3Error
+
+from function.func import MinioClient
+from function.incremental import build_incremental
+from function.seekable import build_index, read_member, upload_index
+from function.archive import CODECS, get_codec
+from function.streaming import stream_archive
 
 
 @pytest.mark.asyncio
@@ -36,3 +49,301 @@ async def test_function_handle():
     assert sent_ok, "Function did not send a 200 OK"
     assert sent_headers, "Function did not send headers"
     assert sent_body, "Function did not send a body"
+
+
+class FakeObject:
+    def __init__(self, object_name, data):
+        self.object_name = object_name
+        self.size = len(data)
+        self.etag = format(hash(data) & 0xffffffff, "08x")
+        self.last_modified = None
+
+
+class FakeResponse(io.BytesIO):
+    def release_conn(self):
+        pass
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.etag = format(hash(bytes(data)) & 0xffffffff, "08x")
+
+
+class FakeS3:
+    """In-memory stand-in for the subset of the Minio API the function uses."""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.composed = []
+
+    def _missing(self, object_name):
+        return S3Error(None, "NoSuchKey", "missing", object_name, None, None)
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0):
+        if object_name not in self.objects:
+            raise self._missing(object_name)
+        data = self.objects[object_name]
+        end = offset + length if length else len(data)
+        return FakeResponse(data[offset:end])
+
+    def bucket_exists(self, bucket_name):
+        return True
+
+    def stat_object(self, bucket_name, object_name):
+        if object_name not in self.objects:
+            raise self._missing(object_name)
+        return FakeResult(self.objects[object_name])
+
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        self.objects[object_name] = data.read(length)
+        return FakeResult(self.objects[object_name])
+
+    def remove_object(self, bucket_name, object_name):
+        del self.objects[object_name]
+
+    def compose_object(self, bucket_name, object_name, sources):
+        parts = []
+        for source in sources:
+            data = self.objects[source.object_name]
+            if source.offset is not None:
+                data = data[source.offset:source.offset + source.length]
+            parts.append(data)
+        assert all(len(part) >= 5 * 1024 * 1024 for part in parts[:-1])
+        self.composed.append(sources)
+        self.objects[object_name] = b"".join(parts)
+        return FakeResult(self.objects[object_name])
+
+    def list_objects(self, bucket_name, prefix=None, recursive=False):
+        # Input and output buckets share one namespace here, so only match
+        # whole directories to keep archives out of the listing
+        for name, data in sorted(self.objects.items()):
+            if name.startswith(prefix.rstrip("/") + "/"):
+                yield FakeObject(name, data)
+
+    def fget_object(self, bucket_name, object_name, file_path):
+        with open(file_path, "wb") as f:
+            f.write(self.objects[object_name])
+
+
+class FakeMinio:
+    def __init__(self, objects):
+        self.client = FakeS3(objects)
+
+    def list_directory(self, bucket_name, prefix):
+        return list(self.client.list_objects(bucket_name, prefix, recursive=True))
+
+    def upload_stream(self, bucket_name, key, stream, part_size, num_parallel_uploads=3):
+        data = b""
+        while True:
+            part = stream.read(part_size)
+            if not part:
+                break
+            data += part
+        self.client.objects[key] = data
+
+
+def test_stream_archive_produces_valid_zip():
+    files = {
+        "docs/a.tex": b"\\documentclass{acmart}\n" * 500,
+        "docs/sub/b.bib": b"@article{x, title={y}}\n" * 200,
+        "docs/empty.txt": b"",
+    }
+    minio = FakeMinio(files)
+
+    stats = stream_archive(minio, "in", "docs", "out", "docs.zip", get_codec("zip"),
+                           part_size=0, buffer_parts=1)
+
+    with zipfile.ZipFile(io.BytesIO(minio.client.objects["docs.zip"])) as archive:
+        assert sorted(archive.namelist()) == ["a.tex", "empty.txt", "sub/b.bib"]
+        assert archive.read("sub/b.bib") == files["docs/sub/b.bib"]
+    assert stats["members"] == 3
+    assert stats["input_bytes"] == sum(len(d) for d in files.values())
+    assert stats["peak_buffer_bytes"] <= 5 * 1024 * 1024
+
+
+def test_parallel_download_directory(tmp_path):
+    files = {f"docs/{i % 7}/f{i}.tex": bytes([i]) * (i + 1) for i in range(50)}
+    minio = MinioClient.__new__(MinioClient)
+    minio.client = FakeS3(files)
+
+    stats = minio.download_directory("in", "docs", str(tmp_path), workers=4)
+
+    assert stats["objects"] == 50
+    assert stats["workers"] == 4
+    assert stats["bytes"] == sum(len(d) for d in files.values())
+    for name, data in files.items():
+        assert (tmp_path / name[len("docs/"):]).read_bytes() == data
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_codecs_round_trip(name, workers):
+    files = {
+        "docs/a.tex": b"\\section{Intro}\n" * 100000,
+        "docs/b/c.bib": b"@misc{k}\n" * 50,
+        "docs/b/empty.txt": b"",
+    }
+    minio = FakeMinio(files)
+    codec = get_codec(name)
+
+    stats = stream_archive(minio, "in", "docs", "out", "out", codec, codec.max_level, workers, part_size=0)
+
+    data = minio.client.objects["out"]
+    assert stats["output_bytes"] == len(data)
+    if name == "zip":
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            assert archive.testzip() is None
+            assert archive.read("a.tex") == files["docs/a.tex"]
+            assert archive.read("b/c.bib") == files["docs/b/c.bib"]
+        return
+    # Parallel output is a sequence of independent frames, so decode across them
+    stream = io.BytesIO(data)
+    if name == "zstd":
+        import zstandard
+        stream = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    elif name == "lz4":
+        import lz4.frame
+        stream = lz4.frame.LZ4FrameFile(stream)
+    with tarfile.open(fileobj=stream, mode="r|*") as archive:
+        contents = {member.name: archive.extractfile(member).read() for member in archive}
+    assert contents["a.tex"] == files["docs/a.tex"]
+    assert contents["b/empty.txt"] == b""
+
+
+def test_codec_rejects_out_of_range_level():
+    with pytest.raises(ValueError):
+        get_codec("zstd").resolve_level(23)
+    with pytest.raises(ValueError):
+        get_codec("brotli")
+
+
+def test_incremental_reuses_unchanged_members():
+    files = {
+        "docs/big.bin": os.urandom(12 * 1024 * 1024),
+        "docs/a.tex": b"\\section{A}\n" * 1000,
+        "docs/b.tex": b"\\section{B}\n" * 1000,
+    }
+    minio = FakeMinio(files)
+    zip_codec = get_codec("zip")
+
+    first = build_incremental(minio, "in", "docs", "out", "docs.zip", zip_codec, 6, 2)
+    assert first["changed_members"] == 3 and first["reused_members"] == 0
+
+    minio.client.objects["docs/b.tex"] = b"\\section{B changed}\n" * 1000
+    second = build_incremental(minio, "in", "docs", "out", "docs.zip", zip_codec, 6, 2)
+
+    assert second["reused_members"] == 2
+    assert second["changed_members"] == 1
+    assert second["server_copied_bytes"] > 0
+    assert not any(".parts/" in name for name in minio.client.objects)
+    with zipfile.ZipFile(io.BytesIO(minio.client.objects["docs.zip"])) as archive:
+        assert archive.testzip() is None
+        assert archive.read("big.bin") == files["docs/big.bin"]
+        assert archive.read("b.tex") == b"\\section{B changed}\n" * 1000
+
+
+@pytest.mark.parametrize("name", ["zip", "zstd", "gzip"])
+def test_indexed_archive_serves_single_member(name):
+    files = {f"docs/f{i}.tex": f"\\input{{part{i}}}\n".encode() * (i * 3000) for i in range(6)}
+    minio = FakeMinio(files)
+    codec = get_codec(name)
+
+    stats = stream_archive(minio, "in", "docs", "out", "docs.arc", codec, workers=2,
+                           part_size=0, writer_options={"indexed": True})
+    members = stats["writer"].index_members(name)
+    upload_index(minio.client, "out", build_index(members, "docs.arc", stats["output_bytes"]))
+
+    for i in range(6):
+        content, read = read_member(minio.client, "out", "docs.arc", f"f{i}.tex")
+        assert content == files[f"docs/f{i}.tex"]
+        assert read["fetched_bytes"] <= stats["output_bytes"]
+    with pytest.raises(FileNotFoundError):
+        read_member(minio.client, "out", "docs.arc", "missing.tex")
+
+
+def test_incompressible_members_are_stored():
+    files = {
+        "docs/paper.pdf": b"%PDF-1.5\n" + os.urandom(20000),
+        "docs/noise.bin": os.urandom(50000),
+        "docs/main.tex": b"\\begin{document}\n" * 5000,
+    }
+    minio = FakeMinio(files)
+
+    stats = stream_archive(minio, "in", "docs", "out", "docs.zip", get_codec("zip"), part_size=0,
+                           writer_options={"skip_incompressible": True})
+
+    report = stats["writer"].entropy_report()
+    assert report["stored_members"] == 2
+    assert report["stored_kinds"] == {"pdf": 1, "entropy": 1}
+    assert report["stored_bytes"] == len(files["docs/paper.pdf"]) + len(files["docs/noise.bin"])
+    with zipfile.ZipFile(io.BytesIO(minio.client.objects["docs.zip"])) as archive:
+        assert archive.testzip() is None
+        assert archive.getinfo("noise.bin").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("main.tex").compress_type == zipfile.ZIP_DEFLATED
+
+
+@pytest.mark.parametrize("name", ["zip", "gzip", "zstd"])
+def test_sharded_run_merges_fragments(name):
+    files = {f"docs/d{i % 3}/f{i}.tex": f"\\label{{eq:{i}}}\n".encode() * (i * 2000) for i in range(10)}
+    files["docs/big.bin"] = os.urandom(6 * 1024 * 1024)
+    f = new()
+    f.minio = FakeMinio(files)
+    codec = get_codec(name)
+    writer_options = {"indexed": True, "skip_incompressible": False, "dictionary": None,
+                      "compare_dictionary": False}
+
+    result = f.handle_sharded({"shards": 3}, "in", "out", "docs", codec, None, 2, writer_options)
+
+    objects = f.minio.client.objects
+    assert result["members"] == len(files)
+    assert len(result["shards"]) == 3
+    assert not any(".shards/" in key for key in objects)
+    data = objects[result["key"]]
+    assert result["compression"]["compressed_bytes"] == len(data)
+    if name == "zip":
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            assert archive.testzip() is None
+            contents = {n: archive.read(n) for n in archive.namelist()}
+    else:
+        # tarfile's stream mode stops after the first gzip member; GzipFile does not
+        stream = gzip.GzipFile(fileobj=io.BytesIO(data))
+        if name == "zstd":
+            import zstandard
+            stream = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+        with tarfile.open(fileobj=stream, mode="r|") as archive:
+            contents = {member.name: archive.extractfile(member).read() for member in archive}
+    assert contents == {os.path.relpath(k, "docs"): v for k, v in files.items()}
+
+    content, _ = read_member(f.minio.client, "out", result["key"], "d1/f7.tex")
+    assert content == files["docs/d1/f7.tex"]
+
+
+def test_dictionary_compression_of_small_members():
+    files = {
+        f"docs/refs/r{i}.bib": (
+            f"@inproceedings{{key{i},\n  author = {{Author {i} and Coauthor {i * 7}}},\n"
+            f"  title = {{On the Study of Topic {i}}},\n  booktitle = {{Proceedings of CONF}},\n"
+            f"  year = {{{1990 + i % 30}}},\n  pages = {{{i}--{i + 12}}},\n}}\n"
+        ).encode()
+        for i in range(400)
+    }
+    f = new()
+    f.minio = FakeMinio(files)
+    codec = get_codec("zstd")
+    payload = {"dictionary": {"size": 4096}}
+
+    dictionary = f.load_dictionary(payload, "in", "docs", "out", codec, 3)
+    assert dictionary.report["source"] == "trained"
+    assert f.load_dictionary(payload, "in", "docs", "out", codec, 3).report["source"] == "cache"
+
+    writer_options = {"indexed": True, "skip_incompressible": False, "dictionary": dictionary,
+                      "compare_dictionary": True}
+    result = f.handle_stream({"part_size": 0}, "in", "out", "docs", codec, 3, 2, writer_options)
+
+    report = result["dictionary"]
+    assert report["frames"] >= len(files)
+    assert report["with_dictionary"]["ratio"] > report["without_dictionary"]["ratio"]
+    content, _ = read_member(f.minio.client, "out", result["key"], "refs/r17.bib")
+    assert content == files["docs/refs/r17.bib"]
+    with pytest.raises(ValueError):
+        get_codec("gzip").open(io.BytesIO(), dictionary=dictionary)
@@ -0,0 +1 @@
+from .func import new
@@ -0,0 +1,296 @@
+import datetime
+import gzip
+import io
+import logging
+import lzma
+import posixpath
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Ranged GETs for zip archives fetch this much at a time
+READ_AHEAD = 8 * 1024 * 1024
+
+# Archive extension -> codec, longest suffixes first
+EXTENSIONS = [
+    (".tar.gz", "gzip"),
+    (".tgz", "gzip"),
+    (".tar.xz", "xz"),
+    (".tar.zst", "zstd"),
+    (".tar.lz4", "lz4"),
+    (".tar", "tar"),
+    (".zip", "zip"),
+]
+
+
+def detect_codec(archive_key):
+    for extension, codec in EXTENSIONS:
+        if archive_key.endswith(extension):
+            return codec
+    raise ValueError(f"Cannot tell the codec of '{archive_key}'; pass 'codec'")
+
+
+def strip_extension(archive_key):
+    for extension, _ in EXTENSIONS:
+        if archive_key.endswith(extension):
+            return archive_key[:-len(extension)]
+    return archive_key
+
+
+def member_key(prefix, name):
+    """Object key for an archive member, or None for names that escape the prefix."""
+    name = posixpath.normpath(name.lstrip("/"))
+    if name in (".", "") or name.startswith("../") or name == "..":
+        return None
+    return f"{prefix.rstrip('/')}/{name}"
+
+
+class StreamTimer:
+    """Accumulates the time spent inside one pipeline stage."""
+
+    def __init__(self):
+        self.elapsed = datetime.timedelta()
+
+    def wrap_reader(self, stream):
+        timer = self
+
+        class _TimedReader:
+            def read(self, size=-1):
+                begin = datetime.datetime.utcnow()
+                data = stream.read(size)
+                timer.elapsed += datetime.datetime.utcnow() - begin
+                return data
+
+        return _TimedReader()
+
+    @property
+    def ms(self):
+        return self.elapsed.total_seconds() * 1000
+
+
+class RangedObject(io.RawIOBase):
+    """Seekable, read-only view of an object backed by ranged GETs.
+
+    zipfile needs to seek to the central directory at the end of the
+    archive and back to each member; reading ahead ``read_ahead`` bytes
+    per GET turns the in-order member reads into a few large requests.
+    """
+
+    def __init__(self, client, bucket_name, object_name, size, timer, read_ahead=READ_AHEAD):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.size = size
+        self.timer = timer
+        self.read_ahead = read_ahead
+        self.position = 0
+        self.buffer = b""
+        self.buffer_offset = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, b):
+        if self.position >= self.size:
+            return 0
+        start = self.position - self.buffer_offset
+        if not 0 <= start < len(self.buffer):
+            length = max(len(b), self.read_ahead)
+            # Near the end, read a whole window back from the end instead, so
+            # the end records and central directory come in one request
+            offset = min(self.position, max(0, self.size - length))
+            self._fetch(offset, length)
+            start = self.position - offset
+        n = min(len(b), len(self.buffer) - start)
+        b[:n] = self.buffer[start:start + n]
+        self.position += n
+        return n
+
+    def _fetch(self, offset, length):
+        length = min(length, self.size - offset)
+        begin = datetime.datetime.utcnow()
+        response = self.client.get_object(self.bucket_name, self.object_name, offset=offset, length=length)
+        try:
+            self.buffer = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        self.timer.elapsed += datetime.datetime.utcnow() - begin
+        self.buffer_offset = offset
+
+
+class MemberUploader:
+    """Uploads members as they are decoded.
+
+    Members that fit in one part are read into memory and uploaded by a
+    pool of ``workers`` threads while decoding moves on; at most
+    ``2 * workers`` of them are in flight. Larger members are uploaded
+    straight from the decoder as a multipart upload whose parts go up
+    ``num_parallel_uploads`` at a time.
+    """
+
+    def __init__(self, client, bucket_name, part_size, num_parallel_uploads, workers):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.part_size = part_size
+        self.num_parallel_uploads = num_parallel_uploads
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self.slots = threading.BoundedSemaphore(2 * workers)
+        self.futures = []
+        # Time the decoding thread spent waiting on uploads
+        self.blocked = datetime.timedelta()
+        self.members = 0
+        self.bytes = 0
+
+    def upload(self, key, stream, size):
+        """Upload ``size`` bytes of ``stream``; time spent reading it is not charged here."""
+        read_timer = StreamTimer()
+        reader = read_timer.wrap_reader(stream)
+        begin = datetime.datetime.utcnow()
+        if size <= self.part_size:
+            data = reader.read(size)
+            self.slots.acquire()
+            future = self.pool.submit(self._put, key, data)
+            future.add_done_callback(lambda _: self.slots.release())
+            self.futures.append(future)
+        else:
+            self.client.put_object(
+                self.bucket_name, key, reader, size,
+                part_size=self.part_size, num_parallel_uploads=self.num_parallel_uploads,
+            )
+        self.blocked += datetime.datetime.utcnow() - begin - read_timer.elapsed
+        self.members += 1
+        self.bytes += size
+
+    def _put(self, key, data):
+        self.client.put_object(self.bucket_name, key, io.BytesIO(data), len(data))
+        logging.info(f"Uploaded {key}")
+
+    def close(self):
+        begin = datetime.datetime.utcnow()
+        try:
+            for future in self.futures:
+                future.result()
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.blocked += datetime.datetime.utcnow() - begin
+
+
+def _decompressor(codec, stream, dictionary=None):
+    # Every reader here continues across concatenated members/frames, as
+    # written by parallel compressors
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=stream)
+    if codec == "xz":
+        return lzma.LZMAFile(stream)
+    if codec == "zstd":
+        import zstandard
+
+        if dictionary is not None:
+            decompressor = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary))
+        else:
+            decompressor = zstandard.ZstdDecompressor()
+        return decompressor.stream_reader(stream, read_across_frames=True)
+    if codec == "lz4":
+        import lz4.frame
+
+        return lz4.frame.LZ4FrameFile(stream)
+    if dictionary is not None:
+        raise ValueError("Dictionaries are only supported by codec 'zstd'")
+    if codec == "tar":
+        return stream
+    raise ValueError(f"Unknown codec '{codec}'")
+
+
+def extract_tar(client, bucket_name, archive_key, codec, prefix, uploader, download_timer, dictionary=None):
+    """Decode a tar archive from one streaming GET; returns compressed bytes read."""
+    response = client.get_object(bucket_name, archive_key)
+    counter = {"bytes": 0}
+
+    class _CountingReader:
+        def read(self, size=-1):
+            data = response.read(size)
+            counter["bytes"] += len(data)
+            return data
+
+    try:
+        stream = _decompressor(codec, download_timer.wrap_reader(_CountingReader()), dictionary)
+        with tarfile.open(fileobj=stream, mode="r|") as archive:
+            for member in archive:
+                key = member_key(prefix, member.name)
+                if not member.isfile() or key is None:
+                    continue
+                uploader.upload(key, archive.extractfile(member), member.size)
+    finally:
+        response.close()
+        response.release_conn()
+    return counter["bytes"]
+
+
+def extract_zip(client, bucket_name, archive_key, prefix, uploader, download_timer):
+    """Decode a zip archive through ranged GETs; returns compressed bytes read."""
+    size = client.stat_object(bucket_name, archive_key).size
+    source = RangedObject(client, bucket_name, archive_key, size, download_timer)
+    with zipfile.ZipFile(source) as archive:
+        # In archive order, so the read-ahead buffer is consumed sequentially
+        for info in sorted(archive.infolist(), key=lambda info: info.header_offset):
+            key = member_key(prefix, info.filename)
+            if info.is_dir() or key is None:
+                continue
+            with archive.open(info) as member:
+                uploader.upload(key, member, info.file_size)
+    return size
+
+
+def extract_archive(client, input_bucket, archive_key, output_bucket, prefix, codec,
+                    part_size=16 * 1024 * 1024, num_parallel_uploads=3, upload_workers=8, dictionary=None):
+    """Extract every member of ``archive_key`` to objects under ``prefix``.
+
+    Nothing is staged on disk: the archive is decoded while it downloads,
+    and each member is uploaded as soon as it is decoded. ``dictionary`` is
+    the raw zstd dictionary the archive was compressed with, if any.
+    """
+    if not client.bucket_exists(output_bucket):
+        client.make_bucket(output_bucket)
+    download_timer = StreamTimer()
+    uploader = MemberUploader(client, output_bucket, part_size, num_parallel_uploads, upload_workers)
+
+    begin = datetime.datetime.utcnow()
+    try:
+        if codec == "zip":
+            compressed_bytes = extract_zip(client, input_bucket, archive_key, prefix, uploader, download_timer)
+        else:
+            compressed_bytes = extract_tar(
+                client, input_bucket, archive_key, codec, prefix, uploader, download_timer, dictionary
+            )
+    finally:
+        uploader.close()
+    elapsed = datetime.datetime.utcnow() - begin
+
+    upload_ms = uploader.blocked.total_seconds() * 1000
+    pipeline_ms = elapsed.total_seconds() * 1000
+    return {
+        "members": uploader.members,
+        "compressed_bytes": compressed_bytes,
+        "output_bytes": uploader.bytes,
+        "download_ms": download_timer.ms,
+        # Whatever the decoding thread did besides waiting on either end
+        "decompress_ms": max(0.0, pipeline_ms - download_timer.ms - upload_ms),
+        "upload_ms": upload_ms,
+        "pipeline_ms": pipeline_ms,
+    }
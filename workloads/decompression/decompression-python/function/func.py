@@ -0,0 +1,148 @@
+import logging
+import json
+import datetime
+import urllib3
+from minio import Minio
+from .extract import detect_codec, extract_archive, strip_extension
+
+# Sizes the HTTP pool: member uploads plus the parts of one multipart upload
+MAX_UPLOAD_WORKERS = 32
+DEFAULT_UPLOAD_WORKERS = 8
+
+def new():
+    return Function()
+
+class MinioClient:
+    def __init__(self, endpoint, access_key, secret_key):
+        """Initialize MinIO client."""
+        self.client = Minio(
+            endpoint,
+            access_key=access_key,
+            secret_key=secret_key,
+            secure=False,  # Set True if using HTTPS
+            # The default pool keeps 10 connections; concurrent uploads need more
+            http_client=urllib3.PoolManager(
+                maxsize=2 * MAX_UPLOAD_WORKERS,
+                timeout=urllib3.Timeout(connect=300, read=300),
+                retries=urllib3.Retry(
+                    total=5,
+                    backoff_factor=0.2,
+                    status_forcelist=[500, 502, 503, 504],
+                ),
+            )
+        )
+
+
+class Function:
+    def __init__(self):
+        self.minio = None
+
+    def start(self, cfg):
+        logging.info("Function starting")
+        self.minio = MinioClient(
+            cfg.get("MINIO_ENDPOINT", "minio:9000"),
+            cfg.get("MINIO_ACCESS_KEY", "minioadmin"),
+            cfg.get("MINIO_SECRET_KEY", "minioadmin")
+        )
+
+    async def handle(self, scope, receive, send):
+        if scope["method"] != "POST":
+            await self.respond(send, 405, "Method Not Allowed")
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.request":
+                body += message.get("body", b"")
+                more_body = message.get("more_body", False)
+
+        try:
+            payload = json.loads(body.decode())
+            result = self.extract(payload)
+            await self.respond(send, 200, json.dumps(result))
+
+        except Exception as e:
+            logging.exception("Error during processing")
+            await self.respond(send, 500, f"Internal Server Error: {str(e)}")
+
+    def extract(self, payload):
+        """Unpack an archive into a prefix, streaming both the archive and the members."""
+        start_time = datetime.datetime.utcnow()
+        input_bucket = payload["input-bucket"]
+        output_bucket = payload["output-bucket"]
+        key = payload["objectKey"]
+        codec = payload.get("codec") or detect_codec(key)
+        prefix = payload.get("prefix") or strip_extension(key)
+        dictionary = None
+        if payload.get("dictionary"):
+            # Key of a zstd dictionary written by compression-python
+            response = self.minio.client.get_object(
+                payload.get("dictionary-bucket", input_bucket), payload["dictionary"]
+            )
+            try:
+                dictionary = response.read()
+            finally:
+                response.close()
+                response.release_conn()
+        upload_workers = max(1, min(int(payload.get("upload_workers", DEFAULT_UPLOAD_WORKERS)), MAX_UPLOAD_WORKERS))
+
+        stats = extract_archive(
+            self.minio.client,
+            input_bucket,
+            key,
+            output_bucket,
+            prefix,
+            codec,
+            part_size=payload.get("part_size", 16 * 1024 * 1024),
+            num_parallel_uploads=payload.get("upload_parallelism", 3),
+            upload_workers=upload_workers,
+            dictionary=dictionary,
+        )
+        end_time = datetime.datetime.utcnow()
+
+        decompress_seconds = stats["decompress_ms"] / 1000
+        return {
+            "status": "success",
+            "key": key,
+            "prefix": prefix,
+            "members": stats["members"],
+            "decompression": {
+                "codec": codec,
+                "upload_workers": upload_workers,
+                "compressed_bytes": stats["compressed_bytes"],
+                "output_bytes": stats["output_bytes"],
+                "ratio": stats["output_bytes"] / stats["compressed_bytes"] if stats["compressed_bytes"] else 0.0,
+            },
+            "timing": {
+                # Stages overlap, so these are time spent per stage, not phases
+                "download_ms": stats["download_ms"],
+                "decompress_ms": stats["decompress_ms"],
+                "decompress_mbps": stats["output_bytes"] / decompress_seconds / 1e6 if decompress_seconds > 0 else 0.0,
+                "upload_ms": stats["upload_ms"],
+                "pipeline_ms": stats["pipeline_ms"],
+                "total_ms": (end_time - start_time).total_seconds() * 1000
+            }
+        }
+
+    async def respond(self, send, status, message):
+        headers = [[b"content-type", b"application/json"]]
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": headers
+        })
+        await send({
+            "type": "http.response.body",
+            "body": message.encode()
+        })
+
+    def stop(self):
+        logging.info("Function stopping")
+
+    def alive(self):
+        return True, "Alive"
+
+    def ready(self):
+        return True, "Ready"
@@ -0,0 +1,177 @@
+"""
+Unit tests for the extract function, run against an in-memory object store.
+"""
+import gzip
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+import pytest
+from function import new
+from function.extract import detect_codec, extract_archive, member_key
+
+FILES = {
+    "main.tex": b"\\documentclass{acmart}\n" * 4000,
+    "figures/plot.png": b"\x89PNG\r\n\x1a\n" + os.urandom(3000),
+    "sections/empty.tex": b"",
+}
+
+
+class FakeStat:
+    def __init__(self, data):
+        self.size = len(data)
+
+
+class FakeResponse(io.BytesIO):
+    def release_conn(self):
+        pass
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.ranged_gets = 0
+
+    def bucket_exists(self, bucket_name):
+        return True
+
+    def stat_object(self, bucket_name, object_name):
+        return FakeStat(self.objects[object_name])
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0):
+        data = self.objects[object_name]
+        if length:
+            self.ranged_gets += 1
+        end = offset + length if length else len(data)
+        return FakeResponse(data[offset:end])
+
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        self.objects[object_name] = data.read(length)
+
+
+class Unseekable(io.RawIOBase):
+    """Forces zipfile to write data descriptors, as streaming writers do."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+def make_zip():
+    out = Unseekable()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in FILES.items():
+            compress_type = zipfile.ZIP_STORED if name.endswith(".png") else zipfile.ZIP_DEFLATED
+            archive.writestr(name, data, compress_type=compress_type)
+    return bytes(out.data)
+
+
+def make_tar():
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w|") as archive:
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def in_frames(data, compress, frame_size=4096):
+    # Parallel compressors emit independent frames back to back
+    return b"".join(compress(data[i:i + frame_size]) for i in range(0, len(data), frame_size))
+
+
+def make_archive(codec):
+    if codec == "zip":
+        return make_zip()
+    tar = make_tar()
+    if codec == "gzip":
+        return in_frames(tar, gzip.compress)
+    if codec == "zstd":
+        import zstandard
+        return in_frames(tar, zstandard.ZstdCompressor().compress)
+    if codec == "lz4":
+        import lz4.frame
+        return in_frames(tar, lz4.frame.compress)
+    return tar
+
+
+@pytest.mark.parametrize("codec", ["zip", "gzip", "zstd", "lz4", "tar"])
+def test_extract_archive_round_trip(codec):
+    client = FakeS3({"paper.arc": make_archive(codec)})
+
+    stats = extract_archive(client, "in", "paper.arc", "out", "paper", codec,
+                            part_size=8192, upload_workers=2)
+
+    assert stats["members"] == len(FILES)
+    assert stats["output_bytes"] == sum(len(data) for data in FILES.values())
+    assert stats["compressed_bytes"] == len(client.objects["paper.arc"])
+    for name, data in FILES.items():
+        assert client.objects[f"paper/{name}"] == data
+
+
+def test_zip_is_read_with_few_ranged_gets():
+    client = FakeS3({"paper.zip": make_zip()})
+
+    extract_archive(client, "in", "paper.zip", "out", "paper", "zip")
+
+    # One read-ahead covers this small archive end to end
+    assert client.ranged_gets == 1
+
+
+def test_member_names_stay_inside_prefix():
+    assert member_key("out/", "/a/b.tex") == "out/a/b.tex"
+    assert member_key("out", "a/../../etc/passwd") is None
+    assert detect_codec("x.tar.zst") == "zstd"
+    with pytest.raises(ValueError):
+        detect_codec("x.rar")
+
+
+@pytest.mark.asyncio
+async def test_function_handle():
+    f = new()
+    f.minio = type("FakeMinio", (), {"client": FakeS3({"paper.tar.gz": make_archive("gzip")})})()
+    body = json.dumps({"input-bucket": "in", "output-bucket": "out", "objectKey": "paper.tar.gz"}).encode()
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await f.handle({"method": "POST"}, receive, send)
+
+    assert sent[0]["status"] == 200
+    result = json.loads(sent[1]["body"])
+    assert result["prefix"] == "paper"
+    assert result["members"] == len(FILES)
+    assert set(result["timing"]) >= {"download_ms", "decompress_ms", "upload_ms"}
+    assert f.minio.client.objects["paper/main.tex"] == FILES["main.tex"]
+
+
+def test_extract_with_zstd_dictionary():
+    import zstandard
+    samples = [f"@misc{{k{i}, title={{Item {i}}}, year={{{2000 + i % 20}}}}}\n".encode() * 3 for i in range(300)]
+    dictionary = zstandard.train_dictionary(2048, samples)
+    compressor = zstandard.ZstdCompressor(dict_data=dictionary)
+    client = FakeS3({
+        "paper.tar.zst": in_frames(make_tar(), compressor.compress),
+        "dictionaries/paper.zdict": dictionary.as_bytes(),
+    })
+    f = new()
+    f.minio = type("FakeMinio", (), {"client": client})()
+
+    result = f.extract({"input-bucket": "in", "output-bucket": "out", "objectKey": "paper.tar.zst",
+                        "dictionary": "dictionaries/paper.zdict"})
+
+    assert result["members"] == len(FILES)
+    assert client.objects["paper/main.tex"] == FILES["main.tex"]
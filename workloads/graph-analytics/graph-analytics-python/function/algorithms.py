@@ -0,0 +1,34 @@
+from .csr import CSRGraph, bfs, pagerank, spanning_forest
+
+
+def run_bfs(graph):
+    """BFS from vertex 0, in graph-bfs-python's result layout."""
+    if isinstance(graph, CSRGraph):
+        order, layers, parents = bfs(graph, 0)
+        return {"order": order.tolist(), "dist": layers, "parents": parents.tolist()}
+    order, layers, parents = graph.bfs(0)
+    return {"order": order, "dist": layers, "parents": parents}
+
+
+def run_mst(graph):
+    """Spanning tree edge list, in graph-mst-python's result layout."""
+    if isinstance(graph, CSRGraph):
+        sources, targets = spanning_forest(graph)
+        return [[int(u), int(v)] for u, v in zip(sources, targets)]
+    return [list(edge.tuple) for edge in graph.spanning_tree(None, True).es]
+
+
+def run_pagerank(graph):
+    """PageRank in graph-pagerank-python's result layout."""
+    if isinstance(graph, CSRGraph):
+        ranks, _, _ = pagerank(graph)
+        return float(ranks[0])
+    return graph.pagerank()[0]
+
+
+# Kernels selectable with the request's "algorithm"
+ALGORITHMS = {
+    "bfs": run_bfs,
+    "mst": run_mst,
+    "pagerank": run_pagerank,
+}
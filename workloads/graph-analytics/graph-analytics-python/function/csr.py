@@ -0,0 +1,327 @@
+import struct
+
+import numpy as np
+
+MAGIC = b"CSRG"
+FORMAT_VERSION = 1
+# magic, version, flags, vertices, adjacency entries; padded to 32 bytes so
+# the arrays that follow stay 8-byte aligned for mmap
+HEADER = struct.Struct("<4sHHQQ4x")
+FLAG_DIRECTED = 1
+FLAG_OFFSETS_INT64 = 2
+FLAG_NEIGHBORS_INT64 = 4
+
+INT32_MAX = np.iinfo(np.int32).max
+
+# Parent markers, as igraph's bfs reports them
+ROOT = -1
+UNREACHED = -2
+
+# Adjacency entries PageRank pushes per step, bounding its temporaries
+PAGERANK_CHUNK = 1 << 22
+
+# Sources one multi-source BFS pass carries, one bit of a uint64 each
+MSBFS_WIDTH = 64
+
+
+def index_dtype(max_value):
+    return np.int32 if max_value <= INT32_MAX else np.int64
+
+
+class CSRGraph:
+    """Adjacency in compressed sparse row form.
+
+    ``neighbors[offsets[v]:offsets[v + 1]]`` are the neighbors of ``v`` in
+    ascending order. Undirected graphs store every edge in both rows.
+    Arrays are int32 whenever the vertex and entry counts allow it, and may
+    be ``np.memmap`` views of a snapshot file, in which case the graph is
+    paged in from disk on demand instead of being held in memory.
+    """
+
+    def __init__(self, offsets, neighbors, directed=False):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.directed = directed
+
+    @property
+    def num_vertices(self):
+        return len(self.offsets) - 1
+
+    @property
+    def num_entries(self):
+        return len(self.neighbors)
+
+    @property
+    def num_edges(self):
+        return self.num_entries if self.directed else self.num_entries // 2
+
+    @property
+    def nbytes(self):
+        """Bytes held in memory; memory-mapped arrays live in the page cache instead."""
+        return sum(a.nbytes for a in (self.offsets, self.neighbors) if not isinstance(a, np.memmap))
+
+    def degrees(self):
+        return np.diff(self.offsets)
+
+    @classmethod
+    def from_edges(cls, num_vertices, sources, targets, directed=False, simplify=False):
+        """Build from parallel endpoint arrays; undirected edges are mirrored.
+
+        With ``simplify``, self-loops and repeated edges are dropped.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if simplify:
+            keep = sources != targets
+            sources, targets = sources[keep], targets[keep]
+        if not directed:
+            sources, targets = np.concatenate((sources, targets)), np.concatenate((targets, sources))
+        # Sorting one (source, target) key is much cheaper than a lexsort over two,
+        # and leaves every row in ascending order
+        keys = sources * num_vertices + targets
+        keys.sort()
+        if simplify and len(keys):
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        counts = np.bincount(keys // num_vertices, minlength=num_vertices)
+        offsets = np.zeros(num_vertices + 1, dtype=index_dtype(len(keys)))
+        np.cumsum(counts, out=offsets[1:])
+        return cls(offsets, (keys % num_vertices).astype(index_dtype(num_vertices)), directed)
+
+    @classmethod
+    def from_igraph(cls, graph):
+        edges = np.array(graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+        return cls.from_edges(graph.vcount(), edges[:, 0], edges[:, 1], graph.is_directed())
+
+    def edges(self):
+        """(sources, targets) with every undirected edge once, as u <= v."""
+        sources = np.repeat(np.arange(self.num_vertices, dtype=self.neighbors.dtype), self.degrees())
+        if self.directed:
+            return sources, np.asarray(self.neighbors)
+        keep = sources <= self.neighbors
+        return sources[keep], np.asarray(self.neighbors)[keep]
+
+    def to_igraph(self):
+        import igraph
+
+        sources, targets = self.edges()
+        return igraph.Graph(n=self.num_vertices, edges=np.column_stack((sources, targets)), directed=self.directed)
+
+    def gather(self, vertices):
+        """Neighbors of ``vertices`` as (position in ``vertices``, neighbor) arrays.
+
+        Entries come out row by row in the order of ``vertices``, without a
+        Python-level loop over rows.
+        """
+        starts = self.offsets[vertices].astype(np.int64)
+        counts = self.offsets[vertices + 1] - starts
+        owner = np.repeat(np.arange(len(vertices)), counts)
+        row_begin = np.cumsum(counts) - counts
+        positions = np.arange(len(owner)) - row_begin[owner] + starts[owner]
+        return owner, self.neighbors[positions]
+
+    def save(self, path):
+        """Write the snapshot format: header, offsets, then neighbors."""
+        flags = FLAG_DIRECTED if self.directed else 0
+        if self.offsets.dtype == np.int64:
+            flags |= FLAG_OFFSETS_INT64
+        if self.neighbors.dtype == np.int64:
+            flags |= FLAG_NEIGHBORS_INT64
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, self.num_vertices, self.num_entries))
+            np.ascontiguousarray(self.offsets).tofile(f)
+            f.write(b"\0" * (-f.tell() % 8))
+            np.ascontiguousarray(self.neighbors).tofile(f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a snapshot; with ``mmap`` the arrays are read-only views of the file."""
+        with open(path, "rb") as f:
+            magic, version, flags, num_vertices, num_entries = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} CSR snapshot")
+        offsets_dtype = np.int64 if flags & FLAG_OFFSETS_INT64 else np.int32
+        neighbors_dtype = np.int64 if flags & FLAG_NEIGHBORS_INT64 else np.int32
+        offsets_at = HEADER.size
+        neighbors_at = offsets_at + (num_vertices + 1) * np.dtype(offsets_dtype).itemsize
+        neighbors_at += -neighbors_at % 8
+        if mmap:
+            offsets = np.memmap(path, offsets_dtype, "r", offsets_at, (num_vertices + 1,))
+            neighbors = np.memmap(path, neighbors_dtype, "r", neighbors_at, (num_entries,)) if num_entries \
+                else np.empty(0, neighbors_dtype)
+        else:
+            offsets = np.fromfile(path, offsets_dtype, num_vertices + 1, offset=offsets_at)
+            neighbors = np.fromfile(path, neighbors_dtype, num_entries, offset=neighbors_at)
+        return cls(offsets, neighbors, bool(flags & FLAG_DIRECTED))
+
+
+def traverse(csr, root, parents):
+    """Level-synchronous BFS from ``root`` over vertices still ``UNREACHED`` in ``parents``.
+
+    Visits vertices in the same order as a FIFO queue would, and fills in
+    ``parents``. Returns (visit order, start of each layer in that order).
+    """
+    parents[root] = ROOT
+    frontier = np.array([root], dtype=np.int64)
+    order = [frontier]
+    layers = [0]
+    visited = 1
+    while frontier.size:
+        layers.append(visited)
+        owner, found = csr.gather(frontier)
+        fresh = parents[found] == UNREACHED
+        owner, found = owner[fresh], found[fresh]
+        # The first discovery of a vertex wins, as with a FIFO queue
+        _, first = np.unique(found, return_index=True)
+        first.sort()
+        discovered = found[first].astype(np.int64)
+        parents[discovered] = frontier[owner[first]]
+        frontier = discovered
+        order.append(frontier)
+        visited += frontier.size
+    return np.concatenate(order), layers
+
+
+def bfs(csr, root):
+    """BFS over a CSR graph with igraph's result layout: (order, layers, parents)."""
+    parents = np.full(csr.num_vertices, UNREACHED, dtype=np.int64)
+    order, layers = traverse(csr, root, parents)
+    return order, layers, parents
+
+
+def lane_bits(words, width):
+    """(len(words), width) booleans: bit ``i`` of each uint64 word in column ``i``."""
+    return np.unpackbits(words.view(np.uint8), bitorder="little").reshape(-1, 64)[:, :width].astype(bool)
+
+
+def multi_source_bfs(csr, sources, distances=False):
+    """Bit-parallel BFS from up to ``MSBFS_WIDTH`` sources in one pass over the graph.
+
+    Each vertex holds a uint64 of the sources that have reached it, and a
+    level expands the union of all frontiers at once, so every adjacency
+    row is read once per level rather than once per source. Returns
+    (per-level reach counts with one column per source, vertex distances
+    with -1 for unreached, or None unless ``distances``).
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    width = len(sources)
+    if not 0 < width <= MSBFS_WIDTH:
+        raise ValueError(f"multi_source_bfs takes 1 to {MSBFS_WIDTH} sources")
+    seen = np.zeros(csr.num_vertices, dtype=np.uint64)
+    np.bitwise_or.at(seen, sources, np.left_shift(np.uint64(1), np.arange(width, dtype=np.uint64)))
+    dist = np.full((csr.num_vertices, width), -1, dtype=np.int32) if distances else None
+    frontier = seen.copy()
+    counts = []
+    while True:
+        active = np.flatnonzero(frontier)
+        if not active.size:
+            break
+        reached = lane_bits(frontier[active], width)
+        counts.append(reached.sum(axis=0))
+        if distances:
+            dist[active] = np.where(reached, len(counts) - 1, dist[active])
+        owner, found = csr.gather(active)
+        pushed = frontier[active][owner]
+        frontier = np.zeros(csr.num_vertices, dtype=np.uint64)
+        np.bitwise_or.at(frontier, found, pushed)
+        frontier &= ~seen
+        seen |= frontier
+    return np.array(counts, dtype=np.int64).reshape(-1, width), dist
+
+
+def spanning_forest(csr):
+    """BFS spanning forest of an undirected graph as (u, v) arrays with u < v.
+
+    Neighbors are explored in ascending order, so the tree can differ from
+    igraph's, which follows edge ids; edges are ordered by their larger
+    endpoint.
+    """
+    parents = np.full(csr.num_vertices, UNREACHED, dtype=np.int64)
+    # Isolated vertices are trees of their own; sparse vertex ids make many of them
+    isolated = csr.degrees() == 0
+    parents[isolated] = ROOT
+    children = []
+    for root in np.flatnonzero(~isolated).tolist():
+        if parents[root] == UNREACHED:
+            order, _ = traverse(csr, root, parents)
+            children.append(order[1:])
+    children = np.concatenate(children) if children else np.empty(0, dtype=np.int64)
+    parent = parents[children]
+    u, v = np.minimum(parent, children), np.maximum(parent, children)
+    order = np.lexsort((u, v))
+    return u[order], v[order]
+
+
+def row_chunks(csr, entries=PAGERANK_CHUNK):
+    """Yield row ranges [lo, hi) holding roughly ``entries`` adjacency entries, at least one row each."""
+    n = csr.num_vertices
+    lo = 0
+    while lo < n:
+        hi = int(np.searchsorted(csr.offsets, csr.offsets[lo] + entries, side="right")) - 1
+        hi = min(max(hi, lo + 1), n)
+        yield lo, hi
+        lo = hi
+
+
+def pagerank(csr, damping=0.85, tol=1e-10, max_iter=1000, dtype=np.float64, personalization=None, start=None):
+    """Power-iteration PageRank that streams the adjacency in row chunks.
+
+    The CSR arrays are the sparse adjacency matrix: an undirected graph is
+    symmetric, so each row pulls its neighbors' shares with one
+    ``add.reduceat``, while a directed graph pushes along out-edges. Either
+    way the neighbor array is read sequentially once per iteration and
+    never copied whole, which keeps memory-mapped graphs out of core.
+    Ranks and shares are held in ``dtype``; float32 halves the vectors.
+
+    ``personalization`` is a teleport distribution of shape (n,), or (n, k)
+    to iterate k personalized vectors together in one pass per iteration;
+    columns are normalized to sum to 1. Without it teleports are uniform.
+    Dangling vertices spread their rank along the teleport distribution,
+    which for the uniform case is what igraph does. ``start`` warm-starts
+    the iteration from a previous solution of the same shape.
+
+    Returns (ranks, iterations, residual), the residual being the largest
+    per-vector L1 change of the last iteration.
+    """
+    n = csr.num_vertices
+    dtype = np.dtype(dtype)
+    if personalization is None:
+        teleport = dtype.type(1.0 / n)
+        shape = (n,)
+    else:
+        teleport = np.asarray(personalization, dtype=dtype)
+        teleport = teleport / teleport.sum(axis=0)
+        shape = teleport.shape
+    degrees = csr.degrees().astype(dtype).reshape((n,) + (1,) * (len(shape) - 1))
+    dangling = np.flatnonzero(degrees.ravel() == 0)
+    has_edges = degrees > 0
+    if start is not None:
+        ranks = np.array(start, dtype=dtype).reshape(shape)
+    else:
+        ranks = np.full(shape, 1.0 / n, dtype=dtype)
+    residual = float("inf")
+    iterations = 0
+    while iterations < max_iter and residual >= tol:
+        share = np.divide(ranks, degrees, out=np.zeros(shape, dtype=dtype), where=has_edges)
+        gathered = np.zeros(shape, dtype=dtype)
+        for lo, hi in row_chunks(csr):
+            begin, end = int(csr.offsets[lo]), int(csr.offsets[hi])
+            if begin == end:
+                continue
+            if csr.directed:
+                counts = np.diff(csr.offsets[lo:hi + 1])
+                block = share[lo:hi].reshape(hi - lo, -1)
+                columns = gathered.reshape(n, -1)
+                for j in range(columns.shape[1]):
+                    weights = np.repeat(block[:, j], counts)
+                    columns[:, j] += np.bincount(csr.neighbors[begin:end], weights=weights, minlength=n).astype(dtype)
+            else:
+                rows = lo + np.flatnonzero(has_edges[lo:hi].ravel())
+                gathered[rows] = np.add.reduceat(share[csr.neighbors[begin:end]], csr.offsets[rows] - begin, axis=0)
+        updated = gathered
+        updated += ranks[dangling].sum(axis=0) * teleport
+        updated *= damping
+        updated += (1 - damping) * teleport
+        residual = float(np.abs(updated - ranks).sum(axis=0).max())
+        ranks = updated
+        iterations += 1
+    return ranks, iterations, residual
@@ -0,0 +1,99 @@
+import json
+import os
+
+from .cache import memory_limit
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(__file__), "calibration.json")
+# For (algorithm, generator) pairs the table lacks; generous next to measured models
+DEFAULT_MODEL = {"fixed": 64 << 20, "per_vertex": 512, "per_edge": 256}
+# Margin on top of an estimate, as the models are fitted on smaller graphs
+SAFETY_FACTOR = 1.25
+
+
+class AdmissionError(Exception):
+    """A request refused before it runs; ``status`` is 413 or 429 and ``body`` explains why."""
+
+    def __init__(self, status, body):
+        super().__init__(body["error"])
+        self.status = status
+        self.body = body
+
+
+def load_calibration(path=CALIBRATION_FILE):
+    """The calibration table, keyed "<algorithm>/<generator>"; empty if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def estimate_peak(calibration, algorithm, generator, size, m):
+    """Peak bytes for one request, from a model linear in vertices and in attached edges."""
+    model = calibration.get(f"{algorithm}/{generator}", DEFAULT_MODEL)
+    return int(model["fixed"] + model["per_vertex"] * size + model["per_edge"] * size * m)
+
+
+def memory_usage():
+    """The container's working set in bytes, as the OOM killer sees it, or None if unknown.
+
+    Inactive file pages, such as cold parts of memory-mapped snapshots,
+    are reclaimable and not counted.
+    """
+    for current, stat, inactive in (
+        ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.stat", "inactive_file"),
+        ("/sys/fs/cgroup/memory/memory.usage_in_bytes", "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file"),
+    ):
+        try:
+            with open(current) as f:
+                usage = int(f.read())
+            with open(stat) as f:
+                fields = dict(line.split() for line in f)
+        except (OSError, ValueError):
+            continue
+        return usage - int(fields.get(inactive, 0))
+    return None
+
+
+class AdmissionGuard:
+    """Refuses requests whose estimated peak memory would get the pod OOM-killed.
+
+    A request that cannot fit under the memory limit even in an idle pod
+    gets 413; one that only lacks headroom right now, next to in-flight
+    requests, gets 429 so the caller can retry. Cached graphs are given
+    back before a request is refused. Without a known limit every request
+    is admitted.
+    """
+
+    def __init__(self, calibration=None, limit=None):
+        self.calibration = load_calibration() if calibration is None else calibration
+        self.limit = memory_limit() if limit is None else limit
+
+    def check(self, algorithms, generator, size, m, resident=0, caches=(), keep=None):
+        """Return the estimate in bytes, or raise AdmissionError.
+
+        ``resident`` bytes of the graph already exist, cached or as a
+        snapshot, and are not charged again. Under pressure the ``caches``
+        evict their least recently used graphs, except ``keep``, the
+        request's own.
+        """
+        estimate = max(estimate_peak(self.calibration, name, generator, size, m) for name in algorithms)
+        if not self.limit:
+            return estimate
+        needed = max(int(estimate * SAFETY_FACTOR) - resident, 0)
+        body = {"estimated_bytes": needed, "memory_limit": self.limit}
+        if needed > self.limit:
+            raise AdmissionError(413, {"error": "Request exceeds the memory limit", **body})
+        usage = memory_usage()
+        for cache in caches:
+            if usage is None or needed <= self.limit - usage:
+                break
+            if cache.evict(needed - (self.limit - usage), keep):
+                usage = memory_usage()
+        if usage is not None and needed > self.limit - usage:
+            raise AdmissionError(429, {
+                "error": "Not enough free memory for the request, retry later",
+                "memory_available": self.limit - usage,
+                **body,
+            })
+        return estimate
@@ -0,0 +1,176 @@
+import datetime
+import json
+import logging
+from minio import Minio
+from .algorithms import ALGORITHMS
+from .cache import GraphCache
+from .edgelist import EdgeListStore, input_parameters
+from .footprint import AdmissionError, AdmissionGuard
+from .graphs import (
+    DEFAULT_GENERATOR, DEFAULT_M, generator_names, get_graph, get_snapshot, graph_key, resident_bytes
+)
+from .snapshots import SnapshotStore
+
+DEFAULT_SNAPSHOT_BUCKET = "graph-snapshots"
+DEFAULT_SNAPSHOT_DIR = "/tmp/graph-snapshots"
+
+
+def new():
+    return Function()
+
+
+class Function:
+    """BFS, MST and PageRank behind one endpoint, over one per-pod graph store.
+
+    A request names one algorithm, or a list of them to run in order on the
+    same graph, which is generated or loaded once for all of them.
+    """
+
+    def __init__(self):
+        self.graphs = GraphCache()
+        # Refuses requests that would not fit in the pod's memory
+        self.admission = AdmissionGuard()
+        # Set up in start(), once the MinIO endpoint is known
+        self.snapshots = None
+        self.edge_lists = None
+
+    async def handle(self, scope, receive, send):
+        logging.info("OK: Request Received")
+
+        # Read the full request body
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        try:
+            event = json.loads(body.decode())
+            algorithm = event.get("algorithm")
+            algorithms = algorithm if isinstance(algorithm, list) else [algorithm]
+            if not algorithms or any(name not in ALGORITHMS for name in algorithms):
+                raise ValueError(f"Missing or invalid 'algorithm', expected one or a list of {list(ALGORITHMS)}")
+            # A graph read from an edge-list object replaces the generator parameters
+            object_input = input_parameters(event)
+            if object_input is not None and self.edge_lists is None:
+                raise ValueError("Object input is not configured")
+            size = event.get("size")
+            if object_input is None and (not isinstance(size, int) or size <= 0):
+                raise ValueError("Missing or invalid 'size' parameter")
+            m = event.get("m", DEFAULT_M)
+            if not isinstance(m, int) or m <= 0:
+                raise ValueError("Invalid 'm' parameter")
+            generator = event.get("generator", DEFAULT_GENERATOR)
+            if generator not in generator_names():
+                raise ValueError(f"Unknown 'generator' parameter, expected one of {generator_names()}")
+            use_snapshot = event.get("snapshot", False)
+            if use_snapshot and "seed" not in event:
+                raise ValueError("'snapshot' requires a 'seed' parameter")
+            if use_snapshot and self.snapshots is None:
+                raise ValueError("Snapshots are not configured")
+
+            # The graph is shared, so the hungriest algorithm sets the peak.
+            # Object sizes are only known once parsed, so only generated graphs are checked.
+            # A graph this pod already holds is not charged again, and other cached graphs can make room.
+            estimated_bytes = parse_stats = snapshot_source = None
+            if object_input is None:
+                seed = event.get("seed")
+                store = self.snapshots if use_snapshot else None
+                estimated_bytes = self.admission.check(
+                    algorithms, generator, size, m,
+                    resident=resident_bytes(self.graphs, size, m, seed, generator, store),
+                    caches=[self.graphs],
+                    keep=graph_key(size, m, seed, generator, use_snapshot),
+                )
+
+            graph_generating_begin = datetime.datetime.now()
+            if object_input is not None:
+                graph, cache_status, parse_stats = self.edge_lists.open(
+                    self.graphs, *object_input, directed=event.get("directed", False)
+                )
+            elif use_snapshot:
+                graph, cache_status, snapshot_source = get_snapshot(
+                    self.graphs, self.snapshots, size, m, event["seed"], generator
+                )
+            else:
+                graph, cache_status = get_graph(self.graphs, size, m, event.get("seed"), generator)
+            graph_generating_end = datetime.datetime.now()
+
+            results = {}
+            compute_times = {}
+            for name in algorithms:
+                process_begin = datetime.datetime.now()
+                results[name] = ALGORITHMS[name](graph)
+                process_end = datetime.datetime.now()
+                compute_times[name] = (process_end - process_begin) / datetime.timedelta(microseconds=1)
+
+            graph_generating_time = (
+                graph_generating_end - graph_generating_begin
+            ) / datetime.timedelta(microseconds=1)
+
+            response_body = json.dumps({
+                # A single algorithm answers exactly like its standalone function
+                "result": results if isinstance(algorithm, list) else results[algorithm],
+                "measurement": {
+                    "graph_generating_time": graph_generating_time,
+                    "compute_time": sum(compute_times.values()),
+                    "compute_times": compute_times,
+                    "graph_cache": cache_status,
+                    "graph_cache_bytes": self.graphs.bytes,
+                    "snapshot_source": snapshot_source,
+                    "estimated_peak_bytes": estimated_bytes,
+                    **(parse_stats or {}),
+                }
+            }).encode()
+
+            status = 200
+
+        except AdmissionError as e:
+            response_body = json.dumps(e.body).encode()
+            status = e.status
+
+        except Exception as e:
+            logging.exception("Error processing request")
+            response_body = json.dumps({"error": str(e)}).encode()
+            status = 400
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                [b"content-type", b"application/json"],
+            ],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": response_body,
+        })
+
+    def start(self, cfg):
+        logging.info("Function starting")
+        if cfg.get("GRAPH_CACHE_BYTES"):
+            self.graphs = GraphCache(int(cfg["GRAPH_CACHE_BYTES"]))
+        if cfg.get("MEMORY_LIMIT_BYTES"):
+            self.admission = AdmissionGuard(limit=int(cfg["MEMORY_LIMIT_BYTES"]))
+        client = Minio(
+            cfg.get("MINIO_ENDPOINT", "minio:9000"),
+            access_key=cfg.get("MINIO_ACCESS_KEY", "minioadmin"),
+            secret_key=cfg.get("MINIO_SECRET_KEY", "minioadmin"),
+            secure=False,
+        )
+        self.snapshots = SnapshotStore(
+            client,
+            cfg.get("SNAPSHOT_BUCKET", DEFAULT_SNAPSHOT_BUCKET),
+            cfg.get("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR),
+        )
+        self.edge_lists = EdgeListStore(client)
+
+    def stop(self):
+        logging.info("Function stopping")
+
+    def alive(self):
+        return True, "Alive"
+
+    def ready(self):
+        return True, "Ready"
@@ -0,0 +1,95 @@
+"""
+Unit tests for the unified graph function, checked against the standalone
+functions' result layouts.
+"""
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+from function import new
+from function.edgelist import EdgeListStore
+from function.footprint import AdmissionGuard
+
+
+async def invoke(f, payload):
+    """Run one POST through the handler and return (status, decoded JSON body)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await f.handle({"method": "POST"}, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("generator", ["barabasi", "preferential_attachment"])
+async def test_pipeline_runs_every_algorithm_on_one_graph(generator):
+    f = new()
+    request = {"size": 400, "m": 3, "seed": 2, "generator": generator}
+
+    status, pipeline = await invoke(f, {**request, "algorithm": ["bfs", "mst", "pagerank"]})
+    singles = {name: (await invoke(f, {**request, "algorithm": name}))[1] for name in ("bfs", "mst", "pagerank")}
+
+    assert status == 200
+    assert pipeline["measurement"]["graph_cache"] == "miss"
+    assert set(pipeline["measurement"]["compute_times"]) == {"bfs", "mst", "pagerank"}
+    for name, single in singles.items():
+        assert single["measurement"]["graph_cache"] == "hit"
+        assert single["result"] == pipeline["result"][name]
+    assert set(pipeline["result"]["bfs"]) == {"order", "dist", "parents"}
+    assert len(pipeline["result"]["mst"]) == 399
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", [None, "sssp", [], ["bfs", "sssp"]])
+async def test_invalid_algorithm_is_rejected(algorithm):
+    status, body = await invoke(new(), {"size": 100, "algorithm": algorithm})
+    assert status == 400 and "algorithm" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_memory_are_refused():
+    f = new()
+    f.admission = AdmissionGuard(limit=256 << 20)
+    status, body = await invoke(f, {"algorithm": ["bfs", "pagerank"], "size": 10 ** 8, "m": 10})
+    assert status == 413 and body["estimated_bytes"] > body["memory_limit"]
+
+
+class ObjectClient:
+    """Serves edge-list objects from memory, in small chunks to exercise the streaming parser."""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def stat_object(self, bucket, name):
+        return SimpleNamespace(etag=str(hash(self.objects[bucket, name])))
+
+    def get_object(self, bucket, name):
+        data = self.objects[bucket, name]
+        return SimpleNamespace(
+            stream=lambda amt: (data[begin:begin + 7] for begin in range(0, len(data), 7)),
+            close=lambda: None,
+            release_conn=lambda: None,
+        )
+
+
+@pytest.mark.asyncio
+async def test_pipeline_over_a_gzipped_edge_list_object():
+    text = "% a 4-cycle\n0 1\n1 2\n2 3\n3 0\n"
+    f = new()
+    f.edge_lists = EdgeListStore(ObjectClient({("datasets", "cycle.txt.gz"): gzip.compress(text.encode())}))
+
+    status, body = await invoke(f, {
+        "input-bucket": "datasets", "objectKey": "cycle.txt.gz", "algorithm": ["bfs", "mst", "pagerank"]
+    })
+
+    assert status == 200
+    assert body["result"]["bfs"]["dist"] == [0, 1, 3, 4]
+    assert len(body["result"]["mst"]) == 3
+    assert body["result"]["pagerank"] == pytest.approx(0.25)
+    assert body["measurement"]["edges_read"] == 4 and body["measurement"]["graph_cache"] == "miss"
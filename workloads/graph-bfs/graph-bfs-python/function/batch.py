@@ -0,0 +1,43 @@
+import numpy as np
+
+from .csr import MSBFS_WIDTH, multi_source_bfs
+
+BATCH_RESULTS = ("stats", "distances")
+
+
+def source_stats(source, counts):
+    """Distance statistics of one source from its per-level reach counts."""
+    levels = np.flatnonzero(counts)
+    reached = int(counts.sum())
+    total = int((counts * np.arange(len(counts))).sum())
+    return {
+        "source": source,
+        "reached": reached,
+        "eccentricity": int(levels[-1]) if levels.size else 0,
+        "mean_distance": total / (reached - 1) if reached > 1 else 0.0,
+    }
+
+
+def batch_bfs(csr, sources, result="stats"):
+    """BFS from every vertex in ``sources``, ``MSBFS_WIDTH`` sources per pass.
+
+    Returns (per-source entries, summary). With ``result="distances"`` each
+    entry also carries the distance to every vertex, -1 where unreached.
+    """
+    entries = []
+    for begin in range(0, len(sources), MSBFS_WIDTH):
+        batch = sources[begin:begin + MSBFS_WIDTH]
+        counts, dist = multi_source_bfs(csr, batch, distances=result == "distances")
+        for lane, source in enumerate(batch):
+            entry = source_stats(source, counts[:, lane])
+            if dist is not None:
+                entry["dist"] = dist[:, lane].tolist()
+            entries.append(entry)
+    summary = {
+        "queries": len(entries),
+        "passes": -(-len(sources) // MSBFS_WIDTH),
+        "max_eccentricity": max(e["eccentricity"] for e in entries),
+        "mean_distance": sum(e["mean_distance"] for e in entries) / len(entries),
+        "mean_reached": sum(e["reached"] for e in entries) / len(entries),
+    }
+    return entries, summary
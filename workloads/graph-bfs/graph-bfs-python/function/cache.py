@@ -0,0 +1,124 @@
+import collections
+import threading
+
+DEFAULT_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+def memory_limit():
+    """The container's memory limit in bytes from the cgroup, or None if unlimited."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value == "max":
+            return None
+        # cgroup v1 reports "no limit" as a huge page-aligned number
+        if int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+def default_cache_bytes():
+    """A quarter of the memory limit, leaving room for the algorithms themselves."""
+    limit = memory_limit()
+    return limit // 4 if limit else DEFAULT_CACHE_BYTES
+
+
+def estimate_bytes(graph):
+    """Approximate resident size of a graph.
+
+    igraph keeps two 8-byte endpoint vectors and two 8-byte sorted edge
+    indices per edge, plus two 8-byte index vectors per vertex. Objects
+    that know their own size expose ``nbytes``.
+    """
+    if hasattr(graph, "nbytes"):
+        return graph.nbytes
+    return 32 * graph.ecount() + 16 * (graph.vcount() + 1)
+
+
+class GraphCache:
+    """Per-pod LRU cache of generated graphs, bounded by estimated bytes.
+
+    Cached graphs are shared between requests, so callers must treat them
+    as read-only.
+    """
+
+    def __init__(self, max_bytes=None, sizeof=estimate_bytes):
+        self.max_bytes = default_cache_bytes() if max_bytes is None else max_bytes
+        self.sizeof = sizeof
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def keys(self):
+        with self.lock:
+            return list(self.entries)
+
+    def bytes_of(self, key):
+        """Estimated bytes of a cached graph, or 0; unlike ``get`` it is not a hit or a miss."""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry[1] if entry is not None else 0
+
+    def evict(self, nbytes, keep=None):
+        """Drop least recently used graphs, other than ``keep``, until ``nbytes`` are freed; returns the bytes freed."""
+        freed = 0
+        with self.lock:
+            for key in list(self.entries):
+                if freed >= nbytes:
+                    break
+                if key == keep:
+                    continue
+                freed += self.entries.pop(key)[1]
+                self.evictions += 1
+            self.bytes -= freed
+        return freed
+
+    def put(self, key, graph):
+        size = self.sizeof(graph)
+        # Never evict everything for a graph that could not be kept anyway
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (graph, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def get_or_create(self, key, create):
+        """Return (graph, hit); ``create()`` builds the graph on a miss."""
+        graph = self.get(key)
+        if graph is not None:
+            return graph, True
+        graph = create()
+        self.put(key, graph)
+        return graph, False
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,92 @@
+"""Benchmark that refits the memory calibration table.
+
+Run it from the function's directory, e.g.::
+
+    python -m function.calibrate --algorithm bfs
+
+Each point runs the handler in a fresh process and records how far the
+peak RSS grew; the entries measured are rewritten in ``calibration.json``.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+
+import numpy as np
+
+from .footprint import CALIBRATION_FILE, load_calibration
+
+CALIBRATION_SIZES = (20000, 50000, 100000)
+CALIBRATION_M = (5, 10)
+CALIBRATION_SEED = 1
+
+
+def measure_peak(request, results):
+    """Run one request in this (fresh) process and report its peak RSS growth in bytes."""
+    from . import new
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(request).encode(), "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"Calibration request failed with {message['status']}")
+
+    f = new()
+    # ru_maxrss is a high-water mark in KiB; everything before this line is the baseline
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    asyncio.run(f.handle({"type": "http", "method": "POST"}, receive, send))
+    results.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) * 1024)
+
+
+def calibrate(algorithm, generator, sizes=CALIBRATION_SIZES, ms=CALIBRATION_M):
+    """Fit fixed, per-vertex and per-edge bytes to peaks measured over ``sizes`` x ``ms``."""
+    context = multiprocessing.get_context("spawn")
+    points = []
+    for size in sizes:
+        for m in ms:
+            results = context.Queue()
+            request = {"algorithm": algorithm, "generator": generator, "size": size, "m": m, "seed": CALIBRATION_SEED}
+            child = context.Process(target=measure_peak, args=(request, results))
+            child.start()
+            child.join()
+            if child.exitcode != 0:
+                raise RuntimeError(f"Calibration of {algorithm}/{generator} failed at size {size}, m {m}")
+            points.append((size, m, results.get()))
+    size, m, peak = np.array(points, dtype=np.float64).T
+    design = np.column_stack((np.ones_like(size), size, size * m))
+    fixed, per_vertex, per_edge = np.maximum(np.linalg.lstsq(design, peak, rcond=None)[0], 0)
+    return {
+        "fixed": int(fixed),
+        "per_vertex": float(per_vertex),
+        "per_edge": float(per_edge),
+        "points": [[int(s), int(k), int(p)] for s, k, p in points],
+    }
+
+
+def main():
+    from .graphs import generator_names
+
+    parser = argparse.ArgumentParser(description="Measure peak memory per request and refit the calibration table.")
+    parser.add_argument("--algorithm", action="append", required=True, help="algorithm name, repeatable")
+    parser.add_argument("--generator", action="append", choices=generator_names(), help="default: all generators")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(CALIBRATION_SIZES))
+    parser.add_argument("--m", type=int, nargs="+", default=list(CALIBRATION_M))
+    parser.add_argument("--output", default=CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    calibration = load_calibration(args.output)
+    for algorithm in args.algorithm:
+        for generator in args.generator or generator_names():
+            model = calibrate(algorithm, generator, args.sizes, args.m)
+            calibration[f"{algorithm}/{generator}"] = model
+            print(f"{algorithm}/{generator}: {model['fixed']} + {model['per_vertex']:.1f}/vertex"
+                  f" + {model['per_edge']:.1f}/edge")
+    with open(args.output, "w") as f:
+        json.dump(calibration, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,69 @@
 import datetime
 import json
 import logging
-import igraph
-import random
+import time
+import numpy as np
+from minio import Minio
+from minio.error import S3Error
+from .approximate import sampled_distances, sampling_parameters
+from .batch import BATCH_RESULTS, batch_bfs
+from .cache import GraphCache
+from .footprint import AdmissionError, AdmissionGuard
+from .csr import CSRGraph, bfs
+from .edgelist import EdgeListStore, input_parameters
+from .hybrid import direction_optimizing_bfs
+from .graphs import (
+    DEFAULT_GENERATOR, DEFAULT_M, generator_names, get_graph, get_snapshot, graph_key, resident_bytes
+)
+from .results import checksum, encode_response, result_parameters, top_k
+from .snapshots import SnapshotStore
+
+DEFAULT_SNAPSHOT_BUCKET = "graph-snapshots"
+DEFAULT_SNAPSHOT_DIR = "/tmp/graph-snapshots"
+# Optional BFS engines over CSR arrays; without one, igraph graphs use igraph's bfs
+ENGINES = ("top_down", "direction_optimizing")
+
+
+def distances(num_vertices, order, layers):
+    """Distance of every vertex from the root, -1 where unreached, from BFS order and layer starts."""
+    dist = np.full(num_vertices, -1, dtype=np.int64)
+    dist[np.asarray(order[:layers[-1]], dtype=np.int64)] = np.repeat(np.arange(len(layers) - 1), np.diff(layers))
+    return dist
+
+
+def shape_result(mode, k, num_vertices, order, layers, parents):
+    """Single-source BFS result in the requested mode; None and "full" keep igraph's layout."""
+    if mode in (None, "full"):
+        return {
+            "order": order.tolist() if isinstance(order, np.ndarray) else order,
+            "dist": layers,
+            "parents": parents.tolist() if isinstance(parents, np.ndarray) else parents,
+        }
+    if mode == "histogram":
+        return {"distances": np.diff(layers).tolist(), "unreached": num_vertices - layers[-1]}
+    dist = distances(num_vertices, order, layers)
+    if mode == "topk":
+        return {"farthest": top_k(dist, k, "distance")}
+    reached = dist[dist >= 0]
+    return {
+        "checksum": checksum(dist, parents),
+        "reached": int(reached.size),
+        "eccentricity": int(reached.max()),
+        "mean_distance": float(reached.sum() / (reached.size - 1)) if reached.size > 1 else 0.0,
+    }
+
 
 def new():
     return Function()
 
 class Function:
     def __init__(self):
-        pass
+        self.graphs = GraphCache()
+        # Refuses requests that would not fit in the pod's memory
+        self.admission = AdmissionGuard()
+        # Set up in start(), once the MinIO endpoint is known
+        self.snapshots = None
+        self.edge_lists = None
 
     async def handle(self, scope, receive, send):
         logging.info("Received request")
@@ -30,24 +84,142 @@ class Function:
             await self.send_json(send, {"error": f"Invalid JSON: {str(e)}"}, status=400)
             return
 
+        # A graph read from an edge-list object replaces the generator parameters
+        try:
+            object_input = input_parameters(event)
+        except ValueError as e:
+            await self.send_json(send, {"error": str(e)}, status=400)
+            return
+        from_object = object_input is not None
+        if from_object and self.edge_lists is None:
+            await self.send_json(send, {"error": "Object input is not configured"}, status=400)
+            return
+
         size = event.get('size')
-        if not isinstance(size, int) or size <= 0:
+        if not from_object and (not isinstance(size, int) or size <= 0):
             await self.send_json(send, {"error": "Missing or invalid 'size'"}, status=400)
             return
 
-        if "seed" in event:
-            random.seed(event["seed"])
+        m = event.get('m', DEFAULT_M)
+        if not isinstance(m, int) or m <= 0:
+            await self.send_json(send, {"error": "Invalid 'm'"}, status=400)
+            return
+
+        generator = event.get("generator", DEFAULT_GENERATOR)
+        if generator not in generator_names():
+            await self.send_json(send, {"error": f"Unknown 'generator', expected one of {generator_names()}"}, status=400)
+            return
+
+        sources = event.get("sources")
+        if sources is not None and (
+            not isinstance(sources, list) or not sources
+            or any(not isinstance(v, int) or v < 0 or (not from_object and v >= size) for v in sources)
+        ):
+            await self.send_json(send, {"error": "'sources' must be a non-empty list of vertex ids"}, status=400)
+            return
+        batch_result = event.get("batch_result", "stats")
+        if batch_result not in BATCH_RESULTS:
+            await self.send_json(send, {"error": f"Invalid 'batch_result', expected one of {list(BATCH_RESULTS)}"}, status=400)
+            return
 
-        # Generate Barabási–Albert graph
+        engine = event.get("engine")
+        if engine is not None and engine not in ENGINES:
+            await self.send_json(send, {"error": f"Invalid 'engine', expected one of {list(ENGINES)}"}, status=400)
+            return
+
+        approximate = event.get("approximate", False)
+        if approximate:
+            try:
+                _, _, samples = sampling_parameters(event)
+            except ValueError as e:
+                await self.send_json(send, {"error": str(e)}, status=400)
+                return
+
+        try:
+            result_mode, k = result_parameters(event)
+        except ValueError as e:
+            await self.send_json(send, {"error": str(e)}, status=400)
+            return
+        if result_mode not in (None, "full") and (sources is not None or approximate):
+            await self.send_json(send, {"error": "'result_mode' applies to single-source BFS results"}, status=400)
+            return
+
+        use_snapshot = event.get("snapshot", False)
+        if use_snapshot and "seed" not in event:
+            await self.send_json(send, {"error": "'snapshot' requires a 'seed'"}, status=400)
+            return
+        if use_snapshot and self.snapshots is None:
+            await self.send_json(send, {"error": "Snapshots are not configured"}, status=400)
+            return
+
+        # Object sizes are only known once parsed, so only generated graphs are checked.
+        # A graph this pod already holds is not charged again, and other cached graphs can make room.
+        estimated_bytes = parse_stats = snapshot_source = None
+        if not from_object:
+            seed = event.get("seed")
+            store = self.snapshots if use_snapshot else None
+            try:
+                estimated_bytes = self.admission.check(
+                    ["bfs"], generator, size, m,
+                    resident=resident_bytes(self.graphs, size, m, seed, generator, store),
+                    caches=[self.graphs],
+                    keep=graph_key(size, m, seed, generator, use_snapshot),
+                )
+            except AdmissionError as e:
+                await self.send_json(send, e.body, status=e.status)
+                return
+
+        # Generate the graph, or reuse a cached one with the same seed.
+        # Snapshots are memory-mapped CSR files, generated once and shared through MinIO.
         graph_generating_begin = datetime.datetime.now()
-        graph = igraph.Graph.Barabasi(size, 10)
+        if from_object:
+            try:
+                graph, cache_status, parse_stats = self.edge_lists.open(
+                    self.graphs, *object_input, directed=event.get("directed", False)
+                )
+            except (S3Error, ValueError) as e:
+                await self.send_json(send, {"error": f"Cannot read edge list: {e}"}, status=400)
+                return
+            if not graph.num_vertices:
+                await self.send_json(send, {"error": "The edge list has no edges"}, status=400)
+                return
+            if sources is not None and max(sources) >= graph.num_vertices:
+                await self.send_json(send, {"error": "'sources' must be vertex ids of the edge list"}, status=400)
+                return
+        elif use_snapshot:
+            graph, cache_status, snapshot_source = get_snapshot(
+                self.graphs, self.snapshots, size, m, event["seed"], generator
+            )
+        else:
+            graph, cache_status = get_graph(self.graphs, size, m, event.get("seed"), generator)
+        # Batches, sampling and the explicit engines run over CSR arrays
+        if (sources is not None or engine is not None or approximate) and not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_igraph(graph)
         graph_generating_end = datetime.datetime.now()
 
-        # Run BFS
+        # Run BFS, from vertex 0 or from every vertex in 'sources'
         process_begin = datetime.datetime.now()
-        bfs_result = graph.bfs(0)  # (order, dist, parents)
+        levels = None
+        if approximate:
+            # Distance distribution from sampled sources instead of one exact BFS
+            result = sampled_distances(graph, samples, event.get("seed"))
+        elif sources is not None:
+            entries, summary = batch_bfs(graph, sources, batch_result)
+            result = {"sources": entries, "summary": summary}
+        elif engine == "direction_optimizing":
+            order, layers, parents, levels = direction_optimizing_bfs(graph, 0)
+        elif isinstance(graph, CSRGraph):
+            order, layers, parents = bfs(graph, 0)
+        else:
+            order, layers, parents = graph.bfs(0)
         process_end = datetime.datetime.now()
 
+        # Shaping and encoding the result is timed apart from the search
+        shape_begin = time.perf_counter()
+        if sources is None and not approximate:
+            num_vertices = graph.num_vertices if isinstance(graph, CSRGraph) else graph.vcount()
+            result = shape_result(result_mode, k, num_vertices, order, layers, parents)
+
         # Microsecond timings
         graph_generating_time = (
             (graph_generating_end - graph_generating_begin)
@@ -58,20 +230,30 @@ class Function:
             / datetime.timedelta(microseconds=1)
         )
 
-        await self.send_json(send, {
-            "result": {
-                "order": bfs_result[0],
-                "dist": bfs_result[1],
-                "parents": bfs_result[2],
-            },
-            "measurement": {
-                "graph_generating_time": graph_generating_time,
-                "compute_time": process_time
-            }
-        })
+        measurement = {
+            "graph_generating_time": graph_generating_time,
+            "compute_time": process_time,
+            "graph_cache": cache_status,
+            "graph_cache_bytes": self.graphs.bytes,
+            "snapshot_source": snapshot_source,
+            "estimated_peak_bytes": estimated_bytes,
+        }
+        if parse_stats:
+            measurement.update(parse_stats)
+        if approximate:
+            measurement["samples"] = result["sources"]
+        elif sources is not None:
+            measurement["queries_per_second"] = len(sources) / (process_time / 1e6) if process_time > 0 else 0.0
+        if levels is not None:
+            measurement["edges_examined"] = sum(level["edges"] for level in levels)
+            measurement["levels"] = levels
+
+        await self.send_body(send, encode_response(result, measurement, shape_begin))
 
     async def send_json(self, send, data, status=200):
-        body = json.dumps(data).encode("utf-8")
+        await self.send_body(send, json.dumps(data).encode("utf-8"), status)
+
+    async def send_body(self, send, body, status=200):
         await send({
             "type": "http.response.start",
             "status": status,
@@ -86,6 +268,22 @@ class Function:
 
     def start(self, cfg):
         logging.info("Function starting")
+        if cfg.get("GRAPH_CACHE_BYTES"):
+            self.graphs = GraphCache(int(cfg["GRAPH_CACHE_BYTES"]))
+        if cfg.get("MEMORY_LIMIT_BYTES"):
+            self.admission = AdmissionGuard(limit=int(cfg["MEMORY_LIMIT_BYTES"]))
+        client = Minio(
+            cfg.get("MINIO_ENDPOINT", "minio:9000"),
+            access_key=cfg.get("MINIO_ACCESS_KEY", "minioadmin"),
+            secret_key=cfg.get("MINIO_SECRET_KEY", "minioadmin"),
+            secure=False,
+        )
+        self.snapshots = SnapshotStore(
+            client,
+            cfg.get("SNAPSHOT_BUCKET", DEFAULT_SNAPSHOT_BUCKET),
+            cfg.get("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR),
+        )
+        self.edge_lists = EdgeListStore(client)
 
     def stop(self):
         logging.info("Function stopping")
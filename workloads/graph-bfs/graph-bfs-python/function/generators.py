@@ -0,0 +1,91 @@
+import numpy as np
+
+from .csr import CSRGraph
+
+# Graph500 R-MAT quadrant probabilities; the fourth is 1 - a - b - c
+RMAT_A, RMAT_B, RMAT_C = 0.57, 0.19, 0.19
+
+
+def preferential_attachment(size, m, seed=None):
+    """Barabási–Albert graph built edge-parallel instead of vertex by vertex.
+
+    Vertex ``v >= 1`` attaches ``m`` edges, each to the endpoint of a uniformly
+    drawn earlier edge end, which picks a target with probability proportional
+    to its degree. A draw that lands on an earlier edge's target copies that
+    edge's target, so targets resolve by pointer jumping over whole arrays
+    rather than by a loop over vertices. Self-loops cannot occur; duplicate
+    edges are dropped.
+    """
+    rng = np.random.default_rng(seed)
+    count = max(size - 1, 0) * m
+    edge = np.arange(count, dtype=np.int64)
+    sources = edge // m + 1
+    # Vertex v may draw from the 2 * (v - 1) * m edge ends created before it
+    draws = (rng.random(count) * (2 * (sources - 1) * m)).astype(np.int64)
+    targets = np.where(draws % 2 == 0, (draws // 2) // m + 1, -1)
+    targets[sources == 1] = 0
+    # Unresolved edges copy the target of an earlier edge, which may itself be a copy
+    pointer = np.where(targets < 0, draws // 2, edge)
+    pending = np.flatnonzero(targets < 0)
+    while pending.size:
+        ahead = pointer[pending]
+        resolved = targets[ahead] >= 0
+        targets[pending[resolved]] = targets[ahead[resolved]]
+        pending = pending[~resolved]
+        pointer[pending] = pointer[pointer[pending]]
+    return CSRGraph.from_edges(size, sources, targets, simplify=True)
+
+
+def erdos_renyi(size, m, seed=None):
+    """G(n, M) random graph with about ``size * m`` edges, i.e. mean degree ``2m``.
+
+    Endpoints are drawn independently and self-loops and repeats dropped,
+    which removes a negligible share of edges on sparse graphs.
+    """
+    rng = np.random.default_rng(seed)
+    count = size * m
+    sources = rng.integers(0, size, count, dtype=np.int64)
+    targets = rng.integers(0, size, count, dtype=np.int64)
+    return CSRGraph.from_edges(size, sources, targets, simplify=True)
+
+
+def rmat(size, m, seed=None):
+    """R-MAT (stochastic Kronecker) graph with about ``size * m`` edges.
+
+    Each edge picks one quadrant of the adjacency matrix per bit of the
+    vertex id, for all edges at once. Ids are drawn over the next power of
+    two and edges past ``size`` rejected, then vertices are relabelled at
+    random as Graph500 does so that degree is not correlated with id.
+    """
+    rng = np.random.default_rng(seed)
+    count = size * m
+    scale = max(int(size - 1).bit_length(), 1)
+    found = []
+    kept = 0
+    while kept < count:
+        # Oversample by the share of ids that fall inside [0, size)
+        batch = int((count - kept) * (1 << scale) ** 2 / max(size, 1) ** 2) + 1
+        sources = np.zeros(batch, dtype=np.int64)
+        targets = np.zeros(batch, dtype=np.int64)
+        for bit in range(scale):
+            # Quadrants split [0, 1) at a, a + b and a + b + c
+            r = rng.random(batch, dtype=np.float32)
+            lower = r >= RMAT_A + RMAT_B
+            right = (r >= RMAT_A) ^ lower ^ (r >= RMAT_A + RMAT_B + RMAT_C)
+            sources |= lower.view(np.uint8).astype(np.int64) << bit
+            targets |= right.view(np.uint8).astype(np.int64) << bit
+        inside = (sources < size) & (targets < size)
+        found.append((sources[inside], targets[inside]))
+        kept += int(inside.sum())
+    sources = np.concatenate([s for s, _ in found])[:count]
+    targets = np.concatenate([t for _, t in found])[:count]
+    relabel = rng.permutation(size)
+    return CSRGraph.from_edges(size, relabel[sources], relabel[targets], simplify=True)
+
+
+# Generators selectable with the request's "generator"; "barabasi" is igraph's
+GENERATORS = {
+    "preferential_attachment": preferential_attachment,
+    "erdos_renyi": erdos_renyi,
+    "rmat": rmat,
+}
@@ -0,0 +1,119 @@
+import os
+import random
+
+import igraph
+
+from .csr import CSRGraph
+from .generators import GENERATORS
+
+# Edges each new vertex attaches with in the Barabási–Albert model
+DEFAULT_M = 10
+DEFAULT_GENERATOR = "barabasi"
+
+
+def barabasi(size, m, seed=None):
+    # igraph draws from Python's `random` module, so seeding it makes the graph reproducible
+    if seed is not None:
+        random.seed(seed)
+    graph = igraph.Graph.Barabasi(size, m)
+    if seed is not None:
+        graph["rng_state"] = random.getstate()
+    return graph
+
+
+def grow(graph, size, m):
+    """Continue the attachment process of a seeded ``barabasi`` graph up to ``size``.
+
+    Restoring the generator state saved with ``graph`` makes the result
+    identical to generating the larger graph fresh from the same seed.
+    """
+    random.setstate(graph["rng_state"])
+    grown = igraph.Graph.Barabasi(size, m, start_from=graph)
+    grown["rng_state"] = random.getstate()
+    return grown
+
+
+def largest_smaller(cache, size, m, seed):
+    """The largest cached ``barabasi`` graph with this seed and m below ``size``."""
+    sizes = [
+        key[1] for key in cache.keys()
+        if key[0] == DEFAULT_GENERATOR and key[2:] == (m, seed) and key[1] < size
+    ]
+    return cache.get((DEFAULT_GENERATOR, max(sizes), m, seed)) if sizes else None
+
+
+def generator_names():
+    return [DEFAULT_GENERATOR, *GENERATORS]
+
+
+def generate(generator, size, m, seed=None):
+    """An igraph graph for "barabasi", otherwise a CSRGraph from the NumPy generators."""
+    if generator == DEFAULT_GENERATOR:
+        return barabasi(size, m, seed)
+    return GENERATORS[generator](size, m, seed)
+
+
+def snapshot_name(generator, size, m, seed):
+    return f"{generator}-{size}-{m}-{seed}"
+
+
+def graph_key(size, m, seed, generator=DEFAULT_GENERATOR, snapshot=False):
+    """The key get_graph, or with ``snapshot`` get_snapshot, caches a seeded graph under."""
+    return ("snapshot", generator, size, m, seed) if snapshot else (generator, size, m, seed)
+
+
+def resident_bytes(cache, size, m, seed, generator=DEFAULT_GENERATOR, store=None):
+    """Bytes of the graph a request would reuse instead of generating, or 0.
+
+    That is the cached graph's estimated size or, for a snapshot ``store``,
+    the size of the snapshot file already on local disk.
+    """
+    if seed is None:
+        return 0
+    if store is not None:
+        path = store.local_path(snapshot_name(generator, size, m, seed))
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    return cache.bytes_of(graph_key(size, m, seed, generator))
+
+
+def get_graph(cache, size, m=DEFAULT_M, seed=None, generator=DEFAULT_GENERATOR):
+    """Return (graph, cache status) for a generated graph.
+
+    Only seeded graphs are cached: without a seed every request asks for a
+    fresh random graph, so the status is "bypass". A ``barabasi`` miss
+    extends the largest smaller cached graph with the same seed and m when
+    there is one, and reports "grown".
+    """
+    if seed is None:
+        return generate(generator, size, m), "bypass"
+    key = graph_key(size, m, seed, generator)
+    graph = cache.get(key)
+    if graph is not None:
+        return graph, "hit"
+    base = largest_smaller(cache, size, m, seed) if generator == DEFAULT_GENERATOR else None
+    if base is not None:
+        graph, status = grow(base, size, m), "grown"
+    else:
+        graph, status = generate(generator, size, m, seed), "miss"
+    cache.put(key, graph)
+    return graph, status
+
+
+def build_csr(generator, size, m, seed):
+    graph = generate(generator, size, m, seed)
+    return graph if isinstance(graph, CSRGraph) else CSRGraph.from_igraph(graph)
+
+
+def get_snapshot(cache, store, size, m, seed, generator=DEFAULT_GENERATOR):
+    """Return (CSRGraph, cache status, source) for a seeded graph snapshot.
+
+    The source is "cache" when this pod already has the snapshot open,
+    otherwise where ``store`` found it: "disk", "minio" or "generated".
+    """
+    key = graph_key(size, m, seed, generator, snapshot=True)
+    graph = cache.get(key)
+    if graph is not None:
+        return graph, "hit", "cache"
+    graph, source = store.open(snapshot_name(generator, size, m, seed), lambda: build_csr(generator, size, m, seed))
+    cache.put(key, graph)
+    return graph, "miss", source
@@ -0,0 +1,147 @@
+import time
+
+import numpy as np
+
+from .csr import ROOT, UNREACHED, CSRGraph, index_dtype
+
+# Beamer et al.'s switching thresholds: go bottom-up once the frontier's edges
+# exceed 1/ALPHA of the unvisited vertices' edges, and back top-down once a
+# shrinking frontier holds fewer than 1/BETA of the vertices
+ALPHA = 15
+BETA = 18
+# Below this many unresolved vertices a bottom-up step scans their rows whole
+BOTTOM_UP_TAIL = 4096
+
+
+def bitmap(num_vertices):
+    return np.zeros((num_vertices + 7) // 8, dtype=np.uint8)
+
+
+def set_bits(bits, vertices):
+    np.bitwise_or.at(bits, vertices >> 3, np.left_shift(1, vertices & 7).astype(np.uint8))
+
+
+def test_bits(bits, vertices):
+    return (bits[vertices >> 3] >> (vertices & 7)) & 1 == 1
+
+
+def top_down_step(csr, frontier, visited, parents):
+    """Expand every frontier row; returns (discovered, edges examined)."""
+    owner, found = csr.gather(frontier)
+    fresh = ~test_bits(visited, found)
+    owner, found = owner[fresh], found[fresh]
+    # The first discovery of a vertex wins, as with a FIFO queue
+    _, first = np.unique(found, return_index=True)
+    first.sort()
+    discovered = found[first].astype(np.int64)
+    parents[discovered] = frontier[owner[first]]
+    return discovered, len(fresh)
+
+
+def bottom_up_step(csr, frontier, visited, parents):
+    """Let each unvisited vertex look for a frontier parent; returns (discovered, edges examined).
+
+    ``csr`` must hold each vertex's in-edges, i.e. the transpose of a
+    directed graph.
+
+    Rows are scanned one neighbor position at a time across all unresolved
+    vertices, and a vertex stops at its first frontier neighbor, which is
+    where bottom-up saves edge checks on hub-heavy graphs.
+    """
+    in_frontier = bitmap(csr.num_vertices)
+    set_bits(in_frontier, frontier)
+    unvisited = np.flatnonzero(~np.unpackbits(visited, count=csr.num_vertices, bitorder="little").astype(bool))
+    position = csr.offsets[unvisited].astype(np.int64)
+    end = csr.offsets[unvisited + 1].astype(np.int64)
+    live = position < end
+    candidates, position, end = unvisited[live], position[live], end[live]
+    children, found_parents = [], []
+    examined = 0
+    while candidates.size > BOTTOM_UP_TAIL:
+        neighbor = csr.neighbors[position]
+        examined += candidates.size
+        hit = test_bits(in_frontier, neighbor)
+        children.append(candidates[hit])
+        found_parents.append(neighbor[hit])
+        keep = ~hit & (position + 1 < end)
+        candidates, position, end = candidates[keep], position[keep] + 1, end[keep]
+    if candidates.size:
+        # Few vertices remain, so scan the rest of their rows in one gather
+        counts = end - position
+        owner = np.repeat(np.arange(candidates.size), counts)
+        row_begin = np.cumsum(counts) - counts
+        neighbor = csr.neighbors[np.arange(len(owner)) - row_begin[owner] + position[owner]]
+        hits = np.flatnonzero(test_bits(in_frontier, neighbor))
+        owners, first = np.unique(owner[hits], return_index=True)
+        checked = counts.copy()
+        checked[owners] = hits[first] - row_begin[owners] + 1
+        examined += int(checked.sum())
+        children.append(candidates[owners])
+        found_parents.append(neighbor[hits[first]])
+    discovered = np.concatenate(children).astype(np.int64) if children else np.empty(0, dtype=np.int64)
+    chosen = np.concatenate(found_parents) if found_parents else np.empty(0, dtype=np.int64)
+    order = np.argsort(discovered)
+    discovered = discovered[order]
+    parents[discovered] = chosen[order]
+    return discovered, examined
+
+
+def transpose(csr):
+    sources, targets = csr.edges()
+    return CSRGraph.from_edges(csr.num_vertices, targets, sources, directed=True)
+
+
+def direction_optimizing_bfs(csr, root, alpha=ALPHA, beta=BETA, incoming=None):
+    """Beamer-style BFS that switches between top-down and bottom-up steps per level.
+
+    Returns (order, layers, parents, levels) with igraph's result layout;
+    ``levels`` reports each step's direction, frontier size, edges examined
+    and time in microseconds. Vertices discovered bottom-up come out in id
+    order with their lowest-numbered frontier neighbor as parent, so order
+    and parents can differ from a FIFO BFS while distances match.
+
+    Bottom-up steps scan in-edges, so a directed graph is searched through
+    ``incoming``, its transpose, which is built here when not given.
+    """
+    n = csr.num_vertices
+    if incoming is None:
+        incoming = transpose(csr) if csr.directed else csr
+    degrees = csr.degrees().astype(np.int64)
+    # Edges a bottom-up step may still have to check
+    in_degrees = incoming.degrees().astype(np.int64)
+    visited = bitmap(n)
+    parents = np.full(n, UNREACHED, dtype=index_dtype(n))
+    parents[root] = ROOT
+    frontier = np.array([root], dtype=np.int64)
+    set_bits(visited, frontier)
+    unvisited_edges = int(in_degrees.sum() - in_degrees[root])
+    order = [frontier]
+    layers = [0]
+    levels = []
+    visited_count = 1
+    bottom_up = False
+    previous_size = 0
+    while frontier.size:
+        layers.append(visited_count)
+        begin = time.perf_counter()
+        if not bottom_up and degrees[frontier].sum() > unvisited_edges / alpha:
+            bottom_up = True
+        elif bottom_up and frontier.size < n / beta and frontier.size < previous_size:
+            bottom_up = False
+        if bottom_up:
+            discovered, examined = bottom_up_step(incoming, frontier, visited, parents)
+        else:
+            discovered, examined = top_down_step(csr, frontier, visited, parents)
+        set_bits(visited, discovered)
+        unvisited_edges -= int(in_degrees[discovered].sum())
+        levels.append({
+            "direction": "bottom_up" if bottom_up else "top_down",
+            "frontier": int(frontier.size),
+            "edges": int(examined),
+            "time": (time.perf_counter() - begin) * 1e6,
+        })
+        previous_size = frontier.size
+        frontier = discovered
+        order.append(frontier)
+        visited_count += frontier.size
+    return np.concatenate(order), layers, parents, levels
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import time
+
+import numpy as np
+
+# How much of a per-vertex result a response carries, chosen with "result_mode"
+RESULT_MODES = ("full", "topk", "histogram", "digest")
+DEFAULT_K = 10
+HISTOGRAM_BINS = 20
+
+
+def result_parameters(event):
+    """(mode, k) from a request; mode is None when the request does not choose one."""
+    mode = event.get("result_mode")
+    k = event.get("k", DEFAULT_K)
+    if mode is not None and mode not in RESULT_MODES:
+        raise ValueError(f"Invalid 'result_mode', expected one of {list(RESULT_MODES)}")
+    if not isinstance(k, int) or k <= 0:
+        raise ValueError("Invalid 'k', expected a positive integer")
+    return mode, k
+
+
+def top_k(values, k, name="value"):
+    """The ``k`` largest values, largest first, with ties going to the lower vertex.
+
+    One partition instead of a full sort, so the cost stays linear in the
+    number of vertices.
+    """
+    values = np.asarray(values)
+    k = min(k, len(values))
+    if not k:
+        return []
+    kth = np.partition(values, len(values) - k)[len(values) - k]
+    above = np.flatnonzero(values > kth)
+    ties = np.flatnonzero(values == kth)[:k - len(above)]
+    chosen = np.concatenate((above, ties))
+    chosen = chosen[np.lexsort((chosen, -values[chosen]))]
+    return [{"vertex": int(v), name: values[v].item()} for v in chosen]
+
+
+def log_histogram(values, bins=HISTOGRAM_BINS):
+    """Counts of positive values over ``bins`` log-spaced bins, for heavy-tailed scores."""
+    values = np.asarray(values, dtype=np.float64)
+    positive = values[values > 0]
+    if not positive.size:
+        return {"bin_edges": [], "counts": [], "zeros": int(values.size)}
+    low, high = np.log10(positive.min()), np.log10(positive.max())
+    edges = np.logspace(low, max(high, low + 1e-9), bins + 1)
+    # Pin the ends exactly, or rounding in logspace can drop the extremes
+    edges[0], edges[-1] = positive.min(), max(positive.max(), edges[-1])
+    counts, edges = np.histogram(positive, bins=edges)
+    return {"bin_edges": edges.tolist(), "counts": counts.tolist(), "zeros": int(values.size - positive.size)}
+
+
+def checksum(*arrays):
+    """SHA-256 over the arrays widened to 64 bits, so equal results match across dtypes."""
+    h = hashlib.sha256()
+    for array in arrays:
+        array = np.asarray(array)
+        wide = array.astype("<f8" if array.dtype.kind == "f" else "<i8")
+        h.update(np.ascontiguousarray(wide).tobytes())
+    return h.hexdigest()
+
+
+def summary(values):
+    values = np.asarray(values)
+    if not values.size:
+        return {"count": 0}
+    return {
+        "count": int(values.size),
+        "min": values.min().item(),
+        "max": values.max().item(),
+        "mean": float(values.mean()),
+        "sum": values.sum().item(),
+    }
+
+
+def encode_response(result, measurement, begin):
+    """Response body with the result encoded once.
+
+    The time from ``begin``, taken before the result was shaped, to the
+    encoded result is reported as measurement["serialization_time"] in
+    microseconds, next to the other timings.
+    """
+    encoded = json.dumps(result)
+    measurement["serialization_time"] = (time.perf_counter() - begin) * 1e6
+    return f'{{"result": {encoded}, "measurement": {json.dumps(measurement)}}}'.encode()
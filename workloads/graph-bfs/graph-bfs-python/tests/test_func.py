@@ -2,8 +2,19 @@
 An example set of unit tests which confirm that the main handler (the
 callable function) returns 200 OK for a simple HTTP GET.
 """
+import gzip
+import json
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
 import pytest
-from function import new
+from minio.error import S3Error
+from function import footprint, new
+from function.cache import GraphCache
+from function.edgelist import EdgeListStore
+from function.footprint import AdmissionGuard
+from function.snapshots import SnapshotStore
 
 
 @pytest.mark.asyncio
@@ -36,3 +47,338 @@ async def test_function_handle():
     assert sent_ok, "Function did not send a 200 OK"
     assert sent_headers, "Function did not send headers"
     assert sent_body, "Function did not send a body"
+
+
+async def invoke(f, payload):
+    """Run one POST through the handler and return (status, decoded JSON body)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await f.handle({"method": "POST"}, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.mark.asyncio
+async def test_seeded_graph_is_cached():
+    f = new()
+
+    _, first = await invoke(f, {"size": 300, "seed": 7})
+    _, second = await invoke(f, {"size": 300, "seed": 7})
+    _, unseeded = await invoke(f, {"size": 300})
+
+    assert first["measurement"]["graph_cache"] == "miss"
+    assert second["measurement"]["graph_cache"] == "hit"
+    assert unseeded["measurement"]["graph_cache"] == "bypass"
+    assert second["result"] == first["result"]
+
+
+def test_graph_cache_evicts_least_recently_used_bytes():
+    cache = GraphCache(100, sizeof=len)
+    cache.put("a", b"x" * 40)
+    cache.put("b", b"x" * 40)
+    assert cache.get("a") is not None
+    cache.put("c", b"x" * 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes == 80 and cache.evictions == 1
+    cache.put("huge", b"x" * 101)
+    assert cache.get("huge") is None and cache.bytes == 80
+
+
+class FakeMinio:
+    """Just enough of the MinIO client for SnapshotStore and EdgeListStore, backed by local files."""
+
+    def __init__(self, root):
+        self.root = root
+        self.buckets = set()
+
+    def bucket_exists(self, bucket):
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket):
+        self.buckets.add(bucket)
+
+    def fput_object(self, bucket, name, path):
+        target = self.root / bucket / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+
+    def fget_object(self, bucket, name, path):
+        source = self.root / bucket / name
+        if not source.exists():
+            raise S3Error(None, "NoSuchKey", "missing", name, "", "")
+        shutil.copyfile(source, path)
+
+    def stat_object(self, bucket, name):
+        source = self.root / bucket / name
+        if not source.exists():
+            raise S3Error(None, "NoSuchKey", "missing", name, "", "")
+        return SimpleNamespace(etag=str(source.stat().st_mtime_ns))
+
+    def get_object(self, bucket, name):
+        self.stat_object(bucket, name)
+        return FakeResponse((self.root / bucket / name).read_bytes())
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self, amt):
+        for begin in range(0, len(self.data), amt):
+            yield self.data[begin:begin + amt]
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_published_once_and_memory_mapped(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    publisher, reader = new(), new()
+    publisher.snapshots = SnapshotStore(client, "graphs", str(tmp_path / "a"))
+    reader.snapshots = SnapshotStore(client, "graphs", str(tmp_path / "b"))
+    request = {"size": 300, "m": 3, "seed": 5, "snapshot": True}
+
+    _, generated = await invoke(publisher, request)
+    _, cached = await invoke(publisher, request)
+    _, downloaded = await invoke(reader, request)
+    _, in_memory = await invoke(new(), {"size": 300, "m": 3, "seed": 5})
+
+    assert generated["measurement"]["snapshot_source"] == "generated"
+    assert cached["measurement"]["graph_cache"] == "hit"
+    assert downloaded["measurement"]["snapshot_source"] == "minio"
+    assert generated["result"] == downloaded["result"] == in_memory["result"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("generator", ["preferential_attachment", "erdos_renyi", "rmat"])
+async def test_numpy_generators_are_seeded(generator):
+    request = {"size": 500, "m": 4, "seed": 11, "generator": generator}
+
+    status, first = await invoke(new(), request)
+    _, second = await invoke(new(), request)
+
+    assert status == 200
+    assert first["result"] == second["result"]
+    assert first["result"]["order"][0] == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_generator_is_rejected():
+    status, body = await invoke(new(), {"size": 100, "generator": "watts_strogatz"})
+    assert status == 400 and "generator" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_cached_graph_grows_to_larger_size():
+    f = new()
+
+    await invoke(f, {"size": 200, "m": 3, "seed": 4})
+    _, grown = await invoke(f, {"size": 700, "m": 3, "seed": 4})
+    _, fresh = await invoke(new(), {"size": 700, "m": 3, "seed": 4})
+
+    assert grown["measurement"]["graph_cache"] == "grown"
+    assert fresh["measurement"]["graph_cache"] == "miss"
+    assert grown["result"] == fresh["result"]
+
+
+@pytest.mark.asyncio
+async def test_batched_sources_match_single_source_bfs():
+    f = new()
+    request = {"size": 400, "m": 2, "seed": 8, "generator": "preferential_attachment"}
+    sources = list(range(0, 400, 5))  # 80 sources: one full pass and a partial one
+
+    status, batch = await invoke(f, {**request, "sources": sources, "batch_result": "distances"})
+    _, single = await invoke(f, request)
+
+    assert status == 200
+    assert batch["result"]["summary"]["queries"] == 80
+    assert batch["result"]["summary"]["passes"] == 2
+    assert batch["measurement"]["queries_per_second"] > 0
+    first = batch["result"]["sources"][0]
+    layers = single["result"]["dist"]
+    for level, (begin, end) in enumerate(zip(layers, layers[1:])):
+        assert all(first["dist"][v] == level for v in single["result"]["order"][begin:end])
+    assert first["eccentricity"] == len(layers) - 2
+    assert first["reached"] == len(single["result"]["order"])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sources", [[], [0, 400], "0", [0.5]])
+async def test_invalid_sources_are_rejected(sources):
+    status, body = await invoke(new(), {"size": 400, "sources": sources})
+    assert status == 400 and "sources" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_direction_optimizing_engine_matches_bfs_distances():
+    f = new()
+    request = {"size": 3000, "m": 4, "seed": 6}
+
+    status, hybrid = await invoke(f, {**request, "engine": "direction_optimizing"})
+    _, reference = await invoke(f, request)
+
+    assert status == 200
+    assert hybrid["result"]["dist"] == reference["result"]["dist"]
+    for begin, end in zip(reference["result"]["dist"], reference["result"]["dist"][1:]):
+        assert sorted(hybrid["result"]["order"][begin:end]) == sorted(reference["result"]["order"][begin:end])
+    levels = hybrid["measurement"]["levels"]
+    assert {level["direction"] for level in levels} == {"top_down", "bottom_up"}
+    assert hybrid["measurement"]["edges_examined"] == sum(level["edges"] for level in levels)
+
+
+@pytest.mark.asyncio
+async def test_direction_optimizing_engine_follows_directed_edges(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    bucket = tmp_path / "minio" / "datasets"
+    bucket.mkdir(parents=True)
+    rng = np.random.default_rng(8)
+    edges = rng.integers(0, 3000, size=(30000, 2))
+    (bucket / "directed.bin").write_bytes(edges.astype("<i4").tobytes())
+    f = new()
+    f.edge_lists = EdgeListStore(client)
+    request = {"input-bucket": "datasets", "objectKey": "directed.bin", "directed": True}
+
+    status, hybrid = await invoke(f, {**request, "engine": "direction_optimizing"})
+    _, reference = await invoke(f, {**request, "engine": "top_down"})
+
+    assert status == 200
+    assert "bottom_up" in {level["direction"] for level in hybrid["measurement"]["levels"]}
+    assert hybrid["result"]["dist"] == reference["result"]["dist"]
+    for begin, end in zip(reference["result"]["dist"], reference["result"]["dist"][1:]):
+        assert sorted(hybrid["result"]["order"][begin:end]) == sorted(reference["result"]["order"][begin:end])
+    present = set(map(tuple, edges.tolist()))
+    parents = hybrid["result"]["parents"]
+    assert all((parent, v) in present for v, parent in enumerate(parents) if parent >= 0)
+
+
+@pytest.mark.asyncio
+async def test_approximate_distances_match_exhaustive_sampling():
+    f = new()
+    request = {"size": 300, "m": 2, "seed": 4, "generator": "preferential_attachment"}
+
+    status, sampled = await invoke(f, {**request, "approximate": True, "samples": 50})
+    _, everything = await invoke(f, {**request, "approximate": True, "samples": 1000})
+    _, batch = await invoke(f, {**request, "sources": list(range(300))})
+
+    assert status == 200
+    assert sampled["measurement"]["samples"] == 50
+    assert everything["result"]["sources"] == 300
+    assert everything["result"]["mean_distance"] == pytest.approx(batch["result"]["summary"]["mean_distance"])
+    assert sampled["result"]["mean_distance"] == pytest.approx(everything["result"]["mean_distance"], rel=0.1)
+    assert sum(sampled["result"]["histogram"]) == pytest.approx(1.0)
+
+
+@pytest.mark.asyncio
+async def test_invalid_epsilon_is_rejected():
+    status, body = await invoke(new(), {"size": 300, "approximate": True, "epsilon": 2})
+    assert status == 400 and "epsilon" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_result_modes_summarize_the_full_result():
+    f = new()
+    request = {"size": 2000, "m": 2, "seed": 9}
+
+    status, full = await invoke(f, {**request, "result_mode": "full"})
+    _, topk = await invoke(f, {**request, "result_mode": "topk", "k": 5})
+    _, histogram = await invoke(f, {**request, "result_mode": "histogram"})
+    _, digest = await invoke(f, {**request, "result_mode": "digest"})
+    _, again = await invoke(new(), {**request, "result_mode": "digest"})
+
+    assert status == 200
+    layers = full["result"]["dist"]
+    assert histogram["result"]["distances"] == [end - begin for begin, end in zip(layers, layers[1:])]
+    assert histogram["result"]["unreached"] == 2000 - layers[-1]
+    farthest = topk["result"]["farthest"]
+    assert len(farthest) == 5 and all(entry["distance"] == len(layers) - 2 for entry in farthest)
+    assert farthest[0]["vertex"] in full["result"]["order"][layers[-2]:]
+    assert digest["result"]["eccentricity"] == len(layers) - 2
+    assert digest["result"]["checksum"] == again["result"]["checksum"]
+    assert all("serialization_time" in r["measurement"] for r in (full, topk, histogram, digest))
+
+
+@pytest.mark.asyncio
+async def test_invalid_result_mode_is_rejected():
+    status, body = await invoke(new(), {"size": 300, "result_mode": "sample"})
+    assert status == 400 and "result_mode" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_memory_are_refused(monkeypatch):
+    f = new()
+    f.admission = AdmissionGuard(limit=256 << 20)
+    monkeypatch.setattr(footprint, "memory_usage", lambda: 0)
+
+    status, admitted = await invoke(f, {"size": 300, "seed": 1})
+    too_large, refused = await invoke(f, {"size": 10 ** 8, "m": 10})
+    monkeypatch.setattr(footprint, "memory_usage", lambda: (256 << 20) - (1 << 20))
+    busy, deferred = await invoke(f, {"size": 100000, "m": 10})
+
+    assert status == 200 and admitted["measurement"]["estimated_peak_bytes"] > 0
+    assert too_large == 413 and refused["estimated_bytes"] > refused["memory_limit"]
+    assert busy == 429 and deferred["memory_available"] == 1 << 20
+
+
+@pytest.mark.asyncio
+async def test_cached_graphs_are_admitted_under_memory_pressure(monkeypatch):
+    f = new()
+    f.admission = AdmissionGuard(limit=256 << 20)
+    monkeypatch.setattr(footprint, "memory_usage", lambda: 0)
+    request = {"size": 20000, "m": 5}
+    await invoke(f, {**request, "seed": 3})
+    await invoke(f, {**request, "seed": 4})
+    cached = f.graphs.bytes_of(("barabasi", 20000, 5, 3))
+    needed = int(f.admission.check(["bfs"], "barabasi", 20000, 5) * footprint.SAFETY_FACTOR)
+    # Cached graphs count towards usage, and what is left is half a graph short of a cold request
+    base = (256 << 20) - f.graphs.bytes - needed + cached // 2
+    monkeypatch.setattr(footprint, "memory_usage", lambda: base + f.graphs.bytes)
+
+    warm, _ = await invoke(f, {**request, "seed": 3})
+    evicted_for_warm = f.graphs.evictions
+    cold, _ = await invoke(f, {**request, "seed": 5})
+
+    assert warm == 200 and evicted_for_warm == 0
+    # The least recently used graph makes room for a new one
+    assert cold == 200 and f.graphs.evictions == 1
+    assert set(f.graphs.keys()) == {("barabasi", 20000, 5, 3), ("barabasi", 20000, 5, 5)}
+
+
+@pytest.mark.asyncio
+async def test_edge_list_objects_are_streamed_and_cached(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    bucket = tmp_path / "minio" / "datasets"
+    bucket.mkdir(parents=True)
+    # A path 0-1-2-3 with a branch at 1, as SNAP-style text, gzip and int32 pairs
+    edges = [(0, 1), (1, 2), (2, 3), (1, 4)]
+    text = "# FromNodeId\tToNodeId\n" + "".join(f"{u}\t{v}\n" for u, v in edges)
+    (bucket / "graph.txt").write_text(text)
+    (bucket / "graph.txt.gz").write_bytes(gzip.compress(text.encode()))
+    (bucket / "graph.bin").write_bytes(np.array(edges, dtype="<i4").tobytes())
+    f = new()
+    f.edge_lists = EdgeListStore(client)
+
+    status, parsed = await invoke(f, {"input-bucket": "datasets", "objectKey": "graph.txt"})
+    _, cached = await invoke(f, {"input-bucket": "datasets", "objectKey": "graph.txt"})
+    _, compressed = await invoke(f, {"input-bucket": "datasets", "objectKey": "graph.txt.gz"})
+    _, binary = await invoke(f, {"input-bucket": "datasets", "objectKey": "graph.bin", "sources": [3]})
+    missing, error = await invoke(f, {"input-bucket": "datasets", "objectKey": "absent.txt"})
+
+    assert status == 200
+    assert parsed["result"]["dist"] == [0, 1, 2, 4, 5]
+    assert parsed["measurement"]["graph_cache"] == "miss" and cached["measurement"]["graph_cache"] == "hit"
+    assert parsed["measurement"]["edges_read"] == 4 and parsed["measurement"]["parse_throughput"] > 0
+    assert "parse_time" not in cached["measurement"]
+    assert compressed["result"] == parsed["result"]
+    assert binary["result"]["sources"][0]["eccentricity"] == 3
+    assert missing == 400 and "absent.txt" in error["error"]
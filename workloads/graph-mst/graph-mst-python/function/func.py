@@ -2,7 +2,51 @@
 import logging
 import json
 import datetime
-from igraph import Graph
+import time
+import numpy as np
+from minio import Minio
+from .cache import GraphCache
+from .footprint import AdmissionError, AdmissionGuard
+from .csr import CSRGraph, spanning_forest
+from .edgelist import EdgeListStore, input_parameters
+from .graphs import (
+    DEFAULT_GENERATOR, DEFAULT_M, generator_names, get_graph, get_snapshot, graph_key, resident_bytes
+)
+from .approximate import edge_weights, estimate_msf_weight, sampling_parameters
+from .mst import boruvka, cpu_quota
+from .results import checksum, encode_response, result_parameters, top_k
+from .snapshots import SnapshotStore
+
+DEFAULT_SNAPSHOT_BUCKET = "graph-snapshots"
+DEFAULT_SNAPSHOT_DIR = "/tmp/graph-snapshots"
+ENGINES = ("igraph", "boruvka")
+
+
+def edge_arrays(graph):
+    """(sources, targets) in the graph's edge order, which supplied weights follow."""
+    if isinstance(graph, CSRGraph):
+        return graph.edges()
+    edges = np.array(graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def shape_result(mode, k, num_vertices, tree_sources, tree_targets):
+    """Forest edge list in the requested mode; None and "full" return every edge."""
+    if mode in (None, "full"):
+        return np.column_stack((tree_sources, tree_targets)).tolist()
+    degrees = np.bincount(np.concatenate((tree_sources, tree_targets)).astype(np.int64), minlength=num_vertices)
+    if mode == "topk":
+        return {"hubs": top_k(degrees, k, "degree")}
+    if mode == "histogram":
+        return {"degrees": np.bincount(degrees).tolist()}
+    # Edges in canonical (low, high) order, so the digest does not depend on the engine
+    low, high = np.minimum(tree_sources, tree_targets), np.maximum(tree_sources, tree_targets)
+    order = np.lexsort((high, low))
+    return {
+        "checksum": checksum(low[order], high[order]),
+        "edges": int(len(low)),
+        "components": num_vertices - int(len(low)),
+    }
 
 
 def new():
@@ -11,7 +55,12 @@ def new():
 
 class Function:
     def __init__(self):
-        pass
+        self.graphs = GraphCache()
+        # Refuses requests that would not fit in the pod's memory
+        self.admission = AdmissionGuard()
+        # Set up in start(), once the MinIO endpoint is known
+        self.snapshots = None
+        self.edge_lists = None
 
     async def handle(self, scope, receive, send):
         logging.info("OK: Request Received")
@@ -29,42 +78,171 @@ class Function:
             payload = json.loads(body.decode("utf-8"))
             size = payload.get("size")
             seed = payload.get("seed", None)
+            m = payload.get("m", DEFAULT_M)
+            generator = payload.get("generator", DEFAULT_GENERATOR)
+            use_snapshot = payload.get("snapshot", False)
+            weights_spec = payload.get("weights")
+            engine = payload.get("engine")
+            workers = payload.get("workers", cpu_quota())
+            approximate = payload.get("approximate", False)
+            result_mode, k = result_parameters(payload)
+            # A graph read from an edge-list object replaces the generator parameters
+            object_input = input_parameters(payload)
 
-            if not isinstance(size, int) or size <= 0:
+            if object_input is not None and self.edge_lists is None:
+                raise ValueError("Object input is not configured")
+            if object_input is None and (not isinstance(size, int) or size <= 0):
                 raise ValueError("Invalid 'size'")
+            if not isinstance(m, int) or m <= 0:
+                raise ValueError("Invalid 'm'")
+            if generator not in generator_names():
+                raise ValueError(f"Unknown 'generator', expected one of {generator_names()}")
+            if use_snapshot and seed is None:
+                raise ValueError("'snapshot' requires a 'seed'")
+            if use_snapshot and self.snapshots is None:
+                raise ValueError("Snapshots are not configured")
+            if weights_spec is not None and weights_spec != "random" and not isinstance(weights_spec, list):
+                raise ValueError("'weights' must be \"random\" or a list with one weight per edge")
+            if engine is not None and engine not in ENGINES:
+                raise ValueError(f"Invalid 'engine', expected one of {list(ENGINES)}")
+            if not isinstance(workers, int) or workers <= 0:
+                raise ValueError("Invalid 'workers'")
+            if approximate:
+                epsilon, delta, samples = sampling_parameters(payload)
+                if weights_spec not in (None, "random"):
+                    raise ValueError("'approximate' estimates the forest under \"random\" weights only")
+                if result_mode not in (None, "full"):
+                    raise ValueError("'result_mode' applies to exact spanning forests")
 
-            if seed is not None:
-                import random
-                random.seed(seed)
+            # Object sizes are only known once parsed, so only generated graphs are checked.
+            # A graph this pod already holds is not charged again, and other cached graphs can make room.
+            estimated_bytes = parse_stats = snapshot_source = None
+            if object_input is None:
+                store = self.snapshots if use_snapshot else None
+                estimated_bytes = self.admission.check(
+                    ["mst"], generator, size, m,
+                    resident=resident_bytes(self.graphs, size, m, seed, generator, store),
+                    caches=[self.graphs],
+                    keep=graph_key(size, m, seed, generator, use_snapshot),
+                )
 
-            # Generate Barabási–Albert graph
+            # Generate the graph, or reuse a cached one with the same seed.
+            # Snapshots are memory-mapped CSR files, generated once and shared through MinIO.
             gen_start = datetime.datetime.now()
-            graph = Graph.Barabasi(n=size, m=10)
+            if object_input is not None:
+                graph, cache_status, parse_stats = self.edge_lists.open(
+                    self.graphs, *object_input, directed=payload.get("directed", False)
+                )
+            elif use_snapshot:
+                graph, cache_status, snapshot_source = get_snapshot(
+                    self.graphs, self.snapshots, size, m, seed, generator
+                )
+            else:
+                graph, cache_status = get_graph(self.graphs, size, m, seed, generator)
             gen_end = datetime.datetime.now()
 
-            # Compute spanning tree
-            compute_start = datetime.datetime.now()
-            spanning = graph.spanning_tree(None, True)
-            compute_end = datetime.datetime.now()
+            if approximate:
+                # Sampling replaces the exact forest; only its weight is estimated
+                if not isinstance(graph, CSRGraph):
+                    graph = CSRGraph.from_igraph(graph)
+                compute_start = datetime.datetime.now()
+                estimate, components = estimate_msf_weight(graph, epsilon, samples, seed=seed, weight_seed=seed)
+                compute_end = datetime.datetime.now()
+                shape_begin = time.perf_counter()
+                edge_list = {"estimated_weight": estimate, "estimated_components": components}
+                measurement = {
+                    "graph_generating_time": (gen_end - gen_start) / datetime.timedelta(microseconds=1),
+                    "compute_time": (compute_end - compute_start) / datetime.timedelta(microseconds=1),
+                    "graph_cache": cache_status,
+                    "graph_cache_bytes": self.graphs.bytes,
+                    "snapshot_source": snapshot_source,
+                    "epsilon": epsilon,
+                    "delta": delta,
+                    "samples": samples,
+                    "estimated_peak_bytes": estimated_bytes,
+                }
+            else:
+                # Edge arrays and weights are prepared outside compute_time, so engines compare fairly
+                prep_start = datetime.datetime.now()
+                is_csr = isinstance(graph, CSRGraph)
+                weighted = weights_spec is not None
+                if engine is None:
+                    engine = "boruvka" if weighted and is_csr else "igraph"
+                sources = targets = weights = None
+                if weighted or engine == "boruvka":
+                    sources, targets = edge_arrays(graph)
+                if weights_spec == "random":
+                    weights = edge_weights(sources, targets, seed)
+                elif weighted:
+                    weights = np.asarray(weights_spec, dtype=np.float64)
+                    if weights.shape != sources.shape:
+                        raise ValueError(f"'weights' has {weights.size} entries for {sources.size} edges")
+                if engine == "igraph" and is_csr and weighted:
+                    graph = graph.to_igraph()
+                prep_end = datetime.datetime.now()
+
+                # Compute spanning tree
+                compute_start = datetime.datetime.now()
+                rounds = None
+                if engine == "boruvka":
+                    tree, rounds = boruvka(
+                        graph.num_vertices if is_csr else graph.vcount(), sources, targets,
+                        weights if weighted else np.zeros(len(sources)), workers
+                    )
+                elif weighted:
+                    tree = np.array(graph.spanning_tree(weights=weights, return_tree=False), dtype=np.int64)
+                elif is_csr:
+                    tree_sources, tree_targets = spanning_forest(graph)
+                else:
+                    spanning = graph.spanning_tree(None, True)
+                compute_end = datetime.datetime.now()
 
-            # Calculate timings in microseconds
-            graph_time = (gen_end - gen_start) / datetime.timedelta(microseconds=1)
-            compute_time = (compute_end - compute_start) / datetime.timedelta(microseconds=1)
+                # Calculate timings in microseconds
+                graph_time = (gen_end - gen_start) / datetime.timedelta(microseconds=1)
+                prep_time = (prep_end - prep_start) / datetime.timedelta(microseconds=1)
+                compute_time = (compute_end - compute_start) / datetime.timedelta(microseconds=1)
 
-            # Prepare result (return edge list)
-            edge_list = [list(edge.tuple) for edge in spanning.es]
+                # Prepare result (return edge list), without a Python loop per edge
+                shape_begin = time.perf_counter()
+                if weighted or engine == "boruvka":
+                    tree_sources, tree_targets = sources[tree], targets[tree]
+                if weighted or engine == "boruvka" or is_csr:
+                    num_vertices = graph.num_vertices if isinstance(graph, CSRGraph) else graph.vcount()
+                    edge_list = shape_result(result_mode, k, num_vertices, tree_sources, tree_targets)
+                elif result_mode in (None, "full"):
+                    edge_list = spanning.get_edgelist()
+                else:
+                    tree_edges = np.array(spanning.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+                    edge_list = shape_result(result_mode, k, graph.vcount(), tree_edges[:, 0], tree_edges[:, 1])
 
-            response_body = json.dumps({
-                "result": edge_list,
-                "measurement": {
+                measurement = {
                     "graph_generating_time": graph_time,
-                    "compute_time": compute_time
+                    "edge_prep_time": prep_time,
+                    "compute_time": compute_time,
+                    "graph_cache": cache_status,
+                    "graph_cache_bytes": self.graphs.bytes,
+                    "snapshot_source": snapshot_source,
+                    "engine": engine,
+                    "estimated_peak_bytes": estimated_bytes,
                 }
-            }).encode()
+                if weighted:
+                    measurement["total_weight"] = float(weights[tree].sum())
+                if rounds is not None:
+                    measurement["rounds"] = rounds
+                    measurement["workers"] = workers
+
+            if parse_stats:
+                measurement.update(parse_stats)
+            response_body = encode_response(edge_list, measurement, shape_begin)
 
             status = 200
             content_type = b"application/json"
 
+        except AdmissionError as e:
+            response_body = json.dumps(e.body).encode()
+            status = e.status
+            content_type = b"application/json"
+
         except Exception as e:
             logging.exception("Error handling request")
             response_body = json.dumps({"error": str(e)}).encode()
@@ -85,6 +263,22 @@ class Function:
 
     def start(self, cfg):
         logging.info("Function starting")
+        if cfg.get("GRAPH_CACHE_BYTES"):
+            self.graphs = GraphCache(int(cfg["GRAPH_CACHE_BYTES"]))
+        if cfg.get("MEMORY_LIMIT_BYTES"):
+            self.admission = AdmissionGuard(limit=int(cfg["MEMORY_LIMIT_BYTES"]))
+        client = Minio(
+            cfg.get("MINIO_ENDPOINT", "minio:9000"),
+            access_key=cfg.get("MINIO_ACCESS_KEY", "minioadmin"),
+            secret_key=cfg.get("MINIO_SECRET_KEY", "minioadmin"),
+            secure=False,
+        )
+        self.snapshots = SnapshotStore(
+            client,
+            cfg.get("SNAPSHOT_BUCKET", DEFAULT_SNAPSHOT_BUCKET),
+            cfg.get("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR),
+        )
+        self.edge_lists = EdgeListStore(client)
 
     def stop(self):
         logging.info("Function stopping")
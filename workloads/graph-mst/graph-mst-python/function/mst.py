@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Edges per task when a Borůvka round searches for each component's lightest edge
+MIN_EDGES_CHUNK = 1 << 20
+# The sorted search costs about four serial scatters, so fewer workers scatter instead
+SORT_MIN_WORKERS = 4
+
+
+def cpu_quota():
+    """Number of CPUs this container may use, from the cgroup CPU quota.
+
+    Falls back to the scheduler affinity mask when no quota is set, so a pod
+    limited to 4 CPUs on a 64-core node gets 4 workers, not 64.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        # A fractional quota (e.g. 1500m) still deserves a second worker
+        cpus = min(cpus, max(1, int(quota + 0.5)))
+    return cpus
+
+
+def lightest_edges(num_vertices, comp_u, comp_v, ranks, workers):
+    """Lowest edge rank touching each component; the int64 maximum where none does.
+
+    ``np.minimum.at`` scatters the ranks fastest on one core, but it holds
+    the GIL throughout, so threads running it take turns. With at least
+    ``SORT_MIN_WORKERS`` workers the edge list is instead split into chunks
+    searched by a thread pool: a chunk sorts one (component, rank) key per
+    edge end and keeps the first key of every component. NumPy's sort and
+    elementwise kernels release the GIL, so chunks run in parallel. The
+    chunk minima are then merged per component.
+    """
+    none = np.iinfo(np.int64).max
+    best = np.full(num_vertices, none, dtype=np.int64)
+    if workers < SORT_MIN_WORKERS or len(ranks) <= MIN_EDGES_CHUNK:
+        np.minimum.at(best, comp_u, ranks)
+        np.minimum.at(best, comp_v, ranks)
+        return best
+    # Keys stay below num_vertices * span, which fits an int64 for any graph we can hold
+    span = int(ranks.max()) + 1
+
+    def search(chunk):
+        count = len(ranks[chunk])
+        keys = np.empty(2 * count, dtype=np.int64)
+        np.multiply(comp_u[chunk], span, out=keys[:count])
+        np.multiply(comp_v[chunk], span, out=keys[count:])
+        keys[:count] += ranks[chunk]
+        keys[count:] += ranks[chunk]
+        keys.sort()
+        comps = keys // span
+        first = np.flatnonzero(comps[1:] != comps[:-1]) + 1
+        first = np.concatenate(([0], first))
+        return comps[first], keys[first] - comps[first] * span
+
+    size = max(MIN_EDGES_CHUNK, -(-len(ranks) // workers))
+    chunks = [slice(begin, begin + size) for begin in range(0, len(ranks), size)]
+    with ThreadPoolExecutor(min(workers, len(chunks))) as pool:
+        found = list(pool.map(search, chunks))
+    # Components are unique within a chunk, so plain indexing merges the minima
+    for comps, lowest in found:
+        best[comps] = np.minimum(best[comps], lowest)
+    return best
+
+
+def boruvka(num_vertices, sources, targets, weights, workers=1):
+    """Minimum spanning forest by Borůvka rounds over an array-backed union-find.
+
+    Every round each component picks its lightest outgoing edge, ties
+    broken by edge index, and hooks onto the component at its other end;
+    pointer jumping then flattens the union-find so every vertex maps
+    straight to its root. Edges inside one component are dropped for good,
+    so rounds shrink geometrically. Returns (tree edge indices, rounds).
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    # Rank edges once by (weight, index); ranks are then a strict total order
+    order = np.argsort(weights, kind="stable")
+    u, v = sources[order], targets[order]
+    ranks = np.arange(len(order), dtype=np.int64)
+    comp = np.arange(num_vertices, dtype=np.int64)
+    tree = []
+    rounds = 0
+    while True:
+        comp_u, comp_v = comp[u], comp[v]
+        between = comp_u != comp_v
+        u, v, ranks = u[between], v[between], ranks[between]
+        comp_u, comp_v = comp_u[between], comp_v[between]
+        if not ranks.size:
+            break
+        rounds += 1
+        best = lightest_edges(num_vertices, comp_u, comp_v, ranks, workers)
+        roots = np.flatnonzero(best != np.iinfo(np.int64).max)
+        # Map each chosen rank back to its position among the surviving edges
+        position = np.searchsorted(ranks, best[roots])
+        a, b = comp_u[position], comp_v[position]
+        other = np.where(a == roots, b, a)
+        parent = np.arange(num_vertices, dtype=np.int64)
+        parent[roots] = other
+        # Two components that chose the same edge point at each other; keep the smaller as root
+        mutual = (parent[other] == roots) & (roots < other)
+        parent[roots[mutual]] = roots[mutual]
+        tree.append(np.unique(best[roots]))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        comp = parent[comp]
+    chosen = np.concatenate(tree) if tree else np.empty(0, dtype=np.int64)
+    return np.sort(order[chosen]), rounds
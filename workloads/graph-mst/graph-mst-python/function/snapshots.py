@@ -0,0 +1,52 @@
+import logging
+import os
+
+from minio.error import S3Error
+
+from .csr import CSRGraph
+
+
+class SnapshotStore:
+    """CSR snapshots kept in MinIO and mirrored to local disk for ``mmap``.
+
+    A snapshot is generated and uploaded once; later cold starts download
+    the file instead of regenerating the graph, and warm pods reuse the
+    local copy. Opened snapshots are memory-mapped, so a graph larger than
+    the pod's memory can still be traversed.
+    """
+
+    def __init__(self, client, bucket_name, local_dir):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.local_dir = local_dir
+
+    def object_name(self, name):
+        return f"snapshots/{name}.csr"
+
+    def local_path(self, name):
+        return os.path.join(self.local_dir, f"{name}.csr")
+
+    def open(self, name, build):
+        """Return (CSRGraph, source) where source is "disk", "minio" or "generated"."""
+        os.makedirs(self.local_dir, exist_ok=True)
+        path = self.local_path(name)
+        if os.path.exists(path):
+            return CSRGraph.load(path), "disk"
+
+        try:
+            self.client.fget_object(self.bucket_name, self.object_name(name), path)
+            logging.info(f"Downloaded snapshot {name}")
+            return CSRGraph.load(path), "minio"
+        except S3Error as e:
+            if e.code not in ("NoSuchKey", "NoSuchBucket"):
+                raise
+
+        # Write under a temporary name so a crash never leaves a torn snapshot behind
+        partial = f"{path}.{os.getpid()}.part"
+        build().save(partial)
+        os.replace(partial, path)
+        if not self.client.bucket_exists(self.bucket_name):
+            self.client.make_bucket(self.bucket_name)
+        self.client.fput_object(self.bucket_name, self.object_name(name), path)
+        logging.info(f"Published snapshot {name}")
+        return CSRGraph.load(path), "generated"
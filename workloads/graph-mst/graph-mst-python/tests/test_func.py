@@ -2,8 +2,17 @@
 An example set of unit tests which confirm that the main handler (the
 callable function) returns 200 OK for a simple HTTP GET.
 """
+import json
+import shutil
+from types import SimpleNamespace
+
 import pytest
-from function import new
+from minio.error import S3Error
+from function import mst, new
+from function.cache import GraphCache
+from function.edgelist import EdgeListStore
+from function.footprint import AdmissionGuard
+from function.snapshots import SnapshotStore
 
 
 @pytest.mark.asyncio
@@ -36,3 +45,268 @@ async def test_function_handle():
     assert sent_ok, "Function did not send a 200 OK"
     assert sent_headers, "Function did not send headers"
     assert sent_body, "Function did not send a body"
+
+
+async def invoke(f, payload):
+    """Run one POST through the handler and return (status, decoded JSON body)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await f.handle({"method": "POST"}, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.mark.asyncio
+async def test_seeded_graph_is_cached():
+    f = new()
+
+    _, first = await invoke(f, {"size": 300, "seed": 7})
+    _, second = await invoke(f, {"size": 300, "seed": 7})
+    _, unseeded = await invoke(f, {"size": 300})
+
+    assert first["measurement"]["graph_cache"] == "miss"
+    assert second["measurement"]["graph_cache"] == "hit"
+    assert unseeded["measurement"]["graph_cache"] == "bypass"
+    assert second["result"] == first["result"]
+
+
+def test_graph_cache_evicts_least_recently_used_bytes():
+    cache = GraphCache(100, sizeof=len)
+    cache.put("a", b"x" * 40)
+    cache.put("b", b"x" * 40)
+    assert cache.get("a") is not None
+    cache.put("c", b"x" * 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes == 80 and cache.evictions == 1
+    cache.put("huge", b"x" * 101)
+    assert cache.get("huge") is None and cache.bytes == 80
+
+
+class FakeMinio:
+    """Just enough of the MinIO client for SnapshotStore and EdgeListStore, backed by local files."""
+
+    def __init__(self, root):
+        self.root = root
+        self.buckets = set()
+
+    def bucket_exists(self, bucket):
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket):
+        self.buckets.add(bucket)
+
+    def fput_object(self, bucket, name, path):
+        target = self.root / bucket / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+
+    def fget_object(self, bucket, name, path):
+        source = self.root / bucket / name
+        if not source.exists():
+            raise S3Error(None, "NoSuchKey", "missing", name, "", "")
+        shutil.copyfile(source, path)
+
+    def stat_object(self, bucket, name):
+        source = self.root / bucket / name
+        if not source.exists():
+            raise S3Error(None, "NoSuchKey", "missing", name, "", "")
+        return SimpleNamespace(etag=str(source.stat().st_mtime_ns))
+
+    def get_object(self, bucket, name):
+        self.stat_object(bucket, name)
+        return FakeResponse((self.root / bucket / name).read_bytes())
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self, amt):
+        for begin in range(0, len(self.data), amt):
+            yield self.data[begin:begin + amt]
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_published_once_and_memory_mapped(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    publisher, reader = new(), new()
+    publisher.snapshots = SnapshotStore(client, "graphs", str(tmp_path / "a"))
+    reader.snapshots = SnapshotStore(client, "graphs", str(tmp_path / "b"))
+    request = {"size": 300, "m": 3, "seed": 5, "snapshot": True}
+
+    _, generated = await invoke(publisher, request)
+    _, cached = await invoke(publisher, request)
+    _, downloaded = await invoke(reader, request)
+    _, in_memory = await invoke(new(), {"size": 300, "m": 3, "seed": 5})
+
+    assert generated["measurement"]["snapshot_source"] == "generated"
+    assert cached["measurement"]["graph_cache"] == "hit"
+    assert downloaded["measurement"]["snapshot_source"] == "minio"
+    assert generated["result"] == downloaded["result"]
+    # A different BFS tree of the same graph: same size, and every vertex is reached
+    assert len(generated["result"]) == len(in_memory["result"]) == 299
+    assert {v for edge in generated["result"] for v in edge} == set(range(300))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("generator", ["preferential_attachment", "erdos_renyi", "rmat"])
+async def test_numpy_generators_are_seeded(generator):
+    request = {"size": 500, "m": 4, "seed": 11, "generator": generator}
+
+    status, first = await invoke(new(), request)
+    _, second = await invoke(new(), request)
+
+    assert status == 200
+    assert first["result"] == second["result"]
+    assert all(u < v for u, v in first["result"])
+
+
+@pytest.mark.asyncio
+async def test_cached_graph_grows_to_larger_size():
+    f = new()
+
+    await invoke(f, {"size": 200, "m": 3, "seed": 4})
+    _, grown = await invoke(f, {"size": 700, "m": 3, "seed": 4})
+    _, fresh = await invoke(new(), {"size": 700, "m": 3, "seed": 4})
+
+    assert grown["measurement"]["graph_cache"] == "grown"
+    assert grown["result"] == fresh["result"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("generator", ["barabasi", "erdos_renyi"])
+async def test_boruvka_matches_igraph_weighted_tree(generator):
+    f = new()
+    request = {"size": 2000, "m": 3, "seed": 3, "generator": generator, "weights": "random"}
+
+    status, boruvka = await invoke(f, {**request, "engine": "boruvka", "workers": 2})
+    _, prim = await invoke(f, {**request, "engine": "igraph"})
+
+    assert status == 200
+    assert boruvka["measurement"]["rounds"] > 1
+    assert boruvka["measurement"]["total_weight"] == pytest.approx(prim["measurement"]["total_weight"])
+    assert sorted(map(sorted, boruvka["result"])) == sorted(map(sorted, prim["result"]))
+
+
+@pytest.mark.asyncio
+async def test_sorted_lightest_edge_search_matches_igraph(monkeypatch):
+    # Small chunks, so four workers each sort a share of every round's edges
+    monkeypatch.setattr(mst, "MIN_EDGES_CHUNK", 256)
+    f = new()
+    request = {"size": 2000, "m": 3, "seed": 4, "weights": "random"}
+
+    status, boruvka = await invoke(f, {**request, "engine": "boruvka", "workers": 4})
+    _, prim = await invoke(f, {**request, "engine": "igraph"})
+
+    assert status == 200
+    assert sorted(map(sorted, boruvka["result"])) == sorted(map(sorted, prim["result"]))
+
+
+@pytest.mark.asyncio
+async def test_supplied_weights_must_cover_every_edge():
+    status, body = await invoke(new(), {"size": 50, "m": 2, "seed": 1, "weights": [1.0, 2.0]})
+    assert status == 400 and "weights" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_approximate_weight_is_close_to_exact_forest():
+    f = new()
+    request = {"size": 5000, "m": 3, "seed": 5, "generator": "preferential_attachment"}
+
+    _, exact = await invoke(f, {**request, "weights": "random"})
+    status, estimate = await invoke(f, {**request, "approximate": True, "epsilon": 0.1, "samples": 3000})
+
+    assert status == 200
+    assert estimate["measurement"]["samples"] == 3000
+    assert estimate["result"]["estimated_weight"] == pytest.approx(exact["measurement"]["total_weight"], rel=0.15)
+    assert estimate["result"]["estimated_components"] == pytest.approx(1, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_approximate_rejects_supplied_weights():
+    status, body = await invoke(new(), {"size": 50, "m": 2, "seed": 1, "approximate": True, "weights": [1.0]})
+    assert status == 400 and "random" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_result_modes_summarize_the_forest():
+    f = new()
+    request = {"size": 1000, "m": 2, "seed": 2}
+
+    status, full = await invoke(f, request)
+    _, topk = await invoke(f, {**request, "result_mode": "topk", "k": 3})
+    _, histogram = await invoke(f, {**request, "result_mode": "histogram"})
+    _, digest = await invoke(f, {**request, "result_mode": "digest"})
+    _, boruvka = await invoke(f, {**request, "result_mode": "digest", "engine": "boruvka"})
+
+    assert status == 200
+    degrees = [0] * 1000
+    for u, v in full["result"]:
+        degrees[u] += 1
+        degrees[v] += 1
+    assert [entry["degree"] for entry in topk["result"]["hubs"]] == sorted(degrees, reverse=True)[:3]
+    assert sum(histogram["result"]["degrees"]) == 1000
+    assert digest["result"]["edges"] == len(full["result"]) == 999
+    assert digest["result"]["components"] == 1
+    assert boruvka["result"]["edges"] == 999
+    assert "serialization_time" in digest["measurement"]
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_memory_are_refused():
+    f = new()
+    f.admission = AdmissionGuard(limit=256 << 20)
+    status, body = await invoke(f, {"size": 10 ** 8, "m": 10})
+    assert status == 413 and body["estimated_bytes"] > body["memory_limit"]
+
+
+@pytest.mark.asyncio
+async def test_weighted_forest_of_an_edge_list_object(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    bucket = tmp_path / "minio" / "datasets"
+    bucket.mkdir(parents=True)
+    # A triangle plus a separate edge; the weight column is ignored by the parser
+    (bucket / "graph.txt").write_text("0 1 1.0\n1 2 1.0\n0 2 1.0\n3 4 1.0\n")
+    f = new()
+    f.edge_lists = EdgeListStore(client)
+    request = {"input-bucket": "datasets", "objectKey": "graph.txt"}
+
+    status, forest = await invoke(f, {**request, "result_mode": "digest"})
+    _, weighted = await invoke(f, {**request, "weights": [5.0, 1.0, 2.0, 3.0]})
+
+    assert status == 200
+    assert forest["result"]["edges"] == 3 and forest["result"]["components"] == 2
+    assert forest["measurement"]["edges_read"] == 4
+    assert weighted["measurement"]["graph_cache"] == "hit"
+    assert weighted["measurement"]["total_weight"] == pytest.approx(6.0)
+
+
+@pytest.mark.asyncio
+async def test_sparse_vertex_ids_are_isolated_vertices(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    bucket = tmp_path / "minio" / "datasets"
+    bucket.mkdir(parents=True)
+    # Two paths at far apart ids; the 200000 ids between them have no edges
+    (bucket / "sparse.txt").write_text("0 1\n1 2\n200000 200001\n200001 200002\n")
+    f = new()
+    f.edge_lists = EdgeListStore(client)
+
+    status, body = await invoke(f, {"input-bucket": "datasets", "objectKey": "sparse.txt", "result_mode": "full"})
+
+    assert status == 200
+    assert body["result"] == [[0, 1], [1, 2], [200000, 200001], [200001, 200002]]
+    # A search per isolated vertex took seconds here
+    assert body["measurement"]["compute_time"] < 2e6
@@ -0,0 +1,188 @@
+import math
+import zlib
+
+import numpy as np
+
+from .csr import MSBFS_WIDTH, multi_source_bfs
+
+DEFAULT_EPSILON = 0.05
+DEFAULT_DELTA = 0.05
+# Share of reachable pairs within the effective diameter
+EFFECTIVE_DIAMETER_QUANTILE = 0.9
+
+
+def sample_size(epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA):
+    """Samples for a mean of [0, 1]-bounded values to be within ``epsilon`` with probability 1 - ``delta``.
+
+    This is Hoeffding's bound, which also bounds a sampled CDF at each
+    point.
+    """
+    return math.ceil(math.log(2 / delta) / (2 * epsilon ** 2))
+
+
+def sampling_parameters(event):
+    """(epsilon, delta, samples) from a request; an explicit "samples" overrides the bound."""
+    epsilon = event.get("epsilon", DEFAULT_EPSILON)
+    delta = event.get("delta", DEFAULT_DELTA)
+    samples = event.get("samples")
+    if not isinstance(epsilon, (int, float)) or not 0 < epsilon < 1:
+        raise ValueError("Invalid 'epsilon', expected a number in (0, 1)")
+    if not isinstance(delta, (int, float)) or not 0 < delta < 1:
+        raise ValueError("Invalid 'delta', expected a number in (0, 1)")
+    if samples is not None and (not isinstance(samples, int) or samples <= 0):
+        raise ValueError("Invalid 'samples', expected a positive integer")
+    return epsilon, delta, samples or sample_size(epsilon, delta)
+
+
+def seed_bits(seed):
+    """A 64-bit hash key from any JSON seed; None draws a fresh one."""
+    if seed is None:
+        return int(np.random.default_rng().integers(1 << 63))
+    if isinstance(seed, int):
+        return seed & 0xFFFFFFFFFFFFFFFF
+    return zlib.crc32(str(seed).encode())
+
+
+def edge_weights(sources, targets, seed=None):
+    """Uniform [0, 1) weights hashed from each edge's endpoints.
+
+    Both directions of an undirected edge get the same weight, and a
+    weight can be computed from one adjacency row alone, so samplers can
+    look weights up locally without materializing them for the whole graph.
+    """
+    lo = np.minimum(sources, targets).astype(np.uint64)
+    hi = np.maximum(sources, targets).astype(np.uint64)
+    # splitmix64 finalizer over the (lo, hi, seed) key; uint64 arithmetic wraps
+    x = lo * np.uint64(0x9E3779B97F4A7C15) + hi + np.uint64(seed_bits(seed))
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return (x >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def monte_carlo_pagerank(csr, walks, damping=0.85, seed=None):
+    """PageRank estimated from ``walks`` random walks started at uniform vertices.
+
+    A walk stops with probability 1 - ``damping`` at each step and jumps
+    to a uniform vertex from a dangling one, so the expected visits to a
+    vertex times 1 - ``damping`` is its PageRank. All walks advance
+    together, one vectorized step at a time. Where a walk ends is itself
+    distributed by PageRank, so ``sample_size`` walks bound the error of
+    any vertex set's rank mass by Hoeffding; counting every visit instead
+    of only the ends lowers the variance further. Returns (ranks,
+    standard errors, total steps); the standard errors treat visit counts
+    as Poisson.
+    """
+    rng = np.random.default_rng(seed)
+    n = csr.num_vertices
+    degrees = csr.degrees()
+    position = rng.integers(0, n, walks)
+    visited = []
+    while position.size:
+        visited.append(position)
+        position = position[rng.random(position.size) < damping]
+        degree = degrees[position]
+        pick = (rng.random(position.size) * degree).astype(np.int64)
+        step = csr.offsets[position].astype(np.int64) + pick
+        nonempty = degree > 0
+        position = np.where(
+            nonempty,
+            csr.neighbors[np.where(nonempty, step, 0)] if csr.num_entries else 0,
+            rng.integers(0, n, position.size),
+        )
+    visits = np.bincount(np.concatenate(visited), minlength=n)
+    scale = (1 - damping) / walks
+    return visits * scale, np.sqrt(visits) * scale, int(visits.sum())
+
+
+def sampled_distances(csr, samples, seed=None):
+    """Distance distribution estimated by BFS from ``samples`` uniform sources.
+
+    Sources run ``MSBFS_WIDTH`` to a pass through the bit-parallel BFS.
+    The histogram is the share of reachable (source, target) pairs at each
+    distance.
+    """
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(csr.num_vertices, min(samples, csr.num_vertices), replace=False)
+    totals = np.zeros(0, dtype=np.int64)
+    for begin in range(0, len(sources), MSBFS_WIDTH):
+        counts, _ = multi_source_bfs(csr, sources[begin:begin + MSBFS_WIDTH])
+        per_level = counts.sum(axis=1)
+        if len(per_level) > len(totals):
+            totals = np.pad(totals, (0, len(per_level) - len(totals)))
+        totals[:len(per_level)] += per_level
+    # Level 0 is the sources themselves
+    pairs = totals[1:]
+    reachable = int(pairs.sum())
+    histogram = pairs / reachable if reachable else pairs.astype(np.float64)
+    cdf = np.cumsum(histogram)
+    return {
+        "sources": len(sources),
+        "histogram": histogram.tolist(),
+        "mean_distance": float((histogram * np.arange(1, len(histogram) + 1)).sum()),
+        "effective_diameter": int(np.searchsorted(cdf, EFFECTIVE_DIAMETER_QUANTILE) + 1) if reachable else 0,
+        "max_distance_seen": len(histogram),
+        "reachable_fraction": reachable / (len(sources) * max(csr.num_vertices - 1, 1)),
+    }
+
+
+def rounded_rows(csr, epsilon, seed):
+    """Memoized (neighbors, weights rounded up to multiples of ``epsilon``) per row."""
+    rows = {}
+    # Fix the key once, so an unseeded run still weighs every row alike
+    seed = seed_bits(seed)
+
+    def row(v):
+        if v not in rows:
+            neighbors = np.asarray(csr.neighbors[csr.offsets[v]:csr.offsets[v + 1]])
+            rounded = np.ceil(edge_weights(np.full(len(neighbors), v), neighbors, seed) / epsilon)
+            rows[v] = (neighbors, rounded)
+        return rows[v]
+
+    return row
+
+
+def component_size(row, root, level, cap):
+    """Vertices reachable from ``root`` over edges of rounded weight <= ``level``, or 0 past ``cap``."""
+    seen = {root}
+    stack = [root]
+    while stack:
+        neighbors, rounded = row(stack.pop())
+        for u in neighbors[rounded <= level].tolist():
+            if u not in seen:
+                seen.add(u)
+                stack.append(u)
+                if len(seen) > cap:
+                    return 0
+    return len(seen)
+
+
+def estimate_msf_weight(csr, epsilon=DEFAULT_EPSILON, samples=None, seed=None, weight_seed=None):
+    """Minimum spanning forest weight under ``edge_weights``, estimated by sampling.
+
+    This is the Chazelle–Rubinfeld–Trevisan estimator. Weights rounded up
+    to multiples of ``epsilon`` give a forest of weight
+    ``epsilon * (n - L c_L + sum_{i<L} c_i)``, where ``c_i`` counts the
+    components of the subgraph of edges at most ``i * epsilon``. Each
+    ``c_i`` is estimated as ``n`` times the mean of ``1 / |component|``
+    over sampled vertices, exploring at most ``1 / epsilon`` vertices per
+    sample, so the cost does not grow with the graph. Half an ``epsilon``
+    per forest edge is taken back to undo the rounding on average.
+    Returns (estimated weight, estimated components).
+    """
+    rng = np.random.default_rng(seed)
+    n = csr.num_vertices
+    levels = math.ceil(1 / epsilon)
+    cap = levels
+    samples = samples or sample_size(epsilon)
+    roots = rng.integers(0, n, samples).tolist()
+    row = rounded_rows(csr, epsilon, weight_seed)
+    components = []
+    for level in range(1, levels + 1):
+        sizes = np.array([component_size(row, root, level, cap) for root in roots])
+        components.append(n * np.divide(1.0, sizes, out=np.zeros(len(sizes)), where=sizes > 0).mean())
+    total = components[-1]
+    rounded = n - levels * total + sum(components[:-1])
+    return epsilon * rounded - epsilon / 2 * (n - total), total
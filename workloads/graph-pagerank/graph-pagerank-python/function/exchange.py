@@ -0,0 +1,69 @@
+import io
+import os
+
+from minio.error import S3Error
+
+
+class MinioExchange:
+    """Small objects passed between function instances through a MinIO bucket."""
+
+    def __init__(self, client, bucket_name):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.bucket_ready = False
+
+    def put(self, name, data):
+        if not self.bucket_ready:
+            if not self.client.bucket_exists(self.bucket_name):
+                self.client.make_bucket(self.bucket_name)
+            self.bucket_ready = True
+        self.client.put_object(self.bucket_name, name, io.BytesIO(data), len(data))
+
+    def get(self, name):
+        """The object's bytes, or None while it has not been written."""
+        try:
+            response = self.client.get_object(self.bucket_name, name)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchBucket"):
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def delete(self, name):
+        self.client.remove_object(self.bucket_name, name)
+
+
+class LocalExchange:
+    """Stand-in for MinioExchange over a directory, e.g. a volume shared by the pods."""
+
+    def __init__(self, local_dir):
+        self.local_dir = local_dir
+
+    def path(self, name):
+        return os.path.join(self.local_dir, *name.split("/"))
+
+    def put(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers poll for the name, so it must only appear once complete
+        partial = f"{path}.{os.getpid()}.part"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def get(self, name):
+        try:
+            with open(self.path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
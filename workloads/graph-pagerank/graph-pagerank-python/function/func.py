@@ -1,14 +1,93 @@
 import datetime
 import json
-import igraph
 import logging
+import time
+import numpy as np
+from minio import Minio
+from .approximate import monte_carlo_pagerank, sampling_parameters
+from .cache import GraphCache, default_cache_bytes
+from .csr import CSRGraph, pagerank
+from .edgelist import EdgeListStore, input_parameters
+from .exchange import LocalExchange, MinioExchange
+from .footprint import AdmissionError, AdmissionGuard
+from .graphs import (
+    DEFAULT_GENERATOR, DEFAULT_M, generator_names, get_graph, get_snapshot, graph_key, resident_bytes
+)
+from .partition import partitioned_pagerank
+from .results import checksum, encode_response, log_histogram, result_parameters, summary, top_k
+from .snapshots import SnapshotStore
+from .teleport import parse_personalization
+
+DEFAULT_SNAPSHOT_BUCKET = "graph-snapshots"
+DEFAULT_SNAPSHOT_DIR = "/tmp/graph-snapshots"
+DEFAULT_EXCHANGE_BUCKET = "graph-exchange"
+# Any of these, or a "personalization", selects the power-iteration engine,
+# which igraph graphs are converted for
+POWER_DEFAULTS = {"damping": 0.85, "tol": 1e-10, "max_iter": 1000, "dtype": "float64"}
+DTYPES = ("float64", "float32")
+
+
+def power_parameters(event):
+    """Validated power-iteration settings, defaulted from POWER_DEFAULTS."""
+    params = {name: event.get(name, default) for name, default in POWER_DEFAULTS.items()}
+    if not isinstance(params["damping"], (int, float)) or not 0 < params["damping"] < 1:
+        raise ValueError("Invalid 'damping' parameter, expected a number in (0, 1)")
+    if not isinstance(params["tol"], (int, float)) or params["tol"] <= 0:
+        raise ValueError("Invalid 'tol' parameter, expected a positive number")
+    if not isinstance(params["max_iter"], int) or params["max_iter"] <= 0:
+        raise ValueError("Invalid 'max_iter' parameter, expected a positive integer")
+    if params["dtype"] not in DTYPES:
+        raise ValueError(f"Invalid 'dtype' parameter, expected one of {list(DTYPES)}")
+    return params
+
+
+def partition_parameters(event):
+    """(job, partition, partitions) of a partitioned request.
+
+    Partitions split the compute, not the memory cap: every instance still
+    needs memory in O(n + m), see ``partitioned_pagerank``.
+    """
+    partitions = event.get("partitions")
+    partition = event.get("partition")
+    job = event.get("job")
+    if not isinstance(partitions, int) or partitions <= 0:
+        raise ValueError("Invalid 'partitions' parameter, expected a positive integer")
+    if not isinstance(partition, int) or not 0 <= partition < partitions:
+        raise ValueError("Invalid 'partition' parameter, expected an index below 'partitions'")
+    if not isinstance(job, str) or not job or "/" in job:
+        raise ValueError("Invalid 'job' parameter, expected a name shared by the job's partitions")
+    if "seed" not in event:
+        raise ValueError("'partitions' requires a 'seed' parameter")
+    return job, partition, partitions
+
+def shape_result(mode, k, ranks):
+    """Ranks in the requested mode; a (n, k) batch gives one entry per vector."""
+    ranks = np.asarray(ranks)
+    if ranks.ndim == 2:
+        return [shape_result(mode, k, column) for column in ranks.T]
+    if mode == "full":
+        return ranks.tolist()
+    if mode == "topk":
+        return top_k(ranks, k, "rank")
+    if mode == "histogram":
+        return log_histogram(ranks)
+    return {"checksum": checksum(ranks), **summary(ranks)}
+
 
 def new():
     return Function()
 
 class Function:
     def __init__(self):
-        pass
+        self.graphs = GraphCache()
+        # Last solution per seeded graph and vector count, to warm-start the next request
+        self.solutions = GraphCache(default_cache_bytes() // 4)
+        # Refuses requests that would not fit in the pod's memory
+        self.admission = AdmissionGuard()
+        # Set up in start(), once the MinIO endpoint is known
+        self.snapshots = None
+        self.exchange = None
+        self.edge_lists = None
 
     async def handle(self, scope, receive, send):
         logging.info("OK: Request Received")
@@ -23,20 +102,132 @@ class Function:
 
         try:
             event = json.loads(body.decode())
+            # A graph read from an edge-list object replaces the generator parameters
+            object_input = input_parameters(event)
+            if object_input is not None:
+                if self.edge_lists is None:
+                    raise ValueError("Object input is not configured")
+                if "personalization" in event or "partitions" in event:
+                    raise ValueError("Object input does not support 'personalization' or 'partitions'")
             size = event.get('size')
-            if not isinstance(size, int):
+            if object_input is None and not isinstance(size, int):
                 raise ValueError("Missing or invalid 'size' parameter")
+            m = event.get('m', DEFAULT_M)
+            if not isinstance(m, int) or m <= 0:
+                raise ValueError("Invalid 'm' parameter")
+            generator = event.get("generator", DEFAULT_GENERATOR)
+            if generator not in generator_names():
+                raise ValueError(f"Unknown 'generator' parameter, expected one of {generator_names()}")
+            params = power_parameters(event)
+            personalization, batched = None, False
+            if "personalization" in event:
+                personalization, batched = parse_personalization(event["personalization"], size)
+            use_power = personalization is not None or any(name in event for name in POWER_DEFAULTS)
+            approximate = event.get("approximate", False)
+            if approximate:
+                if personalization is not None:
+                    raise ValueError("'approximate' does not support 'personalization'")
+                _, _, walks = sampling_parameters(event)
+            # Without a result_mode the response keeps the rank of vertex 0 only
+            result_mode, k = result_parameters(event)
+            partitioned = "partitions" in event
+            if partitioned:
+                job, partition, partitions = partition_parameters(event)
+                if personalization is not None or approximate:
+                    raise ValueError("'partitions' does not support 'personalization' or 'approximate'")
+                if result_mode is not None:
+                    raise ValueError("'partitions' does not support 'result_mode'")
+                if self.exchange is None:
+                    raise ValueError("The rank exchange is not configured")
+            use_snapshot = event.get("snapshot", False)
+            if use_snapshot and "seed" not in event:
+                raise ValueError("'snapshot' requires a 'seed' parameter")
+            if use_snapshot and self.snapshots is None:
+                raise ValueError("Snapshots are not configured")
 
-            if "seed" in event:
-                import random
-                random.seed(event["seed"])
+            # Object sizes are only known once parsed, so only generated graphs are checked.
+            # A graph this pod already holds is not charged again, and cached graphs and
+            # solutions can make room.
+            estimated_bytes = parse_stats = snapshot_source = None
+            if object_input is None:
+                seed = event.get("seed")
+                store = self.snapshots if use_snapshot else None
+                estimated_bytes = self.admission.check(
+                    ["pagerank"], generator, size, m,
+                    resident=resident_bytes(self.graphs, size, m, seed, generator, store),
+                    caches=[self.solutions, self.graphs],
+                    keep=graph_key(size, m, seed, generator, use_snapshot),
+                )
 
+            # Snapshots are memory-mapped CSR files, generated once and shared through MinIO
             graph_generating_begin = datetime.datetime.now()
-            graph = igraph.Graph.Barabasi(size, 10)
+            edge_list_key = None
+            if object_input is not None:
+                edge_list_key = self.edge_lists.key(*object_input, directed=event.get("directed", False))
+                graph, cache_status, parse_stats = self.edge_lists.open(
+                    self.graphs, *object_input, directed=event.get("directed", False), key=edge_list_key
+                )
+            elif use_snapshot:
+                graph, cache_status, snapshot_source = get_snapshot(
+                    self.graphs, self.snapshots, size, m, event["seed"], generator
+                )
+            else:
+                graph, cache_status = get_graph(self.graphs, size, m, event.get("seed"), generator)
+            if (use_power or approximate or partitioned) and not isinstance(graph, CSRGraph):
+                graph = CSRGraph.from_igraph(graph)
             graph_generating_end = datetime.datetime.now()
 
             process_begin = datetime.datetime.now()
-            result = graph.pagerank()
+            convergence = {}
+            if partitioned:
+                # This instance computes one vertex range; peers run the others concurrently
+                run = await partitioned_pagerank(
+                    graph, self.exchange, job, partition, partitions,
+                    params["damping"], params["tol"], params["max_iter"], params["dtype"]
+                )
+                lo, hi = run["vertices"]
+                # The range's ranks are left for whoever assembles the vector
+                self.exchange.put(f"{job}/ranks/{partition}", run["ranks"].tobytes())
+                result = {"vertices": [lo, hi], "rank_mass": float(run["ranks"].sum())}
+                times = run["iteration_times"]
+                convergence = {
+                    "iterations": run["iterations"],
+                    "residual": run["residual"],
+                    "converged": run["residual"] < params["tol"],
+                    "partitions": partitions,
+                    "iteration_times": times,
+                    "mean_iteration_time": sum(times) / len(times) if times else 0.0,
+                    "bytes_sent": run["bytes_sent"],
+                    "bytes_received": run["bytes_received"],
+                }
+            elif approximate:
+                # Random walks in place of power iteration; the error shrinks as 1/sqrt(walks)
+                result, stderr, steps = monte_carlo_pagerank(graph, walks, params["damping"], event.get("seed"))
+                convergence = {"walks": walks, "stderr": float(stderr[0]), "steps": steps}
+            elif isinstance(graph, CSRGraph):
+                # A previous solution on the same graph is a close start for a similar teleport
+                # Objects are told apart by their ETag, not by a seed
+                solution_key = None
+                if event.get("warm_start", True):
+                    vectors = 1 if personalization is None else personalization.size // size
+                    if edge_list_key is not None:
+                        solution_key = (edge_list_key, vectors)
+                    elif "seed" in event:
+                        solution_key = (generator, size, m, event["seed"], use_snapshot, vectors)
+                start = self.solutions.get(solution_key) if solution_key else None
+                result, iterations, residual = pagerank(
+                    graph, personalization=personalization, start=start, **params
+                )
+                if solution_key:
+                    self.solutions.put(solution_key, result)
+                convergence = {
+                    "iterations": iterations,
+                    "residual": residual,
+                    "converged": residual < params["tol"],
+                    "warm_start": start is not None,
+                }
+            else:
+                result = graph.pagerank()
             process_end = datetime.datetime.now()
 
             graph_generating_time = (
@@ -47,16 +238,28 @@ class Function:
                 process_end - process_begin
             ) / datetime.timedelta(microseconds=1)
 
-            response_body = json.dumps({
-                "result": result[0],
-                "measurement": {
-                    "graph_generating_time": graph_generating_time,
-                    "compute_time": process_time,
-                }
-            }).encode()
+            shape_begin = time.perf_counter()
+            if result_mode is not None:
+                result = shape_result(result_mode, k, result)
+            elif not partitioned:
+                result = result[0].tolist() if batched else float(result[0])
+            response_body = encode_response(result, {
+                "graph_generating_time": graph_generating_time,
+                "compute_time": process_time,
+                "graph_cache": cache_status,
+                "graph_cache_bytes": self.graphs.bytes,
+                "snapshot_source": snapshot_source,
+                "estimated_peak_bytes": estimated_bytes,
+                **(parse_stats or {}),
+                **convergence,
+            }, shape_begin)
 
             status = 200
 
+        except AdmissionError as e:
+            response_body = json.dumps(e.body).encode()
+            status = e.status
+
         except Exception as e:
             logging.exception("Error processing request")
             response_body = json.dumps({"error": str(e)}).encode()
@@ -76,6 +279,27 @@ class Function:
 
     def start(self, cfg):
         logging.info("Function starting")
+        if cfg.get("GRAPH_CACHE_BYTES"):
+            self.graphs = GraphCache(int(cfg["GRAPH_CACHE_BYTES"]))
+        if cfg.get("MEMORY_LIMIT_BYTES"):
+            self.admission = AdmissionGuard(limit=int(cfg["MEMORY_LIMIT_BYTES"]))
+        client = Minio(
+            cfg.get("MINIO_ENDPOINT", "minio:9000"),
+            access_key=cfg.get("MINIO_ACCESS_KEY", "minioadmin"),
+            secret_key=cfg.get("MINIO_SECRET_KEY", "minioadmin"),
+            secure=False,
+        )
+        self.snapshots = SnapshotStore(
+            client,
+            cfg.get("SNAPSHOT_BUCKET", DEFAULT_SNAPSHOT_BUCKET),
+            cfg.get("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR),
+        )
+        self.edge_lists = EdgeListStore(client)
+        # Partitions exchange ranks through MinIO, or through a shared directory when one is set
+        if cfg.get("EXCHANGE_DIR"):
+            self.exchange = LocalExchange(cfg["EXCHANGE_DIR"])
+        else:
+            self.exchange = MinioExchange(client, cfg.get("EXCHANGE_BUCKET", DEFAULT_EXCHANGE_BUCKET))
 
     def stop(self):
         logging.info("Function stopping")
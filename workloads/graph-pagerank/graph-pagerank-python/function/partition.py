@@ -0,0 +1,146 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from .csr import PAGERANK_CHUNK
+
+# How often, and for how long, a partition polls for its peers' objects
+EXCHANGE_POLL = 0.01
+EXCHANGE_TIMEOUT = 300
+
+
+def partition_bounds(csr, partitions):
+    """Vertex range boundaries splitting the adjacency entries evenly, not the vertices.
+
+    Hubs make equal vertex ranges very unequal in work. Every instance
+    computes the same boundaries from the same graph.
+    """
+    targets = np.linspace(0, csr.num_entries, partitions + 1)
+    bounds = np.searchsorted(csr.offsets, targets, side="left").astype(np.int64)
+    bounds[0], bounds[-1] = 0, csr.num_vertices
+    return np.maximum.accumulate(bounds)
+
+
+def push(csr, lo, hi, share):
+    """Rank pushed along the out-edges of rows [lo, hi), as a dense vector over all vertices.
+
+    Each chunk's bincount is another dense vector, so a round needs two of
+    n float64 values at once, whatever the range.
+    """
+    pushed = np.zeros(csr.num_vertices, dtype=np.float64)
+    offsets = csr.offsets[lo:hi + 1].astype(np.int64)
+    for first in range(int(offsets[0]), int(offsets[-1]), PAGERANK_CHUNK):
+        last = min(first + PAGERANK_CHUNK, int(offsets[-1]))
+        rows = np.searchsorted(offsets, np.arange(first, last), side="right") - 1
+        pushed += np.bincount(csr.neighbors[first:last], weights=share[rows], minlength=csr.num_vertices)
+    return pushed
+
+
+async def wait_for(exchange, name, timeout=None):
+    """Poll the exchange until ``name`` appears; raises TimeoutError if a peer never writes it."""
+    timeout = EXCHANGE_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        data = exchange.get(name)
+        if data is not None:
+            return data
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"No exchange object '{name}' after {timeout} s")
+        await asyncio.sleep(EXCHANGE_POLL)
+
+
+async def partitioned_pagerank(csr, exchange, job, partition, partitions,
+                               damping=0.85, tol=1e-10, max_iter=1000, dtype=np.float64):
+    """PageRank for one vertex range of a graph split across ``partitions`` instances.
+
+    Every round each instance pushes rank along its out-edges, writes the
+    part bound for each peer's range to ``exchange`` under ``job``, and
+    adds up the parts addressed to it. A small meta object per round and
+    peer carries the partition's dangling mass and its share of the L1
+    residual, so all instances reach the same stopping decision. Every
+    exchange object has a single reader, which deletes it once read, so a
+    finished job leaves only its "ranks" objects and its name can be used
+    again. A job that fails part way can leave objects behind, and the
+    next run under its name should use a fresh one.
+
+    Partitioning spreads the work, not the memory: each instance still
+    holds O(n + m). Without a snapshot every instance generates the whole
+    graph. With a memory-mapped one it only pages in the CSR rows of its
+    own range, but the whole file is downloaded to local disk, and the
+    push accumulates into dense float64 vectors over all n vertices.
+
+    The iteration matches ``csr.pagerank`` with uniform teleports. Returns
+    a dict with the range's ranks, its bounds, iterations, residual,
+    per-iteration times in microseconds and the bytes sent and received.
+    """
+    n = csr.num_vertices
+    dtype = np.dtype(dtype)
+    bounds = partition_bounds(csr, partitions)
+    lo, hi = int(bounds[partition]), int(bounds[partition + 1])
+    peers = [q for q in range(partitions) if q != partition]
+    degrees = np.diff(csr.offsets[lo:hi + 1]).astype(dtype)
+    dangling = degrees == 0
+    ranks = np.full(hi - lo, 1.0 / n, dtype=dtype)
+    residual = float("inf")
+    iterations = 0
+    times = []
+    sent = received = 0
+
+    def name(round_, kind, source, target=None):
+        suffix = f"{source}-{target}" if target is not None else f"{source}"
+        return f"{job}/{round_}/{kind}/{suffix}"
+
+    while True:
+        begin = time.perf_counter()
+        share = np.divide(ranks, degrees, out=np.zeros(hi - lo, dtype=dtype), where=~dangling)
+        pushed = push(csr, lo, hi, share)
+        meta = {"vertices": n, "entries": csr.num_entries, "dangling": float(ranks[dangling].sum()), "residual": residual}
+        data = json.dumps(meta).encode()
+        for q in peers:
+            exchange.put(name(iterations, "meta", partition, q), data)
+            sent += len(data)
+        for q in peers:
+            data = pushed[bounds[q]:bounds[q + 1]].astype(dtype).tobytes()
+            exchange.put(name(iterations, "rank", partition, q), data)
+            sent += len(data)
+
+        metas = [meta]
+        for q in peers:
+            data = await wait_for(exchange, name(iterations, "meta", q, partition))
+            exchange.delete(name(iterations, "meta", q, partition))
+            received += len(data)
+            metas.append(json.loads(data))
+        if any((m["vertices"], m["entries"]) != (n, csr.num_entries) for m in metas):
+            raise ValueError("Partitions of the same 'job' were given different graphs")
+
+        # Residuals in this round's metas are those of the last update
+        total = sum(m["residual"] for m in metas)
+        if total < tol or iterations >= max_iter:
+            # Every peer stops on the same metas, so nobody reads this round's rank parts
+            for q in peers:
+                exchange.delete(name(iterations, "rank", partition, q))
+            break
+
+        incoming = pushed[lo:hi]
+        for q in peers:
+            data = await wait_for(exchange, name(iterations, "rank", q, partition))
+            exchange.delete(name(iterations, "rank", q, partition))
+            received += len(data)
+            incoming += np.frombuffer(data, dtype=dtype)
+        updated = (damping * (incoming + sum(m["dangling"] for m in metas) / n) + (1 - damping) / n).astype(dtype)
+        residual = float(np.abs(updated - ranks).sum())
+        ranks = updated
+        iterations += 1
+        times.append((time.perf_counter() - begin) * 1e6)
+
+    return {
+        "ranks": ranks,
+        "vertices": [lo, hi],
+        "iterations": iterations,
+        "residual": total,
+        "iteration_times": times,
+        "bytes_sent": sent,
+        "bytes_received": received,
+    }
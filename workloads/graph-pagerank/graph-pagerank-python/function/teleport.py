@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def teleport_vector(spec, size):
+    """One teleport distribution from a seed node set or a {vertex: weight} mapping."""
+    vector = np.zeros(size)
+    if isinstance(spec, dict):
+        for vertex, weight in spec.items():
+            # JSON object keys are strings
+            if not str(vertex).isdigit() or not int(vertex) < size:
+                raise ValueError(f"Invalid personalization vertex {vertex!r}")
+            if not isinstance(weight, (int, float)) or weight < 0:
+                raise ValueError(f"Invalid personalization weight for vertex {vertex}")
+            vector[int(vertex)] = weight
+    elif isinstance(spec, list) and spec and all(isinstance(v, int) for v in spec):
+        if any(not 0 <= v < size for v in spec):
+            raise ValueError("Personalization seed nodes must be vertex ids")
+        vector[spec] = 1.0
+    else:
+        raise ValueError("A personalization is a list of seed nodes or a {vertex: weight} object")
+    if vector.sum() <= 0:
+        raise ValueError("A personalization needs some positive weight")
+    return vector
+
+
+def parse_personalization(spec, size):
+    """(teleport matrix, batched) for the request's "personalization".
+
+    A seed node list or a {vertex: weight} object is one vector of shape
+    (size,); a list of those is a batch of shape (size, k), iterated
+    together.
+    """
+    if isinstance(spec, list) and spec and all(isinstance(item, (list, dict)) for item in spec):
+        return np.column_stack([teleport_vector(item, size) for item in spec]), True
+    return teleport_vector(spec, size), False
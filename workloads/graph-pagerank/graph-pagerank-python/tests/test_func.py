@@ -2,8 +2,20 @@
 An example set of unit tests which confirm that the main handler (the
 callable function) returns 200 OK for a simple HTTP GET.
 """
+import asyncio
+import json
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
 import pytest
-from function import new
+from minio.error import S3Error
+from function import new, partition
+from function.cache import GraphCache
+from function.edgelist import EdgeListStore
+from function.footprint import AdmissionGuard
+from function.exchange import LocalExchange
+from function.snapshots import SnapshotStore
 
 
 @pytest.mark.asyncio
@@ -36,3 +48,347 @@ async def test_function_handle():
     assert sent_ok, "Function did not send a 200 OK"
     assert sent_headers, "Function did not send headers"
     assert sent_body, "Function did not send a body"
+
+
+async def invoke(f, payload):
+    """Run one POST through the handler and return (status, decoded JSON body)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await f.handle({"method": "POST"}, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.mark.asyncio
+async def test_seeded_graph_is_cached():
+    f = new()
+
+    _, first = await invoke(f, {"size": 300, "seed": 7})
+    _, second = await invoke(f, {"size": 300, "seed": 7})
+    _, unseeded = await invoke(f, {"size": 300})
+
+    assert first["measurement"]["graph_cache"] == "miss"
+    assert second["measurement"]["graph_cache"] == "hit"
+    assert unseeded["measurement"]["graph_cache"] == "bypass"
+    assert second["result"] == first["result"]
+
+
+def test_graph_cache_evicts_least_recently_used_bytes():
+    cache = GraphCache(100, sizeof=len)
+    cache.put("a", b"x" * 40)
+    cache.put("b", b"x" * 40)
+    assert cache.get("a") is not None
+    cache.put("c", b"x" * 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes == 80 and cache.evictions == 1
+    cache.put("huge", b"x" * 101)
+    assert cache.get("huge") is None and cache.bytes == 80
+
+
+class FakeMinio:
+    """Just enough of the MinIO client for SnapshotStore and EdgeListStore, backed by local files."""
+
+    def __init__(self, root):
+        self.root = root
+        self.buckets = set()
+
+    def bucket_exists(self, bucket):
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket):
+        self.buckets.add(bucket)
+
+    def fput_object(self, bucket, name, path):
+        target = self.root / bucket / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+
+    def fget_object(self, bucket, name, path):
+        source = self.root / bucket / name
+        if not source.exists():
+            raise S3Error(None, "NoSuchKey", "missing", name, "", "")
+        shutil.copyfile(source, path)
+
+    def stat_object(self, bucket, name):
+        source = self.root / bucket / name
+        if not source.exists():
+            raise S3Error(None, "NoSuchKey", "missing", name, "", "")
+        return SimpleNamespace(etag=str(source.stat().st_mtime_ns))
+
+    def get_object(self, bucket, name):
+        self.stat_object(bucket, name)
+        return FakeResponse((self.root / bucket / name).read_bytes())
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self, amt):
+        for begin in range(0, len(self.data), amt):
+            yield self.data[begin:begin + amt]
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_published_once_and_memory_mapped(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    publisher, reader = new(), new()
+    publisher.snapshots = SnapshotStore(client, "graphs", str(tmp_path / "a"))
+    reader.snapshots = SnapshotStore(client, "graphs", str(tmp_path / "b"))
+    request = {"size": 300, "m": 3, "seed": 5, "snapshot": True}
+
+    _, generated = await invoke(publisher, request)
+    _, cached = await invoke(publisher, request)
+    _, downloaded = await invoke(reader, request)
+    _, in_memory = await invoke(new(), {"size": 300, "m": 3, "seed": 5})
+
+    assert generated["measurement"]["snapshot_source"] == "generated"
+    assert cached["measurement"]["graph_cache"] == "hit"
+    assert downloaded["measurement"]["snapshot_source"] == "minio"
+    assert generated["result"] == downloaded["result"]
+    assert generated["result"] == pytest.approx(in_memory["result"], rel=1e-9)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("generator", ["preferential_attachment", "erdos_renyi", "rmat"])
+async def test_numpy_generators_are_seeded(generator):
+    request = {"size": 500, "m": 4, "seed": 11, "generator": generator}
+
+    status, first = await invoke(new(), request)
+    _, second = await invoke(new(), request)
+
+    assert status == 200
+    assert first["result"] == second["result"]
+
+
+@pytest.mark.asyncio
+async def test_cached_graph_grows_to_larger_size():
+    f = new()
+
+    await invoke(f, {"size": 200, "m": 3, "seed": 4})
+    _, grown = await invoke(f, {"size": 700, "m": 3, "seed": 4})
+    _, fresh = await invoke(new(), {"size": 700, "m": 3, "seed": 4})
+
+    assert grown["measurement"]["graph_cache"] == "grown"
+    assert grown["result"] == fresh["result"]
+
+
+@pytest.mark.asyncio
+async def test_power_iteration_reports_convergence():
+    f = new()
+    request = {"size": 1000, "m": 3, "seed": 12}
+
+    _, reference = await invoke(f, request)
+    status, exact = await invoke(f, {**request, "tol": 1e-12})
+    _, single = await invoke(f, {**request, "dtype": "float32", "tol": 1e-6})
+    _, capped = await invoke(f, {**request, "max_iter": 3})
+
+    assert status == 200
+    assert exact["result"] == pytest.approx(reference["result"], rel=1e-9)
+    assert exact["measurement"]["converged"] and exact["measurement"]["residual"] < 1e-12
+    assert single["result"] == pytest.approx(reference["result"], rel=1e-4)
+    assert single["measurement"]["iterations"] < exact["measurement"]["iterations"]
+    assert capped["measurement"]["iterations"] == 3 and not capped["measurement"]["converged"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("param", [{"damping": 1.5}, {"tol": 0}, {"max_iter": 0}, {"dtype": "float16"}])
+async def test_invalid_power_parameters_are_rejected(param):
+    status, body = await invoke(new(), {"size": 100, **param})
+    assert status == 500 and next(iter(param)) in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_personalized_pagerank_warm_starts_from_previous_solution():
+    f = new()
+    request = {"size": 1000, "m": 3, "seed": 12, "generator": "preferential_attachment"}
+
+    status, cold = await invoke(f, {**request, "personalization": [3, 40]})
+    _, warm = await invoke(f, {**request, "personalization": {"3": 1, "40": 1, "41": 1e-6}})
+    _, fresh = await invoke(new(), {**request, "personalization": {"3": 1, "40": 1, "41": 1e-6}})
+
+    assert status == 200
+    assert not cold["measurement"]["warm_start"] and warm["measurement"]["warm_start"]
+    assert warm["measurement"]["iterations"] < fresh["measurement"]["iterations"] / 2
+    assert warm["result"] == pytest.approx(fresh["result"], rel=1e-8)
+
+
+@pytest.mark.asyncio
+async def test_personalization_batch_iterates_vectors_together():
+    f = new()
+    request = {"size": 500, "m": 3, "seed": 1}
+    specs = [[0], {"7": 2, "9": 1}, list(range(500))]
+
+    status, batch = await invoke(f, {**request, "personalization": specs})
+    singles = [(await invoke(new(), {**request, "personalization": spec}))[1] for spec in specs]
+    _, uniform = await invoke(f, request)
+
+    assert status == 200
+    assert batch["result"] == pytest.approx([single["result"] for single in singles], rel=1e-8)
+    # Teleporting to every vertex is plain PageRank
+    assert batch["result"][2] == pytest.approx(uniform["result"], rel=1e-8)
+
+
+@pytest.mark.asyncio
+async def test_monte_carlo_pagerank_is_within_its_error():
+    f = new()
+    request = {"size": 1000, "m": 3, "seed": 12}
+
+    _, exact = await invoke(f, request)
+    status, sampled = await invoke(f, {**request, "approximate": True, "samples": 200000})
+
+    assert status == 200
+    assert sampled["measurement"]["walks"] == 200000
+    assert sampled["measurement"]["steps"] > 200000
+    assert abs(sampled["result"] - exact["result"]) < 4 * sampled["measurement"]["stderr"]
+
+
+@pytest.mark.asyncio
+async def test_approximate_rejects_personalization():
+    status, body = await invoke(new(), {"size": 100, "approximate": True, "personalization": [0]})
+    assert status == 500 and "personalization" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_partitions_exchange_ranks_until_convergence(tmp_path):
+    instances = [new() for _ in range(3)]
+    for f in instances:
+        f.exchange = LocalExchange(str(tmp_path))
+    request = {"size": 1000, "m": 3, "seed": 12, "tol": 1e-12, "partitions": 3, "job": "run-1"}
+
+    runs = await asyncio.gather(*(invoke(f, {**request, "partition": i}) for i, f in enumerate(instances)))
+    _, single = await invoke(new(), {"size": 1000, "m": 3, "seed": 12, "tol": 1e-12})
+
+    assert all(status == 200 for status, _ in runs)
+    bounds = [body["result"]["vertices"] for _, body in runs]
+    assert bounds[0][0] == 0 and bounds[-1][1] == 1000
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+    ranks = np.concatenate([np.frombuffer((tmp_path / "run-1" / "ranks" / str(i)).read_bytes()) for i in range(3)])
+    assert ranks[0] == pytest.approx(single["result"], rel=1e-9)
+    assert ranks.sum() == pytest.approx(1.0)
+    for _, body in runs:
+        measurement = body["measurement"]
+        assert measurement["converged"]
+        assert measurement["iterations"] == single["measurement"]["iterations"]
+        assert len(measurement["iteration_times"]) == measurement["iterations"]
+        assert measurement["bytes_sent"] > 0 and measurement["bytes_received"] > 0
+    # Only the ranks are left behind
+    leftovers = sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*") if p.is_file())
+    assert leftovers == [f"run-1/ranks/{i}" for i in range(3)]
+
+
+@pytest.mark.asyncio
+async def test_partitioned_job_name_can_be_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(partition, "EXCHANGE_TIMEOUT", 5)
+    request = {"size": 500, "m": 3, "tol": 1e-10, "partitions": 2, "job": "nightly"}
+    results = []
+    for seed in (3, 4):
+        instances = [new() for _ in range(2)]
+        for f in instances:
+            f.exchange = LocalExchange(str(tmp_path))
+        runs = await asyncio.gather(*(
+            invoke(f, {**request, "seed": seed, "partition": i}) for i, f in enumerate(instances)
+        ))
+        _, single = await invoke(new(), {"size": 500, "m": 3, "seed": seed, "tol": 1e-10, "result_mode": "full"})
+        assert all(status == 200 for status, _ in runs)
+        ranks = np.concatenate([np.frombuffer((tmp_path / "nightly" / "ranks" / str(i)).read_bytes()) for i in range(2)])
+        results.append((ranks, single["result"]))
+
+    for ranks, single in results:
+        assert ranks == pytest.approx(single, rel=1e-7)
+
+
+@pytest.mark.asyncio
+async def test_partitions_require_a_job():
+    f = new()
+    f.exchange = LocalExchange("/nonexistent")
+    status, body = await invoke(f, {"size": 100, "seed": 1, "partitions": 2, "partition": 0})
+    assert status == 500 and "job" in body["error"]
+
+
+@pytest.mark.asyncio
+async def test_result_modes_replace_the_rank_vector():
+    f = new()
+    request = {"size": 1000, "m": 3, "seed": 12}
+
+    _, first = await invoke(f, request)
+    status, full = await invoke(f, {**request, "result_mode": "full"})
+    _, topk = await invoke(f, {**request, "result_mode": "topk", "k": 4})
+    _, histogram = await invoke(f, {**request, "result_mode": "histogram"})
+    _, digest = await invoke(f, {**request, "result_mode": "digest"})
+    _, batch = await invoke(f, {**request, "result_mode": "topk", "k": 1, "personalization": [[5], [6]]})
+
+    assert status == 200
+    ranks = full["result"]
+    assert len(ranks) == 1000 and ranks[0] == first["result"]
+    expected = sorted(range(1000), key=lambda v: -ranks[v])[:4]
+    assert [entry["vertex"] for entry in topk["result"]] == expected
+    assert sum(histogram["result"]["counts"]) + histogram["result"]["zeros"] == 1000
+    assert digest["result"]["sum"] == pytest.approx(1.0)
+    assert digest["result"]["max"] == topk["result"][0]["rank"]
+    assert [entries[0]["vertex"] for entries in batch["result"]] == [5, 6]
+    assert full["measurement"]["serialization_time"] > 0
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_memory_are_refused():
+    f = new()
+    f.admission = AdmissionGuard(limit=256 << 20)
+    status, body = await invoke(f, {"size": 10 ** 8, "m": 10})
+    assert status == 413 and body["estimated_bytes"] > body["memory_limit"]
+
+
+@pytest.mark.asyncio
+async def test_directed_edge_list_object(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    bucket = tmp_path / "minio" / "datasets"
+    bucket.mkdir(parents=True)
+    # 0 -> 1 -> 2 -> 0 is a cycle, so every vertex ranks 1/3
+    (bucket / "cycle.bin").write_bytes(np.array([[0, 1], [1, 2], [2, 0]], dtype="<i4").tobytes())
+    f = new()
+    f.edge_lists = EdgeListStore(client)
+
+    status, body = await invoke(f, {
+        "input-bucket": "datasets", "objectKey": "cycle.bin", "directed": True, "result_mode": "full"
+    })
+    rejected, error = await invoke(f, {"input-bucket": "datasets", "objectKey": "cycle.bin", "personalization": [0]})
+
+    assert status == 200
+    assert body["result"] == pytest.approx([1 / 3] * 3)
+    assert body["measurement"]["input_bytes"] == 24
+    assert rejected == 500 and "personalization" in error["error"]
+
+
+@pytest.mark.asyncio
+async def test_edge_list_objects_warm_start_from_their_own_solution(tmp_path):
+    client = FakeMinio(tmp_path / "minio")
+    bucket = tmp_path / "minio" / "datasets"
+    bucket.mkdir(parents=True)
+    # Cycles of 3 and 5 vertices; a shared seed must not share a solution between them
+    (bucket / "three.bin").write_bytes(np.array([[0, 1], [1, 2], [2, 0]], dtype="<i4").tobytes())
+    (bucket / "five.bin").write_bytes(np.array([[v, (v + 1) % 5] for v in range(5)], dtype="<i4").tobytes())
+    f = new()
+    f.edge_lists = EdgeListStore(client)
+    request = {"input-bucket": "datasets", "directed": True, "seed": 1, "result_mode": "full"}
+
+    status, three = await invoke(f, {**request, "objectKey": "three.bin"})
+    other, five = await invoke(f, {**request, "objectKey": "five.bin"})
+    _, again = await invoke(f, {**request, "objectKey": "three.bin"})
+
+    assert status == other == 200
+    assert three["result"] == pytest.approx([1 / 3] * 3) and five["result"] == pytest.approx([1 / 5] * 5)
+    assert not five["measurement"]["warm_start"]
+    assert again["measurement"]["warm_start"] and again["result"] == pytest.approx([1 / 3] * 3)